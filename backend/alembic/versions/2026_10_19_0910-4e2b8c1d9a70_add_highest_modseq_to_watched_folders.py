@@ -0,0 +1,30 @@
+"""add highest_modseq to watched folders and global mail config
+
+Revision ID: 4e2b8c1d9a70
+Revises: 79ea2a0d286b
+Create Date: 2026-10-19 09:10:42.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e2b8c1d9a70'
+down_revision: Union[str, Sequence[str], None] = '79ea2a0d286b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Store the CONDSTORE HIGHESTMODSEQ seen at the last completed scan."""
+    op.add_column('watched_folders', sa.Column('highest_modseq', sa.BigInteger(), nullable=True))
+    op.add_column('global_mail_config', sa.Column('highest_modseq', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop highest_modseq columns."""
+    op.drop_column('global_mail_config', 'highest_modseq')
+    op.drop_column('watched_folders', 'highest_modseq')
@@ -0,0 +1,32 @@
+"""add adaptive polling bounds to imap settings
+
+Revision ID: 9c3f5a7e2b14
+Revises: 4e2b8c1d9a70
+Create Date: 2026-10-19 14:20:08.530117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3f5a7e2b14'
+down_revision: Union[str, Sequence[str], None] = '4e2b8c1d9a70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the adaptive polling toggle and its interval bounds."""
+    op.add_column('imap_settings', sa.Column('adaptive_polling', sa.Boolean(), nullable=False, server_default=sa.text('false')))
+    op.add_column('imap_settings', sa.Column('min_polling_interval_sec', sa.Integer(), nullable=False, server_default=sa.text('60')))
+    op.add_column('imap_settings', sa.Column('max_polling_interval_sec', sa.Integer(), nullable=False, server_default=sa.text('1800')))
+
+
+def downgrade() -> None:
+    """Drop adaptive polling columns."""
+    op.drop_column('imap_settings', 'max_polling_interval_sec')
+    op.drop_column('imap_settings', 'min_polling_interval_sec')
+    op.drop_column('imap_settings', 'adaptive_polling')
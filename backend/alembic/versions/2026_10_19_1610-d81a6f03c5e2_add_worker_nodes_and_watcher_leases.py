@@ -0,0 +1,46 @@
+"""add worker nodes and watcher leases
+
+Revision ID: d81a6f03c5e2
+Revises: 9c3f5a7e2b14
+Create Date: 2026-10-19 16:10:27.904361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81a6f03c5e2'
+down_revision: Union[str, Sequence[str], None] = '9c3f5a7e2b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create tables used to distribute IMAP watchers across nodes."""
+    op.create_table('worker_nodes',
+    sa.Column('node_id', sa.String(length=255), nullable=False),
+    sa.Column('pool', sa.String(length=64), nullable=False),
+    sa.Column('hostname', sa.String(length=255), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_heartbeat_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('node_id', 'pool')
+    )
+    op.create_index(op.f('ix_worker_nodes_last_heartbeat_at'), 'worker_nodes', ['last_heartbeat_at'], unique=False)
+    op.create_table('watcher_leases',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('node_id', sa.String(length=255), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_watcher_leases_node_id'), 'watcher_leases', ['node_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop watcher distribution tables."""
+    op.drop_index(op.f('ix_watcher_leases_node_id'), table_name='watcher_leases')
+    op.drop_table('watcher_leases')
+    op.drop_index(op.f('ix_worker_nodes_last_heartbeat_at'), table_name='worker_nodes')
+    op.drop_table('worker_nodes')
@@ -0,0 +1,47 @@
+"""add watcher states
+
+Revision ID: 5b7e19c4d2a8
+Revises: d81a6f03c5e2
+Create Date: 2026-10-19 16:50:41.217093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e19c4d2a8'
+down_revision: Union[str, Sequence[str], None] = 'd81a6f03c5e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the table nodes publish their watcher states to."""
+    op.create_table('watcher_states',
+    sa.Column('node_id', sa.String(length=255), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('pool', sa.String(length=64), nullable=False),
+    sa.Column('mode', sa.String(length=32), nullable=False),
+    sa.Column('last_scan_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('next_scan_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_activity_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('queue_total', sa.Integer(), nullable=False),
+    sa.Column('queue_position', sa.Integer(), nullable=False),
+    sa.Column('current_email_subject', sa.Text(), nullable=True),
+    sa.Column('current_email_sender', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('node_id', 'key')
+    )
+    op.create_index(op.f('ix_watcher_states_key'), 'watcher_states', ['key'], unique=False)
+    op.create_index(op.f('ix_watcher_states_updated_at'), 'watcher_states', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop watcher states table."""
+    op.drop_index(op.f('ix_watcher_states_updated_at'), table_name='watcher_states')
+    op.drop_index(op.f('ix_watcher_states_key'), table_name='watcher_states')
+    op.drop_table('watcher_states')
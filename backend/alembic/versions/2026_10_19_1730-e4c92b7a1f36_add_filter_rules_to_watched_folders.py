@@ -0,0 +1,30 @@
+"""add search filter rules to watched folders and global mail
+
+Revision ID: e4c92b7a1f36
+Revises: 5b7e19c4d2a8
+Create Date: 2026-10-19 17:30:12.684410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c92b7a1f36'
+down_revision: Union[str, Sequence[str], None] = '5b7e19c4d2a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add optional IMAP SEARCH prefilter rules."""
+    op.add_column('watched_folders', sa.Column('filter_rules', sa.JSON(), nullable=True))
+    op.add_column('global_mail_config', sa.Column('filter_rules', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop IMAP SEARCH prefilter rules."""
+    op.drop_column('global_mail_config', 'filter_rules')
+    op.drop_column('watched_folders', 'filter_rules')
@@ -0,0 +1,39 @@
+"""add llm analysis cache
+
+Revision ID: 7f3d2c8e9a41
+Revises: e4c92b7a1f36
+Create Date: 2026-10-19 18:10:55.302817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3d2c8e9a41'
+down_revision: Union[str, Sequence[str], None] = 'e4c92b7a1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the content-addressed cache for LLM analysis results."""
+    op.create_table('llm_analysis_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(length=255), nullable=False),
+    sa.Column('result', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(op.f('ix_llm_analysis_cache_created_at'), 'llm_analysis_cache', ['created_at'], unique=False)
+    op.create_index(op.f('ix_llm_analysis_cache_expires_at'), 'llm_analysis_cache', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop the LLM analysis cache."""
+    op.drop_index(op.f('ix_llm_analysis_cache_expires_at'), table_name='llm_analysis_cache')
+    op.drop_index(op.f('ix_llm_analysis_cache_created_at'), table_name='llm_analysis_cache')
+    op.drop_table('llm_analysis_cache')
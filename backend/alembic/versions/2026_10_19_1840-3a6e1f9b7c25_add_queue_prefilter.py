@@ -0,0 +1,32 @@
+"""add queue prefilter
+
+Revision ID: 3a6e1f9b7c25
+Revises: 7f3d2c8e9a41
+Create Date: 2026-10-19 18:40:27.118364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a6e1f9b7c25'
+down_revision: Union[str, Sequence[str], None] = '7f3d2c8e9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Record prefilter decisions on queue items and make the prefilter switchable."""
+    op.add_column('queue_items', sa.Column('prefilter_score', sa.Integer(), nullable=True))
+    op.add_column('queue_items', sa.Column('prefilter_decision', sa.String(length=20), nullable=True))
+    op.add_column('queue_settings', sa.Column('prefilter_enabled', sa.Boolean(), nullable=False, server_default=sa.text('true')))
+
+
+def downgrade() -> None:
+    """Drop prefilter columns."""
+    op.drop_column('queue_settings', 'prefilter_enabled')
+    op.drop_column('queue_items', 'prefilter_decision')
+    op.drop_column('queue_items', 'prefilter_score')
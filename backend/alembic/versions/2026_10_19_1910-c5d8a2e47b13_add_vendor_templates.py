@@ -0,0 +1,42 @@
+"""add vendor templates
+
+Revision ID: c5d8a2e47b13
+Revises: 3a6e1f9b7c25
+Create Date: 2026-10-19 19:10:41.530927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8a2e47b13'
+down_revision: Union[str, Sequence[str], None] = '3a6e1f9b7c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the table of extraction templates learned per sender layout."""
+    op.create_table('vendor_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender_domain', sa.String(length=255), nullable=False),
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('observations', sa.JSON(), nullable=False),
+    sa.Column('fields', sa.JSON(), nullable=True),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('misses', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sender_domain', 'fingerprint')
+    )
+    op.create_index(op.f('ix_vendor_templates_sender_domain'), 'vendor_templates', ['sender_domain'], unique=False)
+
+
+def downgrade() -> None:
+    """Drop learned vendor templates."""
+    op.drop_index(op.f('ix_vendor_templates_sender_domain'), table_name='vendor_templates')
+    op.drop_table('vendor_templates')
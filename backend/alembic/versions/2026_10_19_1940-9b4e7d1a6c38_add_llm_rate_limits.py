@@ -0,0 +1,32 @@
+"""add llm rate limits
+
+Revision ID: 9b4e7d1a6c38
+Revises: c5d8a2e47b13
+Create Date: 2026-10-19 19:40:12.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e7d1a6c38'
+down_revision: Union[str, Sequence[str], None] = 'c5d8a2e47b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add per-config request, token and concurrency limits for LLM calls."""
+    op.add_column('llm_configs', sa.Column('rpm_limit', sa.Integer(), nullable=True))
+    op.add_column('llm_configs', sa.Column('tpm_limit', sa.Integer(), nullable=True))
+    op.add_column('llm_configs', sa.Column('max_concurrency', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop LLM rate limit columns."""
+    op.drop_column('llm_configs', 'max_concurrency')
+    op.drop_column('llm_configs', 'tpm_limit')
+    op.drop_column('llm_configs', 'rpm_limit')
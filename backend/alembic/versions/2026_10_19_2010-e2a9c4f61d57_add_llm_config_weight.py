@@ -0,0 +1,28 @@
+"""add llm config weight
+
+Revision ID: e2a9c4f61d57
+Revises: 9b4e7d1a6c38
+Create Date: 2026-10-19 20:10:44.871203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c4f61d57'
+down_revision: Union[str, Sequence[str], None] = '9b4e7d1a6c38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Weight LLM configs so requests can be spread over several active ones."""
+    op.add_column('llm_configs', sa.Column('weight', sa.Integer(), nullable=False, server_default=sa.text('1')))
+
+
+def downgrade() -> None:
+    """Drop LLM config weight."""
+    op.drop_column('llm_configs', 'weight')
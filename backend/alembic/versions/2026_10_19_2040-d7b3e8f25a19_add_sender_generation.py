@@ -0,0 +1,28 @@
+"""add sender generation to global mail config
+
+Revision ID: d7b3e8f25a19
+Revises: e2a9c4f61d57
+Create Date: 2026-10-19 20:40:12.604381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3e8f25a19'
+down_revision: Union[str, Sequence[str], None] = 'e2a9c4f61d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Count sender address edits so every node notices them."""
+    op.add_column('global_mail_config', sa.Column('sender_generation', sa.Integer(), nullable=False, server_default=sa.text('0')))
+
+
+def downgrade() -> None:
+    """Drop sender generation."""
+    op.drop_column('global_mail_config', 'sender_generation')
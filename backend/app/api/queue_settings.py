@@ -18,7 +18,7 @@ async def _get_or_create_settings(db: AsyncSession) -> QueueSettings:
     result = await db.execute(select(QueueSettings))
     settings = result.scalar_one_or_none()
     if settings is None:
-        settings = QueueSettings(id=1, max_age_days=7, max_per_user=5000)
+        settings = QueueSettings(id=1, max_age_days=7, max_per_user=5000, prefilter_enabled=True)
         db.add(settings)
         await db.commit()
         await db.refresh(settings)
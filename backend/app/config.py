@@ -11,6 +11,15 @@ class Settings(BaseSettings):
     frontend_url: str = "http://localhost:5173"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 1440  # 24 hours
+    node_id: str | None = None  # stable name for this process when running several backends
+    imap_connect_rate: float = 5.0  # max new IMAP logins per second across all watchers (0 = unlimited)
+    llm_cache_ttl_hours: int = 168  # keep LLM analysis results this long (0 = cache disabled)
+    llm_cache_max_entries: int = 10000  # oldest results are evicted beyond this
+    analysis_batch_size: int = 5  # queued items analysed together by analysers that support batches (1 = off)
+    queue_processing_timeout_sec: int = 900  # items 'processing' longer than this were left by a crashed worker and are requeued
+    llm_max_input_tokens: int = 6000  # email content sent to the LLM is truncated to this (and the model's context)
+    llm_hedge_requests: bool = False  # resend LLM requests slower than the config's p95 latency, first answer wins
+    llm_streaming: bool = True  # stream single-email analyses and stop as soon as the email is irrelevant
 
     model_config = {"env_prefix": "PT_"}
 
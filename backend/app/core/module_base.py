@@ -4,6 +4,13 @@ from fastapi import APIRouter
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
+class AnalyserSkipped(Exception):
+    """Raised by an analyser that does not handle this input.
+
+    The queue worker moves on to the next analyser without logging a warning.
+    """
+
+
 @dataclass
 class ModuleInfo:
     """Manifest that every module must provide as MODULE_INFO."""
@@ -21,3 +28,7 @@ class ModuleInfo:
     status: Callable[[AsyncSession], Awaitable[dict | None]] | None = None
     notify: Callable[[int, str, dict, dict | None, AsyncSession], Awaitable[None]] | None = None
     analyze: Callable[[dict, AsyncSession], Awaitable[tuple]] | None = None
+    # Analyses several items at once; returns one result tuple or exception per item, in order
+    analyze_batch: Callable[[list[dict], AsyncSession], Awaitable[list[tuple | Exception]]] | None = None
+    # Called with (raw_data, analysis, db) when another analyser produced a result
+    learn: Callable[[dict, Any, AsyncSession], Awaitable[None]] | None = None
@@ -4,18 +4,18 @@ from fastapi import FastAPI
 from alembic.config import Config
 from alembic import command
 import sqlalchemy as sa
-from sqlalchemy import func, select, update
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from app.config import settings
 from app.database import engine, async_session, wait_for_db
 from app.models import *  # noqa: F401, F403
 from app.models.smtp_config import SmtpConfig
-from app.models.queue_item import QueueItem
 from app.core.module_registry import (
     discover_modules, sync_module_configs, startup_enabled_modules,
     shutdown_all_modules, get_all_modules,
 )
 from app.core.exceptions import register_exception_handlers
 from app.services.scheduler import create_scheduler, register_schedules
+from app.services.queue.queue_worker import reset_stuck_queue_items
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)-5s [%(name)s] %(message)s")
 logger = logging.getLogger(__name__)
@@ -33,22 +33,6 @@ def _run_migrations(connection) -> None:
     logger.info("Database migrations complete.")
 
 
-async def reset_stuck_queue_items(session: AsyncSession) -> int:
-    """Reset queue items stuck at 'processing' back to 'queued'.
-
-    Called on startup to recover from crashes/restarts.
-    """
-    result = await session.execute(
-        update(QueueItem)
-        .where(QueueItem.status == "processing")
-        .values(status="queued", updated_at=func.now())
-    )
-    count = result.rowcount
-    if count:
-        logger.info(f"Reset {count} stuck queue item(s) from 'processing' to 'queued'.")
-    return count
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await wait_for_db()
@@ -63,9 +47,9 @@ async def lifespan(app: FastAPI):
             await session.commit()
             logger.info("Seeded default SMTP config.")
 
-    # Reset queue items stuck at 'processing' from a previous crash
+    # Requeue items left at 'processing' by a crash; younger ones may belong to another node
     async with async_session() as session:
-        await reset_stuck_queue_items(session)
+        await reset_stuck_queue_items(session, settings.queue_processing_timeout_sec)
         await session.commit()
 
     scheduler = await create_scheduler()
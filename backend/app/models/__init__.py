@@ -10,8 +10,9 @@ from app.models.smtp_config import SmtpConfig
 from app.models.notification import UserNotificationConfig, EmailVerification
 
 # Module models (imported so Alembic discovers them)
-from app.modules._shared.email.models import ProcessedEmail
-from app.modules.analysers.llm.models import LLMConfig
+from app.modules._shared.email.models import ProcessedEmail, WatcherLease, WatcherStatus, WorkerNode
+from app.modules.analysers.llm.models import LLMAnalysisCache, LLMConfig
+from app.modules.analysers.templates.models import VendorTemplate
 from app.modules.providers.email_user.models import EmailAccount, WatchedFolder
 from app.modules.providers.email_global.models import GlobalMailConfig, UserSenderAddress
 
@@ -19,6 +20,6 @@ __all__ = [
     "User", "Order", "OrderState", "ApiKey", "ImapSettings",
     "QueueItem", "QueueSettings", "ModuleConfig", "SmtpConfig",
     "UserNotificationConfig", "EmailVerification",
-    "ProcessedEmail", "LLMConfig", "EmailAccount", "WatchedFolder",
+    "ProcessedEmail", "WatcherLease", "WatcherStatus", "WorkerNode", "LLMConfig", "LLMAnalysisCache", "VendorTemplate", "EmailAccount", "WatchedFolder",
     "GlobalMailConfig", "UserSenderAddress",
 ]
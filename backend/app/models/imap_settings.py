@@ -10,3 +10,6 @@ class ImapSettings(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     max_email_age_days: Mapped[int] = mapped_column(Integer, default=7)
     check_uidvalidity: Mapped[bool] = mapped_column(Boolean, default=True)
+    adaptive_polling: Mapped[bool] = mapped_column(Boolean, default=False)
+    min_polling_interval_sec: Mapped[int] = mapped_column(Integer, default=60)
+    max_polling_interval_sec: Mapped[int] = mapped_column(Integer, default=1800)
@@ -18,6 +18,8 @@ class QueueItem(Base):
     raw_data: Mapped[dict] = mapped_column(JSON)
     extracted_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    prefilter_score: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    prefilter_decision: Mapped[Optional[str]] = mapped_column(String(20), nullable=True)
     order_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("orders.id", ondelete="SET NULL"), nullable=True
     )
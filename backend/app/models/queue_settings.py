@@ -1,4 +1,4 @@
-from sqlalchemy import Integer
+from sqlalchemy import Boolean, Integer
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
@@ -10,3 +10,4 @@ class QueueSettings(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     max_age_days: Mapped[int] = mapped_column(Integer, default=7)
     max_per_user: Mapped[int] = mapped_column(Integer, default=5000)
+    prefilter_enabled: Mapped[bool] = mapped_column(Boolean, default=True)
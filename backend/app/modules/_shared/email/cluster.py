@@ -0,0 +1,333 @@
+"""Distribute IMAP watchers across several backend processes.
+
+Every process that runs watchers is a node. For each pool it takes part in
+("email-user", "email-global": the modules enabled on it) it heartbeats into
+the worker_nodes table; a node that misses heartbeats for NODE_TTL_SEC is
+considered dead. Each watcher has a lease key ("folder:12", "global") that is
+assigned to one of the pool's live nodes by rendezvous hashing, so every node
+computes the same assignment without talking to the others and only the
+watchers of a joining or dying node move.
+
+Assignment alone is not enough during handover (nodes see membership changes
+at slightly different times), so a node only runs a watcher while it holds
+the matching row in watcher_leases. Leases are renewed on every heartbeat and
+expire after LEASE_TTL_SEC, which is how a dead node's watchers are taken
+over. All statements are plain SQL that works on PostgreSQL and SQLite.
+
+After each heartbeat a node also publishes the state of all of its running
+watchers to watcher_states in one batch, so status APIs on any node can read
+a cluster-wide snapshot with read_states().
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.modules._shared.email.imap_watcher import WorkerState
+from app.modules._shared.email.models import WatcherLease, WatcherStatus, WorkerNode
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SEC = 15
+NODE_TTL_SEC = 45  # a node missing this long is dead and loses its assignments
+LEASE_TTL_SEC = 45  # leases not renewed this long can be claimed by another node
+STOP_MARGIN_SEC = HEARTBEAT_SEC  # local watchers stop this long before their leases expire
+_IN_CHUNK = 500  # max keys per IN (...) clause
+
+NODE_ID = settings.node_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+_STARTED_AT = datetime.now(timezone.utc)
+
+
+@dataclass
+class _PoolMember:
+    rebalance: Callable[[], Awaitable[None]]  # runs after every heartbeat
+    stop_local: Callable[[], Awaitable[None]]  # runs without DB access once leases are lost
+    states: Callable[[], dict[str, WorkerState]]  # lease key -> state of running watchers
+
+
+_pools: dict[str, _PoolMember] = {}
+_heartbeat_task: asyncio.Task | None = None
+
+
+def owner_of(key: str, nodes: list[str]) -> str:
+    """Pick the node responsible for a lease key (highest random weight wins)."""
+    return max(
+        nodes,
+        key=lambda node: hashlib.sha256(f"{node}|{key}".encode()).digest(),
+    )
+
+
+def _chunks(items: list[str]):
+    for start in range(0, len(items), _IN_CHUNK):
+        yield items[start:start + _IN_CHUNK]
+
+
+async def heartbeat(db: AsyncSession, pools: list[str]) -> None:
+    """Record that this node is alive in ``pools`` and renew all of its leases. Does not commit."""
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(WorkerNode.pool).where(WorkerNode.node_id == NODE_ID)
+    )
+    registered = set(result.scalars().all())
+    await db.execute(
+        update(WorkerNode)
+        .where(WorkerNode.node_id == NODE_ID)
+        .values(last_heartbeat_at=now)
+    )
+    for pool in pools:
+        if pool not in registered:
+            await db.execute(insert(WorkerNode).values(
+                node_id=NODE_ID,
+                pool=pool,
+                hostname=socket.gethostname(),
+                started_at=_STARTED_AT,
+                last_heartbeat_at=now,
+            ))
+    await db.execute(
+        update(WatcherLease)
+        .where(WatcherLease.node_id == NODE_ID)
+        .values(expires_at=now + timedelta(seconds=LEASE_TTL_SEC))
+    )
+    # Forget nodes that have been gone for a long time
+    await db.execute(
+        delete(WorkerNode)
+        .where(WorkerNode.last_heartbeat_at < now - timedelta(seconds=NODE_TTL_SEC * 10))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def live_nodes(db: AsyncSession, pool: str) -> list[str]:
+    """Return the ids of the pool's nodes with a recent heartbeat, always including this one."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=NODE_TTL_SEC)
+    result = await db.execute(
+        select(WorkerNode.node_id).where(
+            WorkerNode.pool == pool, WorkerNode.last_heartbeat_at >= cutoff,
+        )
+    )
+    return sorted(set(result.scalars().all()) | {NODE_ID})
+
+
+async def sync_leases(db: AsyncSession, prefix: str, wanted: set[str]) -> set[str]:
+    """Converge this node's leases under ``prefix`` to ``wanted``.
+
+    Releases leases no longer wanted (stop their watchers first), claims
+    wanted keys that are free or expired, and returns the keys now held.
+    Keys held by another live node stay theirs until they release them or
+    their lease expires. Commits.
+    """
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=LEASE_TTL_SEC)
+
+    result = await db.execute(
+        select(WatcherLease.key).where(
+            WatcherLease.node_id == NODE_ID, WatcherLease.key.startswith(prefix)
+        )
+    )
+    held = set(result.scalars().all())
+
+    released = list(held - wanted)
+    for chunk in _chunks(released):
+        await db.execute(
+            delete(WatcherLease).where(
+                WatcherLease.node_id == NODE_ID, WatcherLease.key.in_(chunk)
+            )
+        )
+
+    missing = sorted(wanted - held)
+    for chunk in _chunks(missing):
+        await db.execute(
+            update(WatcherLease)
+            .where(WatcherLease.key.in_(chunk), WatcherLease.expires_at < now)
+            .values(node_id=NODE_ID, expires_at=expires_at)
+        )
+    await db.commit()
+
+    existing: set[str] = set()
+    for chunk in _chunks(missing):
+        result = await db.execute(select(WatcherLease.key).where(WatcherLease.key.in_(chunk)))
+        existing.update(result.scalars().all())
+    free = [key for key in missing if key not in existing]
+    if free:
+        try:
+            await db.execute(
+                insert(WatcherLease),
+                [{"key": key, "node_id": NODE_ID, "expires_at": expires_at} for key in free],
+            )
+            await db.commit()
+        except IntegrityError:
+            # Another node claimed one of them concurrently; retry next heartbeat
+            await db.rollback()
+
+    result = await db.execute(
+        select(WatcherLease.key).where(
+            WatcherLease.node_id == NODE_ID, WatcherLease.key.startswith(prefix)
+        )
+    )
+    return set(result.scalars().all())
+
+
+async def publish_states(db: AsyncSession) -> None:
+    """Replace this node's rows in watcher_states with its running watchers. Does not commit."""
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "node_id": NODE_ID,
+            "key": key,
+            "pool": pool,
+            "mode": state.mode,
+            "last_scan_at": state.last_scan_at,
+            "next_scan_at": state.next_scan_at,
+            "last_activity_at": state.last_activity_at,
+            "queue_total": state.queue_total,
+            "queue_position": state.queue_position,
+            "current_email_subject": state.current_email_subject,
+            "current_email_sender": state.current_email_sender,
+            "error": state.error,
+            "updated_at": now,
+        }
+        for pool, member in list(_pools.items())
+        for key, state in member.states().items()
+    ]
+    await db.execute(delete(WatcherStatus).where(WatcherStatus.node_id == NODE_ID))
+    if rows:
+        await db.execute(insert(WatcherStatus), rows)
+    # Drop rows left behind by nodes that died without cleaning up
+    await db.execute(
+        delete(WatcherStatus)
+        .where(WatcherStatus.updated_at < now - timedelta(seconds=NODE_TTL_SEC * 10))
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def read_states(db: AsyncSession, prefix: str) -> dict[str, WatcherStatus]:
+    """Return the published state of every running watcher whose key starts with ``prefix``.
+
+    Rows not refreshed within NODE_TTL_SEC are ignored. If two nodes report
+    the same key during a handover, the most recent report wins.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=NODE_TTL_SEC)
+    result = await db.execute(
+        select(WatcherStatus)
+        .where(WatcherStatus.key.startswith(prefix), WatcherStatus.updated_at >= cutoff)
+        .order_by(WatcherStatus.updated_at)
+    )
+    return {row.key: row for row in result.scalars().all()}
+
+
+def live_states(prefix: str):
+    """Subquery of the newest live watcher_states row per key under ``prefix``.
+
+    For aggregating and paginating in SQL, e.g. ``aliased(WatcherStatus, live_states(p))``.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=NODE_TTL_SEC)
+    newest = (
+        select(WatcherStatus.key, func.max(WatcherStatus.updated_at).label("updated_at"))
+        .where(WatcherStatus.key.startswith(prefix), WatcherStatus.updated_at >= cutoff)
+        .group_by(WatcherStatus.key)
+        .subquery()
+    )
+    return (
+        select(WatcherStatus)
+        .join(newest, and_(
+            WatcherStatus.key == newest.c.key,
+            WatcherStatus.updated_at == newest.c.updated_at,
+        ))
+        .subquery()
+    )
+
+
+async def _renew() -> None:
+    async with async_session() as db:
+        await heartbeat(db, list(_pools))
+        await db.commit()
+
+
+async def _rebalance_and_publish() -> None:
+    for name, member in list(_pools.items()):
+        try:
+            await member.rebalance()
+        except Exception as e:
+            logger.error(f"Rebalancing {name} watchers failed: {e}")
+    async with async_session() as db:
+        await publish_states(db)
+        await db.commit()
+
+
+async def _heartbeat_loop() -> None:
+    # Local watchers stop STOP_MARGIN_SEC before our leases expire, whether the
+    # heartbeat failed or hangs, so they never overlap with the next owner
+    stop_at = time.monotonic() + LEASE_TTL_SEC - STOP_MARGIN_SEC
+    watching = True
+    while True:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(_renew(), HEARTBEAT_SEC)
+            stop_at = started + LEASE_TTL_SEC - STOP_MARGIN_SEC
+            watching = True
+            await asyncio.wait_for(_rebalance_and_publish(), max(stop_at - time.monotonic(), 0))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Node heartbeat failed for {NODE_ID}: {e!r}")
+        if watching and time.monotonic() >= stop_at:
+            for name, member in list(_pools.items()):
+                logger.warning(f"Stopping {name} watchers: leases about to expire")
+                await member.stop_local()
+            watching = False
+        delay = HEARTBEAT_SEC if not watching else max(min(HEARTBEAT_SEC, stop_at - time.monotonic()), 0)
+        await asyncio.sleep(delay)
+
+
+def register_rebalancer(
+    pool: str,
+    rebalance: Callable[[], Awaitable[None]],
+    stop_local: Callable[[], Awaitable[None]],
+    states: Callable[[], dict[str, WorkerState]],
+) -> None:
+    """Join ``pool``: run ``rebalance`` after every heartbeat and publish ``states()``."""
+    global _heartbeat_task
+    _pools[pool] = _PoolMember(rebalance, stop_local, states)
+    if _heartbeat_task is None or _heartbeat_task.done():
+        _heartbeat_task = asyncio.create_task(_heartbeat_loop())
+    logger.info(f"Node {NODE_ID} joined watcher pool {pool}")
+
+
+async def unregister_rebalancer(pool: str) -> None:
+    """Leave ``pool`` and withdraw its published states; the last one out stops the heartbeat."""
+    global _heartbeat_task
+    if _pools.pop(pool, None) is None:
+        return
+    try:
+        async with async_session() as db:
+            await db.execute(
+                delete(WorkerNode).where(WorkerNode.node_id == NODE_ID, WorkerNode.pool == pool)
+            )
+            await db.execute(
+                delete(WatcherStatus).where(
+                    WatcherStatus.node_id == NODE_ID, WatcherStatus.pool == pool
+                )
+            )
+            await db.commit()
+        logger.info(f"Node {NODE_ID} left watcher pool {pool}")
+    except Exception as e:
+        logger.warning(f"Could not leave watcher pool {pool}: {e}")
+    if not _pools and _heartbeat_task and not _heartbeat_task.done():
+        _heartbeat_task.cancel()
+        try:
+            await _heartbeat_task
+        except asyncio.CancelledError:
+            pass
+        _heartbeat_task = None
@@ -1,4 +1,5 @@
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 
 from sqlalchemy import select
@@ -10,52 +11,88 @@ from app.models.queue_item import QueueItem
 logger = logging.getLogger(__name__)
 
 
-async def check_dedup_and_enqueue(
-    message_id: str,
-    subject: str,
-    sender: str,
-    body: str,
-    email_date: datetime | None,
-    email_uid: int,
-    user_id: int,
-    source_info: str,
-    account_id: int | None,
-    folder_path: str,
-    source: str,
-    db: AsyncSession,
-) -> bool:
-    """Check for duplicate, enqueue if new. Returns True if enqueued."""
-    existing = await db.execute(
-        select(ProcessedEmail).where(ProcessedEmail.message_id == message_id)
+@dataclass
+class IncomingEmail:
+    """A parsed and routed email waiting to be deduplicated and enqueued."""
+    message_id: str
+    subject: str
+    sender: str
+    body: str
+    email_date: datetime | None
+    email_uid: int
+    user_id: int
+    source_info: str
+    account_id: int | None
+    folder_path: str
+    source: str
+
+
+async def find_processed_message_ids(
+    message_ids: list[str], db: AsyncSession,
+) -> set[str]:
+    """Return the subset of message_ids that already have a ProcessedEmail row."""
+    if not message_ids:
+        return set()
+    result = await db.execute(
+        select(ProcessedEmail.message_id).where(
+            ProcessedEmail.message_id.in_(message_ids)
+        )
     )
-    if existing.scalar_one_or_none():
-        return False
-
-    queue_item = QueueItem(
-        user_id=user_id,
-        status="queued",
-        source_type="email",
-        source_info=source_info,
-        raw_data={
-            "subject": subject,
-            "sender": sender,
-            "body": body,
-            "message_id": message_id,
-            "email_uid": email_uid,
-            "email_date": email_date.isoformat() if email_date else None,
-        },
+    return set(result.scalars().all())
+
+
+async def dedup_and_enqueue_batch(
+    emails: list[IncomingEmail], db: AsyncSession,
+) -> int:
+    """Enqueue every email whose Message-ID has not been processed yet.
+
+    Deduplicates the whole batch with a single IN lookup (plus in-batch
+    duplicates), then inserts the QueueItem and ProcessedEmail rows in bulk.
+    Does not commit. Returns the number of emails enqueued.
+    """
+    known = await find_processed_message_ids(
+        list({e.message_id for e in emails}), db,
     )
-    db.add(queue_item)
+
+    new_emails = []
+    for incoming in emails:
+        if incoming.message_id in known:
+            continue
+        known.add(incoming.message_id)
+        new_emails.append(incoming)
+    if not new_emails:
+        return 0
+
+    queue_items = [
+        QueueItem(
+            user_id=incoming.user_id,
+            status="queued",
+            source_type="email",
+            source_info=incoming.source_info,
+            raw_data={
+                "subject": incoming.subject,
+                "sender": incoming.sender,
+                "body": incoming.body,
+                "message_id": incoming.message_id,
+                "email_uid": incoming.email_uid,
+                "email_date": incoming.email_date.isoformat() if incoming.email_date else None,
+            },
+        )
+        for incoming in new_emails
+    ]
+    db.add_all(queue_items)
     await db.flush()
 
-    processed = ProcessedEmail(
-        account_id=account_id,
-        folder_path=folder_path,
-        email_uid=email_uid,
-        message_id=message_id,
-        queue_item_id=queue_item.id,
-        source=source,
-    )
-    db.add(processed)
+    db.add_all([
+        ProcessedEmail(
+            account_id=incoming.account_id,
+            folder_path=incoming.folder_path,
+            email_uid=incoming.email_uid,
+            message_id=incoming.message_id,
+            queue_item_id=queue_item.id,
+            source=incoming.source,
+        )
+        for incoming, queue_item in zip(new_emails, queue_items)
+    ])
 
-    return True
+    return len(new_emails)
@@ -0,0 +1,228 @@
+"""Fast, bounded HTML-to-text extraction for email bodies.
+
+Order and shipping emails are mostly marketing HTML: deeply nested layout
+tables, inline CSS and tracking pixels. Only the visible text (and tracking
+links) matters for analysis, so this walks the document with a single-regex
+streaming tokenizer instead of building a full markdown rendering. Attributes
+are only parsed for links, style/script bodies are skipped in one jump, and
+tokenizing stops as soon as the output cap is reached.
+"""
+
+import re
+from dataclasses import dataclass, field
+from html import unescape
+
+MAX_BODY_CHARS = 50_000
+
+_TOKEN_RE = re.compile(
+    r"<!--.*?(?:-->|\Z)"  # comment
+    r"|<![^>]*>|<\?[^>]*>"  # doctype, CDATA, processing instruction
+    r"""|<(/?)([a-zA-Z][a-zA-Z0-9:-]*)((?:"[^"]*"|'[^']*'|[^'">])*)>"""  # tag
+    r"|[^<]+|<",  # text, stray '<'
+    re.DOTALL,
+)
+_HREF_RE = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+_RAW_TEXT_END_RE = {
+    tag: re.compile(rf"</{tag}\s*>", re.IGNORECASE) for tag in ("style", "script")
+}
+_SKIP_TAGS = {"head", "noscript", "template", "title", "svg", "xml"}
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "center", "dd", "div",
+    "dl", "dt", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "li", "main", "nav", "ol", "p", "pre", "section", "ul",
+}
+_CELL_TAGS = {"td", "th"}
+_VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "col", "area", "base", "wbr"}
+
+_TRACKING_URL_RE = re.compile(
+    r"track|trace|sendung|shipment|parcel|paket|colis|delivery|lieferung|"
+    r"dhl\.|ups\.com|dpd\.|hermes|gls-|gls\.|fedex\.|usps\.|royalmail|postnl",
+    re.IGNORECASE,
+)
+_WHITESPACE_RE = re.compile(r"[\s\u00a0\u200b\u200c\u200d\ufeff]+")
+_BLANK_LINES_RE = re.compile(r"\n[ \t]*(?:\n[ \t]*)+")
+
+
+@dataclass
+class _Row:
+    table_depth: int
+    cells: list[str] = field(default_factory=list)
+    current: list[str] = field(default_factory=list)
+    in_cell: bool = False
+    is_layout: bool = False
+
+
+class _Truncated(Exception):
+    pass
+
+
+class _TextExtractor:
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.size = 0
+        self.truncated = False
+        self._out: list[str] = []
+        self._rows: list[_Row] = []
+        self._table_depth = 0
+        self._skip_depth = 0
+        self._links: list[str | None] = []
+
+    # -- output ------------------------------------------------------------
+
+    def _target(self) -> list[str]:
+        if self._rows and self._rows[-1].in_cell:
+            return self._rows[-1].current
+        return self._out
+
+    def _emit(self, text: str) -> None:
+        if not text:
+            return
+        remaining = self.max_chars - self.size
+        if len(text) > remaining:
+            self._target().append(text[:remaining])
+            self.size = self.max_chars
+            self.truncated = True
+            raise _Truncated
+        self._target().append(text)
+        self.size += len(text)
+
+    def _close_cell(self, row: _Row) -> None:
+        if row.in_cell:
+            text = "".join(row.current).strip()
+            if text:
+                row.cells.append(text)
+            row.current = []
+            row.in_cell = False
+
+    def _close_row(self) -> None:
+        row = self._rows.pop()
+        self._close_cell(row)
+        if not row.cells:
+            return
+        # A row of short cells is a data row (e.g. item | qty | price); rows
+        # containing nested tables or a single cell are layout and flow as text.
+        if row.is_layout or len(row.cells) == 1:
+            rendered = "\n".join(row.cells)
+        else:
+            rendered = " | ".join(row.cells)
+        target = self._target()
+        if target and not target[-1].endswith("\n"):
+            target.append("\n")
+        target.append(rendered + "\n")
+
+    def _close_rows_from(self, depth: int) -> None:
+        while self._rows and self._rows[-1].table_depth >= depth:
+            self._close_row()
+
+    # -- token handlers -----------------------------------------------------
+
+    def handle_starttag(self, tag: str, attrs: str) -> None:
+        if tag == "body":
+            # Recover from an unclosed <head>
+            self._skip_depth = 0
+            return
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+            return
+        if self._skip_depth:
+            return
+        if tag == "table":
+            if self._rows:
+                self._rows[-1].is_layout = True
+            self._table_depth += 1
+        elif tag == "tr":
+            self._close_rows_from(self._table_depth)
+            self._rows.append(_Row(table_depth=self._table_depth))
+        elif tag in _CELL_TAGS:
+            if not self._rows or self._rows[-1].table_depth < self._table_depth:
+                self._rows.append(_Row(table_depth=self._table_depth))
+            row = self._rows[-1]
+            self._close_cell(row)
+            row.in_cell = True
+        elif tag == "a":
+            match = _HREF_RE.search(attrs)
+            href = unescape(next(g for g in match.groups() if g is not None)) if match else ""
+            self._links.append(href if _TRACKING_URL_RE.search(href) else None)
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in _SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+            return
+        if self._skip_depth:
+            return
+        if tag == "tr":
+            self._close_rows_from(self._table_depth)
+        elif tag in _CELL_TAGS:
+            if self._rows and self._rows[-1].table_depth == self._table_depth:
+                self._close_cell(self._rows[-1])
+        elif tag == "table":
+            if self._table_depth:
+                self._close_rows_from(self._table_depth)
+                self._table_depth -= 1
+        elif tag == "a":
+            href = self._links.pop() if self._links else None
+            if href:
+                self._emit(f" ({href})")
+        elif tag in _BLOCK_TAGS:
+            self._emit("\n")
+
+    def handle_data(self, data: str) -> None:
+        if self._skip_depth:
+            return
+        if "&" in data:
+            data = unescape(data)
+        self._emit(_WHITESPACE_RE.sub(" ", data))
+
+    # -- driver -------------------------------------------------------------
+
+    def feed(self, html: str) -> None:
+        pos = 0
+        end = len(html)
+        while pos < end:
+            match = _TOKEN_RE.match(html, pos)
+            pos = match.end()
+            tag = match.group(2)
+            if tag is None:
+                text = match.group(0)
+                if text[0] != "<" or len(text) == 1:
+                    self.handle_data(text)
+                continue
+            tag = tag.lower()
+            if match.group(1):
+                self.handle_endtag(tag)
+                continue
+            if tag in _RAW_TEXT_END_RE:
+                # Jump over the element body instead of tokenizing CSS/JS
+                close = _RAW_TEXT_END_RE[tag].search(html, pos)
+                pos = close.end() if close else end
+                continue
+            attrs = match.group(3)
+            self.handle_starttag(tag, attrs)
+            if attrs.endswith("/") and tag not in _VOID_TAGS:
+                self.handle_endtag(tag)
+
+    def result(self) -> str:
+        while self._rows:
+            self._close_row()
+        text = "".join(self._out)
+        lines = (line.strip() for line in text.split("\n"))
+        text = "\n".join(lines)
+        return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def html_to_text(html: str, max_chars: int = MAX_BODY_CHARS) -> str:
+    """Convert HTML to plain text, keeping tracking links, capped at max_chars.
+
+    Drops head/style/script content, flattens layout tables, renders data
+    table rows as "cell | cell" and stops tokenizing once the cap is hit.
+    """
+    extractor = _TextExtractor(max_chars)
+    try:
+        extractor.feed(html)
+    except _Truncated:
+        pass
+    return extractor.result()
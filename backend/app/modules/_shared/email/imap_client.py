@@ -1,11 +1,31 @@
+import asyncio
 import email
 import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
 from email.header import decode_header
+from email.utils import parsedate_to_datetime
 
-import html2text
+from app.modules._shared.email.html_text import MAX_BODY_CHARS, html_to_text
 
-h2t = html2text.HTML2Text()
-h2t.ignore_links = False
+# MIME parsing and HTML conversion are CPU-bound; a large HTML newsletter can
+# take tens of milliseconds. They run on this small pool so the event loop
+# (other watchers, the queue worker, the API) stays responsive.
+PARSE_WORKERS = 2
+
+_parse_executor: ThreadPoolExecutor | None = None
+
+_ANGLE_ADDR_RE = re.compile(r"<([^>]+)>")
+
+
+@dataclass
+class ParsedEmail:
+    subject: str
+    sender: str
+    message_id: str
+    body: str
+    email_date: datetime | None
 
 
 def decode_header_value(value: str) -> str:
@@ -23,30 +43,66 @@ def decode_header_value(value: str) -> str:
 
 def extract_email_from_header(from_header: str) -> str:
     """Extract bare email from 'Display Name <email@example.com>' format."""
-    match = re.search(r"<([^>]+)>", from_header)
+    match = _ANGLE_ADDR_RE.search(from_header)
     if match:
         return match.group(1).lower()
     return from_header.strip().lower()
 
 
 def extract_body(msg: email.message.Message) -> str:
-    """Extract plain text body from email message."""
+    """Extract plain text body from email message, capped at MAX_BODY_CHARS."""
     if msg.is_multipart():
         for part in msg.walk():
             content_type = part.get_content_type()
             if content_type == "text/plain":
                 payload = part.get_payload(decode=True)
                 charset = part.get_content_charset() or "utf-8"
-                return payload.decode(charset, errors="replace")
+                return payload.decode(charset, errors="replace")[:MAX_BODY_CHARS]
             elif content_type == "text/html":
                 payload = part.get_payload(decode=True)
                 charset = part.get_content_charset() or "utf-8"
-                return h2t.handle(payload.decode(charset, errors="replace"))
+                return html_to_text(payload.decode(charset, errors="replace"))
     else:
         payload = msg.get_payload(decode=True)
         charset = msg.get_content_charset() or "utf-8"
         text = payload.decode(charset, errors="replace")
         if msg.get_content_type() == "text/html":
-            return h2t.handle(text)
-        return text
+            return html_to_text(text)
+        return text[:MAX_BODY_CHARS]
     return ""
+
+
+def parse_email(raw_email: bytes) -> ParsedEmail:
+    """Parse a raw RFC822 message into the fields the watchers enqueue."""
+    msg = email.message_from_bytes(raw_email)
+
+    email_date = None
+    try:
+        date_str = msg.get("Date", "")
+        if date_str:
+            email_date = parsedate_to_datetime(date_str)
+    except Exception:
+        pass
+
+    return ParsedEmail(
+        subject=decode_header_value(msg.get("Subject", "")),
+        sender=decode_header_value(msg.get("From", "")),
+        message_id=msg.get("Message-ID", ""),
+        body=extract_body(msg),
+        email_date=email_date,
+    )
+
+
+def _get_parse_executor() -> ThreadPoolExecutor:
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(
+            max_workers=PARSE_WORKERS, thread_name_prefix="email-parse",
+        )
+    return _parse_executor
+
+
+async def parse_email_async(raw_email: bytes) -> ParsedEmail:
+    """Run parse_email on the bounded parse pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_parse_executor(), parse_email, raw_email)
@@ -1,33 +1,92 @@
 """Shared IMAP watch loop logic used by both user and global email watchers.
 
-Provides generic async functions for IDLE/poll loops, email fetching, and
-reconnection with exponential backoff. Provider-specific behavior is injected
-via the ImapWatcherCallbacks dataclass.
+Provides generic async functions for IDLE/poll loops over a persistent
+connection, email fetching, and rate-limited reconnection with jittered
+exponential backoff. Provider-specific behavior is injected via the
+ImapWatcherCallbacks dataclass.
 """
 
 import asyncio
 import email as email_mod
 import hashlib
 import logging
+import random
+import re
+import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Awaitable, Callable
 
 from aioimaplib import IMAP4_SSL, STOP_WAIT_SERVER_PUSH
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database import async_session
-from app.modules._shared.email.imap_client import decode_header_value, extract_body
+from app.models.imap_settings import ImapSettings
+from app.modules._shared.email.imap_client import parse_email_async
+from app.modules._shared.email.search_filter import build_search_criteria
 from app.modules._shared.email.imap_watcher import (
+    CHECKPOINT_EVERY_MESSAGES,
+    CHECKPOINT_INTERVAL_SEC,
     IDLE_TIMEOUT_SEC,
     MAX_BACKOFF_SEC,
+    POLL_KEEPALIVE_SEC,
     WorkerMode,
     WorkerState,
 )
-from app.modules._shared.email.email_fetcher import check_dedup_and_enqueue
+from app.modules._shared.email.email_fetcher import (
+    IncomingEmail,
+    dedup_and_enqueue_batch,
+    find_processed_message_ids,
+)
 
 logger = logging.getLogger(__name__)
 
+_UIDVALIDITY_RE = re.compile(r"UIDVALIDITY\s+(\d+)")
+_HIGHESTMODSEQ_RE = re.compile(r"HIGHESTMODSEQ\s+(\d+)")
+_FETCH_UID_RE = re.compile(rb"UID (\d+)")
+
+# Max UIDs per header-only prefetch command, keeps the command line short
+HEADER_PREFETCH_CHUNK = 500
+
+# Adaptive polling backs off to at most this multiple of the account's own interval
+MAX_POLL_BACKOFF_FACTOR = 4
+
+
+class ConnectThrottle:
+    """Spaces IMAP logins process-wide to at most `rate` per second.
+
+    Every watcher passes through here before connecting, so starting all
+    watchers at once (startup, module enable, provider outage) ramps up at a
+    steady rate instead of opening every connection in the same instant.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_connect_throttle = ConnectThrottle(settings.imap_connect_rate)
+
+
+def jittered_backoff(backoff: float) -> float:
+    """Randomize a backoff delay to between half and all of its value.
+
+    Keeps watchers that failed together (e.g. a provider outage) from
+    retrying in lockstep.
+    """
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
 
 def generate_fallback_message_id(
     account_id: int, folder_path: str, uidvalidity: int | None, uid: int,
@@ -38,18 +97,118 @@ def generate_fallback_message_id(
     return f"fallback:{account_id}:{folder_hash}:{uidvalidity_part}:{uid}"
 
 
+@dataclass
+class SelectResult:
+    """Mailbox state reported by the server in the SELECT response."""
+    uidvalidity: int | None
+    highest_modseq: int | None
+
+
+def parse_select_response(select_response) -> SelectResult:
+    """Extract UIDVALIDITY and HIGHESTMODSEQ from a SELECT response."""
+    uidvalidity = None
+    highest_modseq = None
+    if select_response and len(select_response) > 1:
+        for line in select_response[1]:
+            line_str = line.decode() if isinstance(line, bytes) else str(line)
+            if uidvalidity is None:
+                match = _UIDVALIDITY_RE.search(line_str)
+                if match:
+                    uidvalidity = int(match.group(1))
+            if highest_modseq is None:
+                match = _HIGHESTMODSEQ_RE.search(line_str)
+                if match:
+                    highest_modseq = int(match.group(1))
+    return SelectResult(uidvalidity=uidvalidity, highest_modseq=highest_modseq)
+
+
+async def select_folder(imap: IMAP4_SSL, folder_path: str) -> SelectResult:
+    """SELECT a folder, enabling CONDSTORE (RFC 7162) when the server offers it.
+
+    With CONDSTORE the server reports HIGHESTMODSEQ, which changes whenever
+    anything in the mailbox changes. Comparing it to the value stored at the
+    last completed scan lets reconnects skip the UID SEARCH entirely.
+    """
+    if imap.has_capability("CONDSTORE"):
+        response = await imap.select(f"{folder_path} (CONDSTORE)")
+    else:
+        response = await imap.select(folder_path)
+    return parse_select_response(response)
+
+
+@dataclass
+class PollSchedule:
+    """Admin-set bounds for adaptive polling intervals."""
+    min_interval_sec: int
+    max_interval_sec: int
+
+
+async def load_poll_schedule(db: AsyncSession) -> PollSchedule | None:
+    """Return the adaptive polling bounds, or None if adaptive polling is off."""
+    result = await db.execute(select(ImapSettings))
+    imap_settings = result.scalar_one_or_none()
+    if imap_settings is None or not imap_settings.adaptive_polling:
+        return None
+    return PollSchedule(
+        min_interval_sec=imap_settings.min_polling_interval_sec,
+        max_interval_sec=imap_settings.max_polling_interval_sec,
+    )
+
+
+def imap_settings_fingerprint(imap_settings: ImapSettings | None) -> tuple:
+    """The ImapSettings values a watcher reads on connect, for restart detection."""
+    if imap_settings is None:
+        return ()
+    return (
+        imap_settings.max_email_age_days,
+        imap_settings.check_uidvalidity,
+        imap_settings.adaptive_polling,
+        imap_settings.min_polling_interval_sec,
+        imap_settings.max_polling_interval_sec,
+    )
+
+
+def next_poll_interval(
+    current: int,
+    base: int,
+    schedule: PollSchedule,
+    enqueued: int,
+    shipments_active: bool,
+) -> int:
+    """Pick the wait before the next poll.
+
+    New mail drops the interval to the minimum, since shipping updates tend
+    to arrive in bursts (order confirmation, shipped, out for delivery).
+    Otherwise the interval doubles, up to the maximum for quiet folders, or
+    up to half the configured interval while the user has parcels in transit.
+    Quiet folders never wait more than MAX_POLL_BACKOFF_FACTOR times the
+    configured interval, so an account set to poll often stays responsive.
+    """
+    if enqueued:
+        return schedule.min_interval_sec
+    ceiling = min(schedule.max_interval_sec, base * MAX_POLL_BACKOFF_FACTOR)
+    if shipments_active:
+        ceiling = max(schedule.min_interval_sec, min(ceiling, base // 2))
+    return max(schedule.min_interval_sec, min(current * 2, ceiling))
+
+
 @dataclass
 class ConnectResult:
-    """Result from a successful connect callback."""
+    """Result from a successful connect callback.
+
+    poll_schedule enables adaptive polling; None polls at polling_interval_sec.
+    """
     imap: IMAP4_SSL
     idle_supported: bool
     use_polling: bool
     polling_interval_sec: int
+    selected: SelectResult | None = None
+    poll_schedule: PollSchedule | None = None
 
 
 @dataclass
 class FetchContext:
-    """Per-cycle context for email fetching, loaded fresh each cycle."""
+    """Context for email fetching, loaded on each (re)connect and advanced by checkpoints."""
     last_seen_uid: int
     folder_path: str
     uidvalidity: int | None
@@ -57,6 +216,8 @@ class FetchContext:
     source_info: str
     source_label: str
     account_id: int | None
+    highest_modseq: int | None = None
+    filter_rules: dict | None = None  # see search_filter.SearchFilterRules
 
 
 # Type aliases for callbacks
@@ -69,17 +230,79 @@ class ImapWatcherCallbacks:
 
     connect:           Open a DB session, validate liveness, connect to IMAP,
                        return ConnectResult or None to stop.
-    load_fetch_context: Given a DB session, return FetchContext for the current cycle.
+    load_fetch_context: Given a DB session, return FetchContext for the connection.
     route_email:       Given sender email, DB session, return (user_id, source)
                        or None to skip the email.
-    save_uid:          Persist the new last_seen_uid after processing an email.
+    save_uid:          Stage the new last_seen_uid in the session. The fetch loop
+                       commits it at checkpoints, in the same transaction as the
+                       queue items enqueued since the previous checkpoint.
+    save_modseq:       Stage the HIGHESTMODSEQ seen at the start of a completed
+                       scan; committed with the final checkpoint.
     log_label:         Human-readable label for log messages (e.g. "folder 5").
+    has_active_shipments: Optional. Return True while the recipients of this
+                       folder have parcels in transit; adaptive polling then
+                       keeps the interval short.
     """
     connect: Callable[[AsyncSession], Awaitable[ConnectResult | None]]
     load_fetch_context: Callable[[AsyncSession], Awaitable[FetchContext | None]]
     route_email: Callable[[str, AsyncSession], Awaitable[RouteResult]]
     save_uid: Callable[[int, AsyncSession], Awaitable[None]]
+    save_modseq: Callable[[int, AsyncSession], Awaitable[None]]
     log_label: str
+    has_active_shipments: Callable[[AsyncSession], Awaitable[bool]] | None = None
+
+
+def _parse_header_fetch(lines: list) -> dict[int, bytes]:
+    """Pair UIDs with header literals from a UID FETCH response.
+
+    Servers may put the UID item before or after the BODY literal, so a
+    pair is emitted as soon as both halves have been seen.
+    """
+    headers: dict[int, bytes] = {}
+    uid = None
+    literal = None
+    for line in lines:
+        if isinstance(line, bytearray):
+            literal = bytes(line)
+        else:
+            match = _FETCH_UID_RE.search(line)
+            if match:
+                uid = int(match.group(1))
+        if uid is not None and literal is not None:
+            headers[uid] = literal
+            uid = None
+            literal = None
+    return headers
+
+
+async def _skip_processed_uids(
+    imap: IMAP4_SSL,
+    uids: list[int],
+    ctx: FetchContext,
+    db: AsyncSession,
+) -> list[int]:
+    """Drop UIDs whose Message-ID was already processed, using headers only.
+
+    Used for full rescans (first scan or after a UIDVALIDITY reset) so that
+    only genuinely new messages are downloaded in full.
+    """
+    message_ids: dict[int, str] = {}
+    for start in range(0, len(uids), HEADER_PREFETCH_CHUNK):
+        chunk = uids[start:start + HEADER_PREFETCH_CHUNK]
+        _, lines = await imap.uid(
+            "fetch", ",".join(str(u) for u in chunk),
+            "(BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])",
+        )
+        for uid, header in _parse_header_fetch(lines or []).items():
+            message_id = email_mod.message_from_bytes(header).get("Message-ID", "")
+            if not message_id or not message_id.strip():
+                message_id = generate_fallback_message_id(
+                    ctx.account_id or 0, ctx.folder_path, ctx.uidvalidity, uid,
+                )
+            message_ids[uid] = message_id
+
+    known = await find_processed_message_ids(list(message_ids.values()), db)
+    return [uid for uid in uids if message_ids.get(uid) not in known]
 
 
 async def fetch_new_emails(
@@ -88,14 +311,56 @@ async def fetch_new_emails(
     callbacks: ImapWatcherCallbacks,
     db: AsyncSession,
     state: WorkerState | None,
-) -> None:
-    """UID-search for new emails, process and enqueue them."""
+    selected: SelectResult | None = None,
+) -> int:
+    """UID-search for new emails, process and enqueue them.
+
+    Returns the number of emails enqueued.
+
+    Progress is checkpointed every CHECKPOINT_EVERY_MESSAGES messages or
+    CHECKPOINT_INTERVAL_SEC seconds: the emails collected since the previous
+    checkpoint are deduplicated and enqueued as one batch, and committed
+    together with last_seen_uid, so a crash never loses or duplicates an email.
+
+    The folder's filter rules are added to the UID SEARCH, so the server
+    drops messages that cannot be relevant before anything is downloaded.
+
+    ``selected`` is the mailbox state from a fresh SELECT. When it carries a
+    HIGHESTMODSEQ equal to the one stored after the last completed scan (and
+    UIDVALIDITY is unchanged), nothing in the folder changed and the search
+    is skipped.
+    """
+    server_modseq = selected.highest_modseq if selected else None
+    if (
+        server_modseq is not None
+        and ctx.highest_modseq == server_modseq
+        and ctx.uidvalidity == selected.uidvalidity
+    ):
+        if state:
+            state.last_scan_at = datetime.now(timezone.utc)
+            state.last_activity_at = state.last_scan_at
+        return 0
+
     since_date = (
         datetime.now(timezone.utc) - timedelta(days=ctx.max_email_age_days)
     ).strftime("%d-%b-%Y")
     search_criteria = f"UID {ctx.last_seen_uid + 1}:* SINCE {since_date}"
-    _, data = await imap.uid_search(search_criteria)
-    uids = data[0].split() if data[0] else []
+    if ctx.filter_rules:
+        gmail = bool(ctx.filter_rules.get("gmail_raw")) and imap.has_capability("X-GM-EXT-1")
+        literals = imap.has_capability("LITERAL+") or imap.has_capability("LITERAL-")
+        prefilter = build_search_criteria(ctx.filter_rules, gmail=gmail, literals=literals)
+        if prefilter:
+            search_criteria = f"{search_criteria} {prefilter}"
+    result, data = await imap.uid_search(search_criteria)
+    if result != "OK":
+        detail = data[-1].decode(errors="replace") if data and isinstance(data[-1], bytes) else data
+        raise RuntimeError(f"UID SEARCH failed for {callbacks.log_label}: {result} {detail}")
+    uids = [int(u) for u in data[0].split()] if data[0] else []
+    uids = sorted(uid for uid in uids if uid > ctx.last_seen_uid)
+
+    highest_uid = max(uids) if uids else None
+    if ctx.last_seen_uid == 0 and uids:
+        uids = await _skip_processed_uids(imap, uids, ctx, db)
 
     if state:
         if uids:
@@ -103,10 +368,34 @@ async def fetch_new_emails(
             state.queue_total = len(uids)
         state.last_activity_at = datetime.now(timezone.utc)
 
-    for i, uid_bytes in enumerate(uids):
-        uid = int(uid_bytes)
-        if uid <= ctx.last_seen_uid:
-            continue
+    pending_uid = None
+    pending_count = 0
+    pending_emails: list[IncomingEmail] = []
+    last_checkpoint = time.monotonic()
+    enqueued = 0
+
+    async def checkpoint() -> None:
+        nonlocal pending_uid, pending_count, last_checkpoint, enqueued
+        if pending_emails:
+            enqueued += await dedup_and_enqueue_batch(pending_emails, db)
+            pending_emails.clear()
+        if pending_uid is not None:
+            await callbacks.save_uid(pending_uid, db)
+            ctx.last_seen_uid = pending_uid
+        await db.commit()
+        pending_uid = None
+        pending_count = 0
+        last_checkpoint = time.monotonic()
+
+    for i, uid in enumerate(uids):
+        if pending_count and (
+            pending_count >= CHECKPOINT_EVERY_MESSAGES
+            or time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL_SEC
+        ):
+            await checkpoint()
+
+        pending_uid = uid
+        pending_count += 1
 
         _, msg_data = await imap.uid("fetch", str(uid), "(RFC822)")
         if not msg_data or not msg_data[0]:
@@ -119,30 +408,18 @@ async def fetch_new_emails(
                 break
         if raw_email is None:
             continue
-        msg = email_mod.message_from_bytes(raw_email)
-
-        subject = decode_header_value(msg.get("Subject", ""))
-        sender = decode_header_value(msg.get("From", ""))
-        message_id = msg.get("Message-ID", "")
+        parsed = await parse_email_async(raw_email)
+        subject = parsed.subject
+        sender = parsed.sender
+        message_id = parsed.message_id
         if not message_id or not message_id.strip():
             message_id = generate_fallback_message_id(
                 ctx.account_id or 0, ctx.folder_path, ctx.uidvalidity, uid,
             )
-        body = extract_body(msg)
-
-        email_date = None
-        try:
-            date_str = msg.get("Date", "")
-            if date_str:
-                from email.utils import parsedate_to_datetime
-                email_date = parsedate_to_datetime(date_str)
-        except Exception:
-            pass
 
         # Route: determine user_id + source, or skip
         route = await callbacks.route_email(sender, db)
         if route is None:
-            await callbacks.save_uid(uid, db)
             continue
         user_id, source = route
 
@@ -152,36 +429,47 @@ async def fetch_new_emails(
             state.current_email_sender = sender
             state.last_activity_at = datetime.now(timezone.utc)
 
-        await check_dedup_and_enqueue(
+        pending_emails.append(IncomingEmail(
             message_id=message_id,
             subject=subject,
             sender=sender,
-            body=body,
-            email_date=email_date,
+            body=parsed.body,
+            email_date=parsed.email_date,
             email_uid=uid,
             user_id=user_id,
             source_info=ctx.source_info,
             account_id=ctx.account_id,
             folder_path=ctx.folder_path,
             source=source,
-            db=db,
-        )
+        ))
 
-        await callbacks.save_uid(uid, db)
+    if highest_uid is not None:
+        # Also covers trailing messages skipped as already processed
+        pending_uid = highest_uid
+    if server_modseq is not None:
+        await callbacks.save_modseq(server_modseq, db)
+        ctx.highest_modseq = server_modseq
+    await checkpoint()
 
     if state:
         state.last_scan_at = datetime.now(timezone.utc)
         state.clear_queue()
 
+    return enqueued
+
 
 async def idle_loop(
     imap: IMAP4_SSL,
     ctx: FetchContext,
     callbacks: ImapWatcherCallbacks,
-    db: AsyncSession,
     state: WorkerState | None,
 ) -> None:
-    """Persistent IDLE loop. Returns only on connection error (to trigger reconnect)."""
+    """Persistent IDLE loop. Returns only on connection error (to trigger reconnect).
+
+    Holds no DB session while waiting for a push; a short-lived session is
+    opened only to fetch and enqueue the new emails, so pooled connections
+    scale with active work rather than with the number of watched folders.
+    """
     while True:
         if state:
             state.mode = WorkerMode.IDLE
@@ -209,7 +497,8 @@ async def idle_loop(
                         break
 
             if has_new:
-                await fetch_new_emails(imap, ctx, callbacks, db, state)
+                async with async_session() as db:
+                    await fetch_new_emails(imap, ctx, callbacks, db, state)
 
         except asyncio.CancelledError:
             raise
@@ -222,39 +511,72 @@ async def idle_loop(
             return
 
 
+async def _sleep_with_keepalive(imap: IMAP4_SSL, seconds: float) -> None:
+    """Sleep for the polling interval, sending NOOPs so the server keeps the session."""
+    remaining = seconds
+    while remaining > POLL_KEEPALIVE_SEC:
+        await asyncio.sleep(POLL_KEEPALIVE_SEC)
+        remaining -= POLL_KEEPALIVE_SEC
+        await imap.noop()
+    await asyncio.sleep(remaining)
+
+
 async def poll_loop(
+    imap: IMAP4_SSL,
+    ctx: FetchContext,
     callbacks: ImapWatcherCallbacks,
     polling_interval_sec: int,
     state: WorkerState | None,
+    selected: SelectResult | None = None,
+    schedule: PollSchedule | None = None,
 ) -> None:
-    """Polling loop. Disconnects between cycles."""
+    """Polling loop on a persistent connection. Returns only on error (to trigger reconnect).
+
+    The authenticated connection stays open between cycles: each poll
+    re-SELECTs the folder, which refreshes the server's view of the mailbox
+    and reports UIDVALIDITY/HIGHESTMODSEQ. A UIDVALIDITY change returns so the
+    reconnect resets the folder state. Like idle_loop, a DB session is only
+    held while fetching.
+
+    With a schedule, the interval adapts to mail arrival within its bounds
+    (see next_poll_interval); otherwise polling_interval_sec is used as is.
+    """
     interval = polling_interval_sec
+    if schedule:
+        interval = max(schedule.min_interval_sec, min(interval, schedule.max_interval_sec))
+
     while True:
         if state:
             state.mode = WorkerMode.POLLING
             state.next_scan_at = datetime.now(timezone.utc) + timedelta(seconds=interval)
 
-        await asyncio.sleep(interval)
-
         try:
-            async with async_session() as db:
-                connect_result = await callbacks.connect(db)
-                if connect_result is None:
-                    return
-
-                ctx = await callbacks.load_fetch_context(db)
-                if ctx is None:
-                    return
+            await _sleep_with_keepalive(imap, interval)
 
-                await fetch_new_emails(
-                    connect_result.imap, ctx, callbacks, db, state,
+            current = await select_folder(imap, ctx.folder_path)
+            if selected and current.uidvalidity != selected.uidvalidity:
+                logger.info(
+                    f"UIDVALIDITY changed for {callbacks.log_label}, reconnecting"
                 )
                 try:
-                    await connect_result.imap.logout()
+                    await imap.logout()
                 except Exception:
                     pass
+                return
+            selected = current
 
-                interval = connect_result.polling_interval_sec
+            async with async_session() as db:
+                enqueued = await fetch_new_emails(
+                    imap, ctx, callbacks, db, state, selected,
+                )
+                if schedule:
+                    shipments_active = False
+                    if not enqueued and callbacks.has_active_shipments:
+                        shipments_active = await callbacks.has_active_shipments(db)
+                    interval = next_poll_interval(
+                        interval, polling_interval_sec, schedule,
+                        enqueued, shipments_active,
+                    )
 
         except asyncio.CancelledError:
             raise
@@ -267,7 +589,7 @@ async def watch_loop(
     callbacks: ImapWatcherCallbacks,
     state: WorkerState | None,
 ) -> None:
-    """Top-level watch loop with exponential backoff on errors."""
+    """Top-level watch loop with jittered exponential backoff on errors."""
     backoff = 30
 
     while True:
@@ -278,6 +600,10 @@ async def watch_loop(
             state.error = None
 
         try:
+            await _connect_throttle.wait()
+
+            # The session only covers connecting and the catch-up scan; it is
+            # released before the watcher settles into IDLE or polling.
             async with async_session() as db:
                 connect_result = await callbacks.connect(db)
                 if connect_result is None:
@@ -293,34 +619,34 @@ async def watch_loop(
 
                 await fetch_new_emails(
                     connect_result.imap, ctx, callbacks, db, state,
+                    connect_result.selected,
                 )
 
-                backoff = 30
+            backoff = 30
 
-                if not connect_result.use_polling and connect_result.idle_supported:
-                    await idle_loop(
-                        connect_result.imap, ctx, callbacks, db, state,
-                    )
-                else:
-                    try:
-                        await connect_result.imap.logout()
-                    except Exception:
-                        pass
-                    await poll_loop(
-                        callbacks, connect_result.polling_interval_sec, state,
-                    )
+            if not connect_result.use_polling and connect_result.idle_supported:
+                await idle_loop(connect_result.imap, ctx, callbacks, state)
+            else:
+                await poll_loop(
+                    connect_result.imap, ctx, callbacks,
+                    connect_result.polling_interval_sec, state,
+                    connect_result.selected, connect_result.poll_schedule,
+                )
 
         except asyncio.CancelledError:
             logger.info(f"Watcher cancelled for {callbacks.log_label}")
             return
         except Exception as e:
             logger.error(f"Error watching {callbacks.log_label}: {e}")
+            delay = jittered_backoff(backoff)
             if state:
                 state.mode = WorkerMode.ERROR_BACKOFF
                 state.error = str(e)
                 state.next_scan_at = datetime.now(timezone.utc) + timedelta(
-                    seconds=backoff
+                    seconds=delay
                 )
+        else:
+            delay = jittered_backoff(backoff)
 
-        await asyncio.sleep(backoff)
+        await asyncio.sleep(delay)
         backoff = min(backoff * 2, MAX_BACKOFF_SEC)
@@ -5,6 +5,9 @@ from enum import StrEnum
 
 IDLE_TIMEOUT_SEC = 24 * 60  # 24 minutes, safely under RFC 2177's 29-minute limit
 MAX_BACKOFF_SEC = 300  # 5 minutes max backoff
+POLL_KEEPALIVE_SEC = 5 * 60  # NOOP a persistent polling connection at least this often
+CHECKPOINT_EVERY_MESSAGES = 50  # commit last_seen_uid after this many messages
+CHECKPOINT_INTERVAL_SEC = 10  # ...or after this many seconds, whichever comes first
 
 
 class WorkerMode(StrEnum):
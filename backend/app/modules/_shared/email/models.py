@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import DateTime, ForeignKey, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -27,3 +27,46 @@ class ProcessedEmail(Base):
 
     account = relationship("EmailAccount")
     queue_item = relationship("QueueItem")
+
+
+class WorkerNode(Base):
+    """A backend process taking part in a watcher pool, kept alive by heartbeats."""
+    __tablename__ = "worker_nodes"
+
+    node_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    pool: Mapped[str] = mapped_column(String(64), primary_key=True)
+    hostname: Mapped[str] = mapped_column(String(255))
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    last_heartbeat_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class WatcherLease(Base):
+    """Exclusive, expiring claim of a node on one watcher (e.g. "folder:12")."""
+    __tablename__ = "watcher_leases"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    node_id: Mapped[str] = mapped_column(String(255), index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class WatcherStatus(Base):
+    """Last published state of a running watcher, one row per node and lease key.
+
+    Nodes replace their rows on every heartbeat; rows older than the node TTL
+    belong to watchers that are no longer running.
+    """
+    __tablename__ = "watcher_states"
+
+    node_id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True, index=True)
+    pool: Mapped[str] = mapped_column(String(64))
+    mode: Mapped[str] = mapped_column(String(32))
+    last_scan_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    next_scan_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_activity_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    queue_total: Mapped[int] = mapped_column(Integer, default=0)
+    queue_position: Mapped[int] = mapped_column(Integer, default=0)
+    current_email_subject: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    current_email_sender: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,108 @@
+"""Per-folder prefilter rules compiled into IMAP UID SEARCH criteria.
+
+The server applies them, so messages that cannot be relevant are never
+downloaded, parsed or sent to an analyser. Rules are stored as JSON on the
+watched folder (or the global mailbox) and validated by SearchFilterRules.
+
+IMAP quoted strings are 7-bit only, so values with other characters (a
+German subject such as "Bestellbestätigung") are sent as non-synchronizing
+literals (RFC 7888), which need LITERAL+ or LITERAL-. Servers without
+either cannot be given such values; the search is then widened instead,
+and the analyser sees the extra messages.
+"""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+MAX_RULE_VALUES = 50
+MAX_VALUE_LENGTH = 200
+
+
+class SearchFilterRules(BaseModel):
+    """Optional server-side filters; an empty rule set matches every message.
+
+    sender_allow:     Only messages whose From contains one of these
+                      (an address or a domain such as "amazon.de").
+    sender_deny:      Skip messages whose From contains any of these.
+    subject_keywords: Only messages whose Subject contains one of these.
+    gmail_raw:        Gmail search query (X-GM-RAW), e.g. "category:updates".
+                      Ignored on servers without the X-GM-EXT-1 capability.
+    """
+    sender_allow: list[str] = Field(default_factory=list, max_length=MAX_RULE_VALUES)
+    sender_deny: list[str] = Field(default_factory=list, max_length=MAX_RULE_VALUES)
+    subject_keywords: list[str] = Field(default_factory=list, max_length=MAX_RULE_VALUES)
+    gmail_raw: Optional[str] = None
+
+    @field_validator("sender_allow", "sender_deny", "subject_keywords")
+    @classmethod
+    def _clean_values(cls, values: list[str]) -> list[str]:
+        cleaned = []
+        for value in values:
+            value = _check_value(value)
+            if value and value not in cleaned:
+                cleaned.append(value)
+        return cleaned
+
+    @field_validator("gmail_raw")
+    @classmethod
+    def _clean_gmail_raw(cls, value: str | None) -> str | None:
+        if value is None:
+            return None
+        return _check_value(value) or None
+
+
+def _check_value(value: str) -> str:
+    value = value.strip()
+    if any(ord(ch) < 32 or ord(ch) == 127 for ch in value):
+        raise ValueError("Filter values must not contain control characters")
+    if len(value) > MAX_VALUE_LENGTH:
+        raise ValueError(f"Filter values must be at most {MAX_VALUE_LENGTH} characters")
+    return value
+
+
+def _quote(value: str, literals: bool) -> str | None:
+    """A SEARCH string argument, or None if the server cannot be sent ``value``."""
+    if not value.isascii():
+        if not literals:
+            return None
+        return f"{{{len(value.encode())}+}}\r\n{value}"
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _any_of(key: str, values: list[str], literals: bool) -> str | None:
+    """IMAP OR is binary and prefix: OR a OR b c."""
+    quoted = [_quote(v, literals) for v in values]
+    if None in quoted:
+        # Leaving out one alternative would hide its messages; drop the whole clause
+        return None
+    terms = [f"{key} {q}" for q in quoted]
+    criteria = terms[-1]
+    for term in reversed(terms[:-1]):
+        criteria = f"OR {term} {criteria}"
+    return criteria
+
+
+def build_search_criteria(rules: dict | None, gmail: bool = False, literals: bool = False) -> str:
+    """Compile stored filter rules into extra UID SEARCH keys ("" for none).
+
+    ``gmail`` enables X-GM-RAW; pass whether the server advertises X-GM-EXT-1.
+    ``literals`` allows non-ASCII values; pass whether it advertises LITERAL+
+    or LITERAL-. Without it, rules with non-ASCII values are left out.
+    """
+    if not rules:
+        return ""
+    parsed = SearchFilterRules.model_validate(rules)
+    parts = []
+    if parsed.sender_allow:
+        parts.append(_any_of("FROM", parsed.sender_allow, literals))
+    for sender in parsed.sender_deny:
+        quoted = _quote(sender, literals)
+        parts.append(f"NOT FROM {quoted}" if quoted else None)
+    if parsed.subject_keywords:
+        parts.append(_any_of("SUBJECT", parsed.subject_keywords, literals))
+    if parsed.gmail_raw and gmail:
+        quoted = _quote(parsed.gmail_raw, literals)
+        parts.append(f"X-GM-RAW {quoted}" if quoted else None)
+    return " ".join(part for part in parts if part)
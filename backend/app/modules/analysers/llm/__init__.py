@@ -1,7 +1,7 @@
 from app.core.module_base import ModuleInfo
 from app.modules.analysers.llm.router import router
-from app.modules.analysers.llm.models import LLMConfig
-from app.modules.analysers.llm.service import get_status, check_configured, analyze
+from app.modules.analysers.llm.models import LLMAnalysisCache, LLMConfig
+from app.modules.analysers.llm.service import get_status, check_configured, analyze, analyze_batch
 
 MODULE_INFO = ModuleInfo(
     key="llm",
@@ -10,8 +10,9 @@ MODULE_INFO = ModuleInfo(
     version="1.0.0",
     description="Analyse data using LLM (via LiteLLM) to extract order information",
     router=router,
-    models=[LLMConfig],
+    models=[LLMConfig, LLMAnalysisCache],
     status=get_status,
     is_configured=check_configured,
     analyze=analyze,
+    analyze_batch=analyze_batch,
 )
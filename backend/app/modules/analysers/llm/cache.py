@@ -0,0 +1,139 @@
+"""Content-addressed cache of LLM analysis results.
+
+The same email often reaches the analyser more than once: via a user
+mailbox and the global mailbox, as a retry, or when reprocessing. Results
+are keyed by a hash of the prompt, the model and the normalized content,
+so any of these costs one lookup instead of an LLM call. Entries expire
+after PT_LLM_CACHE_TTL_HOURS; beyond PT_LLM_CACHE_MAX_ENTRIES the oldest
+are evicted periodically.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session
+from app.modules.analysers.llm.models import LLMAnalysisCache
+
+logger = logging.getLogger(__name__)
+
+# Identify a delivery rather than its content; they never change the analysis
+_IDENTITY_FIELDS = {"message_id", "email_uid"}
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Eviction counts the whole table, so it runs only every this many stores
+EVICT_EVERY_STORES = 100
+
+_hits = 0
+_misses = 0
+_stores = 0
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return _WHITESPACE_RE.sub(" ", value).strip()
+    return value
+
+
+def cache_key(prompt: str, model: str, raw_data: dict) -> str:
+    content = {
+        key: _normalize(value)
+        for key, value in raw_data.items()
+        if key not in _IDENTITY_FIELDS
+    }
+    payload = json.dumps(
+        {"prompt": _normalize(prompt), "model": model, "content": content},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def enabled() -> bool:
+    return settings.llm_cache_ttl_hours > 0
+
+
+async def get_cached(db: AsyncSession, key: str) -> dict | None:
+    """Return the cached analysis for ``key`` if present and not expired."""
+    global _hits, _misses
+    result = await db.execute(
+        select(LLMAnalysisCache.result).where(
+            LLMAnalysisCache.key == key,
+            LLMAnalysisCache.expires_at > datetime.now(timezone.utc),
+        )
+    )
+    cached = result.scalar_one_or_none()
+    if cached is None:
+        _misses += 1
+    else:
+        _hits += 1
+    return cached
+
+
+async def store(key: str, model: str, analysis: dict) -> None:
+    """Cache a validated analysis.
+
+    Uses its own session, so the caller's transaction is neither committed
+    nor rolled back. Expired and surplus entries are evicted every
+    EVICT_EVERY_STORES stores rather than on each one.
+    """
+    global _stores
+    now = datetime.now(timezone.utc)
+    async with async_session() as db:
+        db.add(LLMAnalysisCache(
+            key=key,
+            model=model,
+            result=analysis,
+            created_at=now,
+            expires_at=now + timedelta(hours=settings.llm_cache_ttl_hours),
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Stored concurrently by another worker
+            await db.rollback()
+        _stores += 1
+        if _stores % EVICT_EVERY_STORES == 0:
+            await evict(db)
+
+
+async def evict(db: AsyncSession) -> None:
+    """Delete expired entries and the oldest beyond PT_LLM_CACHE_MAX_ENTRIES. Commits."""
+    await db.execute(
+        delete(LLMAnalysisCache)
+        .where(LLMAnalysisCache.expires_at <= datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    )
+    count = (await db.execute(select(func.count()).select_from(LLMAnalysisCache))).scalar() or 0
+    if count > settings.llm_cache_max_entries:
+        surplus = (
+            select(LLMAnalysisCache.key)
+            .order_by(LLMAnalysisCache.created_at.desc())
+            .offset(settings.llm_cache_max_entries)
+        )
+        await db.execute(
+            delete(LLMAnalysisCache)
+            .where(LLMAnalysisCache.key.in_(surplus))
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+
+async def purge(db: AsyncSession) -> int:
+    """Delete all cached analyses; returns how many were removed."""
+    result = await db.execute(delete(LLMAnalysisCache))
+    await db.commit()
+    logger.info(f"Purged {result.rowcount} cached LLM analyses")
+    return result.rowcount
+
+
+async def get_stats(db: AsyncSession) -> dict:
+    """Hit/miss counts of this process and the number of cached entries."""
+    entries = (await db.execute(select(func.count()).select_from(LLMAnalysisCache))).scalar() or 0
+    return {"hits": _hits, "misses": _misses, "entries": entries}
@@ -0,0 +1,276 @@
+"""Per-config throttling of LLM requests.
+
+Every LLM config gets a Limiter with a token bucket for requests per minute,
+one for tokens per minute, and a cap on concurrent requests. Callers wait
+in order until there is room instead of failing. A request reserves its
+prompt tokens plus max_tokens, and the reported usage is settled afterwards.
+
+The provider's rate-limit headers refine the buckets. Reported remaining
+requests or tokens lower the fill level, and limits the provider reports
+apply when none are configured. When a limit is exhausted, the config
+pauses until its reset. A 429 pauses for Retry-After (or an exponential
+backoff) and the request is queued again.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import litellm
+
+logger = logging.getLogger(__name__)
+
+MAX_RATE_LIMIT_RETRIES = 5
+# Pause after a 429 without Retry-After, doubled on every further 429
+DEFAULT_BACKOFF_SEC = 2.0
+MAX_PAUSE_SEC = 300.0
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+# (remaining, limit, reset) headers per bucket, OpenAI style first
+_REQUEST_HEADERS = [
+    ("x-ratelimit-remaining-requests", "x-ratelimit-limit-requests", "x-ratelimit-reset-requests"),
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-reset"),
+]
+_TOKEN_HEADERS = [
+    ("x-ratelimit-remaining-tokens", "x-ratelimit-limit-tokens", "x-ratelimit-reset-tokens"),
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-reset"),
+]
+
+
+def _parse_seconds(value: str) -> float | None:
+    """Seconds until a reset given as "20", "1m30s", "250ms", an RFC 3339 timestamp or an HTTP date."""
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _parse_int(value) -> int | None:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize(headers: Mapping | None) -> dict[str, str]:
+    """Lowercase header names and drop LiteLLM's "llm_provider-" prefix."""
+    if not isinstance(headers, Mapping):
+        return {}
+    return {
+        str(name).lower().removeprefix("llm_provider-"): str(value)
+        for name, value in headers.items()
+    }
+
+
+def _retry_after(headers: dict[str, str]) -> float | None:
+    if "retry-after-ms" in headers:
+        milliseconds = _parse_int(headers["retry-after-ms"])
+        if milliseconds is not None:
+            return milliseconds / 1000
+    if "retry-after" in headers:
+        return _parse_seconds(headers["retry-after"])
+    return None
+
+
+def response_headers(obj) -> dict[str, str]:
+    """Rate-limit headers of a LiteLLM response or exception."""
+    hidden = getattr(obj, "_hidden_params", None)
+    if isinstance(hidden, dict):
+        return _normalize(hidden.get("additional_headers"))
+    headers = getattr(obj, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(obj, "response", None), "headers", None)
+    return _normalize(headers)
+
+
+class _Bucket:
+    """Token bucket holding one minute's worth, refilled continuously."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        # A request larger than the bucket waits for a full bucket, not forever
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        # May go negative: an underestimate is paid back before the next request
+        self.level -= amount
+
+    def sync(self, remaining: int) -> None:
+        self._refill(time.monotonic())
+        self.level = min(self.level, float(remaining))
+
+
+class Limiter:
+    def __init__(self, rpm: int | None = None, tpm: int | None = None, max_concurrency: int | None = None):
+        self.requests = _Bucket(rpm) if rpm else None
+        self.tokens = _Bucket(tpm) if tpm else None
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        # Waiting callers are admitted one at a time, in arrival order
+        self._turn = asyncio.Lock()
+        self.paused_until = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+
+    def pause(self, seconds: float) -> None:
+        seconds = min(seconds, MAX_PAUSE_SEC)
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def _admit(self, tokens: int) -> None:
+        async with self._turn:
+            while True:
+                now = time.monotonic()
+                wait = self.paused_until - now
+                if self.requests:
+                    wait = max(wait, self.requests.wait_time(1, now))
+                if self.tokens:
+                    wait = max(wait, self.tokens.wait_time(tokens, now))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait for a concurrency slot and room for one request of ``tokens`` tokens."""
+        self.waiting += 1
+        try:
+            if self._semaphore:
+                await self._semaphore.acquire()
+            try:
+                await self._admit(tokens)
+            except BaseException:
+                if self._semaphore:
+                    self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._semaphore:
+            self._semaphore.release()
+
+    def settle(self, reserved: int, used: int) -> None:
+        """Correct the token bucket once the actual usage is known."""
+        if self.tokens:
+            self.tokens.take(used - reserved)
+
+    def _apply(self, headers: dict[str, str], bucket_attr: str, names: list[tuple[str, str, str]]) -> None:
+        for remaining_name, limit_name, reset_name in names:
+            if remaining_name not in headers:
+                continue
+            remaining = _parse_int(headers[remaining_name])
+            limit = _parse_int(headers.get(limit_name))
+            if getattr(self, bucket_attr) is None and limit:
+                logger.info(f"Adopting provider {bucket_attr} limit of {limit} per minute")
+                setattr(self, bucket_attr, _Bucket(limit))
+            bucket = getattr(self, bucket_attr)
+            if remaining is None:
+                return
+            if bucket:
+                bucket.sync(remaining)
+            if remaining <= 0:
+                reset = _parse_seconds(headers.get(reset_name, ""))
+                if reset:
+                    self.pause(reset)
+            return
+
+    def update_from_headers(self, headers: dict[str, str]) -> None:
+        """Adapt to the provider's reported limits (normalized headers, see response_headers)."""
+        retry_after = _retry_after(headers)
+        if retry_after:
+            self.pause(retry_after)
+        self._apply(headers, "requests", _REQUEST_HEADERS)
+        self._apply(headers, "tokens", _TOKEN_HEADERS)
+
+    def on_rate_limited(self, headers: dict[str, str], attempt: int) -> float:
+        """Pause after a 429 and return the pause in seconds."""
+        self.rate_limited += 1
+        self.update_from_headers(headers)
+        pause = _retry_after(headers) or DEFAULT_BACKOFF_SEC * 2 ** attempt
+        self.pause(pause)
+        return min(pause, MAX_PAUSE_SEC)
+
+    def get_stats(self) -> dict:
+        return {
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "paused_sec": round(max(self.paused_until - time.monotonic(), 0.0), 1),
+            "rate_limited": self.rate_limited,
+        }
+
+    async def run(self, call: Callable[[], Awaitable], tokens: int):
+        """Run an LLM call within the limits, queueing again after a 429.
+
+        Raises the RateLimitError once MAX_RATE_LIMIT_RETRIES retries are used up.
+        """
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await self.acquire(tokens)
+            try:
+                response = await call()
+            except litellm.RateLimitError as e:
+                if attempt == MAX_RATE_LIMIT_RETRIES:
+                    raise
+                pause = self.on_rate_limited(response_headers(e), attempt)
+                logger.warning(f"LLM rate limited, retrying in {pause:.1f}s")
+                continue
+            finally:
+                self.release()
+            self.update_from_headers(response_headers(response))
+            used = getattr(getattr(response, "usage", None), "total_tokens", None)
+            if isinstance(used, int):
+                self.settle(tokens, used)
+            return response
+
+
+_limiters: dict[int, tuple[tuple, Limiter]] = {}
+
+
+def for_config(config) -> Limiter:
+    """The shared limiter of an LLM config, rebuilt when its limits change."""
+    limits = (config.rpm_limit, config.tpm_limit, config.max_concurrency)
+    if config.id is None:
+        return Limiter(*limits)
+    entry = _limiters.get(config.id)
+    if entry is None or entry[0] != limits:
+        entry = limits, Limiter(*limits)
+        _limiters[config.id] = entry
+    return entry[1]
+
+
+def reset() -> None:
+    _limiters.clear()
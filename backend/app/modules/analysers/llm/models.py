@@ -1,4 +1,6 @@
-from sqlalchemy import String, Boolean, Text
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Integer, String, Boolean, Text
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.database import Base
@@ -14,3 +16,20 @@ class LLMConfig(Base):
     api_base_url: Mapped[str] = mapped_column(String(512), default="")
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     system_prompt: Mapped[str | None] = mapped_column(Text, nullable=True, default=None)
+    # Provider limits; None means unlimited (or whatever the provider reports)
+    rpm_limit: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
+    tpm_limit: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
+    max_concurrency: Mapped[int | None] = mapped_column(Integer, nullable=True, default=None)
+    # Share of requests among the active configs; 0 = only used as a fallback
+    weight: Mapped[int] = mapped_column(Integer, default=1)
+
+
+class LLMAnalysisCache(Base):
+    """Validated analysis result keyed by a hash of prompt, model and content."""
+    __tablename__ = "llm_analysis_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(255))
+    result: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
@@ -0,0 +1,131 @@
+"""Shrink email content before it is sent to the LLM.
+
+The body loses quoted reply history, the signature, legal and unsubscribe
+boilerplate, repeated lines and redundant whitespace. The result is
+serialized as compact JSON and truncated to a token budget, counted with
+LiteLLM's bundled tiktoken encoding. Order details sit near the top of an
+email, so truncation keeps the beginning of the body.
+"""
+
+import json
+import logging
+import re
+
+import litellm
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Reserved for the model's answer when fitting the input into its context
+OUTPUT_TOKENS = 2048
+# Keep quoted history when less than this much text precedes it (e.g. forwards)
+MIN_OWN_TEXT_CHARS = 80
+# Lines at least this long are dropped when they repeat
+MIN_DEDUP_LINE_CHARS = 40
+MAX_BOILERPLATE_LINE_CHARS = 300
+
+_REPLY_MARKER_RE = re.compile(
+    r"^(?:-{3,}\s*(?:original message|ursprüngliche nachricht)\s*-{3,}"
+    r"|on .{5,120} wrote:|am .{5,120} schrieb .{1,120}:)\s*$",
+    re.IGNORECASE,
+)
+_SIGNATURE_RE = re.compile(r"^-- ?$")
+_BOILERPLATE_RE = re.compile(
+    r"unsubscribe|abmelden|abbestellen|newsletter|privacy policy|datenschutz|impressum"
+    r"|all rights reserved|alle rechte vorbehalten|this (?:e-?mail|message) was sent to"
+    r"|diese (?:e-?mail|nachricht) wurde an|handelsregister|registergericht|amtsgericht"
+    r"|geschäftsführ|ust-?id|vat (?:id|number)|sitz der gesellschaft",
+    re.IGNORECASE,
+)
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+
+_tokens_in = 0
+_tokens_sent = 0
+
+
+def count_tokens(text: str) -> int:
+    return len(litellm.encoding.encode(text, disallowed_special=()))
+
+
+def _truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = litellm.encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return litellm.encoding.decode(tokens[:max(max_tokens, 0)])
+
+
+def _strip_quoted(lines: list[str]) -> list[str]:
+    for index, line in enumerate(lines):
+        if _REPLY_MARKER_RE.match(line.strip()):
+            own = [l for l in lines[:index] if not l.lstrip().startswith(">")]
+            if sum(len(l.strip()) for l in own) >= MIN_OWN_TEXT_CHARS:
+                return own
+            return lines
+    own = [l for l in lines if not l.lstrip().startswith(">")]
+    return own if sum(len(l.strip()) for l in own) >= MIN_OWN_TEXT_CHARS else lines
+
+
+def compact_body(body: str) -> str:
+    """Remove quoted history, signature, boilerplate, repeats and extra whitespace."""
+    lines = _strip_quoted(body.splitlines())
+    for index, line in enumerate(lines):
+        if _SIGNATURE_RE.match(line):
+            lines = lines[:index]
+            break
+
+    kept = []
+    seen = set()
+    for line in lines:
+        line = _SPACES_RE.sub(" ", line).strip()
+        if not line:
+            if kept and kept[-1]:
+                kept.append("")
+            continue
+        if len(line) <= MAX_BOILERPLATE_LINE_CHARS and _BOILERPLATE_RE.search(line):
+            continue
+        if kept and line == kept[-1]:
+            continue
+        if len(line) >= MIN_DEDUP_LINE_CHARS:
+            if line in seen:
+                continue
+            seen.add(line)
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def token_budget(litellm_model: str, prompt: str) -> int:
+    """Tokens available for the email: the configured cap, limited by the model's context."""
+    budget = settings.llm_max_input_tokens
+    try:
+        context = litellm.get_model_info(litellm_model).get("max_input_tokens")
+    except Exception:
+        context = None
+    if context:
+        budget = min(budget, context - count_tokens(prompt) - OUTPUT_TOKENS)
+    return max(budget, 0)
+
+
+def build_user_message(raw_data: dict, budget: int) -> str:
+    """Serialize raw_data compactly with a preprocessed body that fits ``budget`` tokens."""
+    global _tokens_in, _tokens_sent
+    data = {key: value for key, value in raw_data.items() if value not in (None, "")}
+    body = compact_body(data.pop("body", "") or "")
+
+    envelope = json.dumps({**data, "body": ""}, ensure_ascii=False, separators=(",", ":"))
+    # JSON escaping (newlines, quotes) costs a few tokens more than the raw body
+    body = _truncate_tokens(body, int((budget - count_tokens(envelope)) * 0.9))
+    message = json.dumps({**data, "body": body}, ensure_ascii=False, separators=(",", ":"))
+
+    before = count_tokens(json.dumps(raw_data, ensure_ascii=False, indent=2))
+    after = count_tokens(message)
+    _tokens_in += before
+    _tokens_sent += after
+    if before > after:
+        logger.debug(f"Preprocessing reduced LLM input from {before} to {after} tokens")
+    return message
+
+
+def get_stats() -> dict:
+    """Tokens of raw input vs. tokens actually sent, since this process started."""
+    return {"tokens_in": _tokens_in, "tokens_sent": _tokens_sent, "tokens_saved": _tokens_in - _tokens_sent}
@@ -0,0 +1,107 @@
+"""Recover JSON from LLM answers that are almost, but not quite, valid.
+
+Models without structured output wrap their JSON in Markdown fences, add
+prose before or after it, use single quotes or Python literals, leave
+trailing commas, or run out of tokens mid-answer. One pass over the text
+fixes these. It keeps the first JSON object or array, rewrites strings
+with double quotes, and drops trailing commas. If the answer was cut off,
+it closes what is still open, backing up to the last complete element.
+A value that was cut off is dropped, not completed.
+"""
+
+import json
+
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _drop_trailing_comma(out: list[str]) -> None:
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1]
+
+
+def _close(out: list[str], stack: list[str]) -> str:
+    text = "".join(out).rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def repair_json(text: str):
+    """Parse ``text`` as JSON, repairing common defects. Raises ValueError if nothing is recoverable."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    starts = [pos for pos in (text.find("{"), text.find("[")) if pos >= 0]
+    if not starts:
+        raise ValueError("No JSON object or array in LLM response")
+
+    out: list[str] = []
+    stack: list[str] = []
+    # (length of out, open containers) after each complete element
+    checkpoints: list[tuple[int, list[str]]] = []
+    quote = None
+    i = min(starts)
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(text):
+                escaped = text[i + 1]
+                out.append("'" if escaped == "'" else ch + escaped)
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+                out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+        elif ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            _drop_trailing_comma(out)
+            out.append(ch)
+            if not stack:
+                break
+        elif ch == ",":
+            checkpoints.append((len(out), list(stack)))
+            out.append(ch)
+        elif ch.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if not stack:
+        candidates = ["".join(out)]
+    else:
+        # Cut off: the last element is only kept if it is a complete container.
+        # A truncated value (half an order number) must not pass as data.
+        candidates = [_close(out, stack)] if "".join(out).rstrip().endswith(("}", "]")) else []
+        candidates += [_close(out[:length], open_containers) for length, open_containers in reversed(checkpoints)]
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("LLM response is not repairable JSON")
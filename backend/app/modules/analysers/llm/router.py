@@ -7,21 +7,22 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.encryption import encrypt_value, decrypt_value
 from app.database import get_db
 from app.modules.analysers.llm.models import LLMConfig
-from app.modules.analysers.llm.schemas import LLMConfigRequest, LLMConfigResponse
+from app.modules.analysers.llm.schemas import (
+    LLMConfigRequest,
+    LLMConfigResponse,
+    LLMEndpointRequest,
+    LLMEndpointUpdateRequest,
+)
 from app.api.deps import get_admin_user
-from app.modules.analysers.llm.service import call_llm, SYSTEM_PROMPT
+from app.modules.analysers.llm import cache
+from app.modules.analysers.llm.service import active_configs, call_llm, SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["llm"], dependencies=[Depends(get_admin_user)])
 
 
-@router.get("/config", response_model=LLMConfigResponse | None)
-async def get_config(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LLMConfig).where(LLMConfig.is_active == True))
-    config = result.scalar_one_or_none()
-    if not config:
-        return None
+def _response(config: LLMConfig) -> LLMConfigResponse:
     is_default = not config.system_prompt
     return LLMConfigResponse(
         id=config.id, provider=config.provider, model_name=config.model_name,
@@ -30,44 +31,101 @@ async def get_config(db: AsyncSession = Depends(get_db)):
         system_prompt=SYSTEM_PROMPT if is_default else config.system_prompt,
         is_default=is_default,
         default_system_prompt=SYSTEM_PROMPT,
+        rpm_limit=config.rpm_limit, tpm_limit=config.tpm_limit,
+        max_concurrency=config.max_concurrency, weight=config.weight,
     )
 
 
+def _apply(config: LLMConfig, req: LLMConfigRequest | LLMEndpointUpdateRequest) -> None:
+    """Copy the fields the client sent onto ``config``; omitted fields keep their value."""
+    fields = req.model_dump(exclude_unset=True)
+    api_key = fields.pop("api_key", None)
+    if api_key is not None:
+        config.api_key_encrypted = encrypt_value(api_key)
+    if fields.get("api_base_url", "") is None:
+        del fields["api_base_url"]
+    if "system_prompt" in fields:
+        prompt = fields.pop("system_prompt")
+        config.system_prompt = prompt.strip() if prompt else None
+    for name in ("provider", "model_name", "is_active", "weight"):
+        if fields.get(name, "") is None:
+            del fields[name]
+    for name, value in fields.items():
+        setattr(config, name, value)
+
+
+async def _get_config(db: AsyncSession, config_id: int) -> LLMConfig:
+    config = await db.get(LLMConfig, config_id)
+    if not config:
+        raise HTTPException(status_code=404, detail="LLM config not found")
+    return config
+
+
+@router.get("/config", response_model=LLMConfigResponse | None)
+async def get_config(db: AsyncSession = Depends(get_db)):
+    """The primary config: the first active one, whose system prompt applies to all."""
+    configs = await active_configs(db)
+    return _response(configs[0]) if configs else None
+
+
 @router.patch("/config", response_model=LLMConfigResponse)
 async def update_config(req: LLMConfigRequest, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LLMConfig).where(LLMConfig.is_active == True))
-    config = result.scalar_one_or_none()
-    if not config:
+    configs = await active_configs(db)
+    if configs:
+        config = configs[0]
+    else:
         config = LLMConfig(provider=req.provider, model_name=req.model_name)
         db.add(config)
-    else:
-        config.provider = req.provider
-        config.model_name = req.model_name
-    if req.api_key is not None:
-        config.api_key_encrypted = encrypt_value(req.api_key)
-    if req.api_base_url is not None:
-        config.api_base_url = req.api_base_url
-    config.system_prompt = req.system_prompt.strip() if req.system_prompt else None
+    _apply(config, req)
     config.is_active = True
     await db.commit()
     await db.refresh(config)
-    is_default = not config.system_prompt
-    return LLMConfigResponse(
-        id=config.id, provider=config.provider, model_name=config.model_name,
-        api_base_url=config.api_base_url, is_active=config.is_active,
-        has_api_key=bool(config.api_key_encrypted),
-        system_prompt=SYSTEM_PROMPT if is_default else config.system_prompt,
-        is_default=is_default,
-        default_system_prompt=SYSTEM_PROMPT,
-    )
+    return _response(config)
+
+
+@router.get("/configs", response_model=list[LLMConfigResponse])
+async def list_configs(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(LLMConfig).order_by(LLMConfig.id))
+    return [_response(config) for config in result.scalars()]
+
+
+@router.post("/configs", response_model=LLMConfigResponse, status_code=201)
+async def create_config(req: LLMEndpointRequest, db: AsyncSession = Depends(get_db)):
+    """Add an endpoint; active configs share the requests (see routing)."""
+    config = LLMConfig(provider=req.provider, model_name=req.model_name)
+    _apply(config, req)
+    db.add(config)
+    await db.commit()
+    await db.refresh(config)
+    return _response(config)
+
+
+@router.patch("/configs/{config_id}", response_model=LLMConfigResponse)
+async def update_endpoint(config_id: int, req: LLMEndpointUpdateRequest, db: AsyncSession = Depends(get_db)):
+    config = await _get_config(db, config_id)
+    _apply(config, req)
+    await db.commit()
+    await db.refresh(config)
+    return _response(config)
+
+
+@router.delete("/configs/{config_id}", status_code=204)
+async def delete_config(config_id: int, db: AsyncSession = Depends(get_db)):
+    config = await _get_config(db, config_id)
+    await db.delete(config)
+    await db.commit()
 
 
 @router.post("/test")
-async def test_llm(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(LLMConfig).where(LLMConfig.is_active == True))
-    config = result.scalar_one_or_none()
-    if not config:
-        raise HTTPException(status_code=400, detail="No LLM configured")
+async def test_llm(config_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    """Send a trivial request to one config, by default the primary."""
+    if config_id is not None:
+        config = await _get_config(db, config_id)
+    else:
+        configs = await active_configs(db)
+        if not configs:
+            raise HTTPException(status_code=400, detail="No LLM configured")
+        config = configs[0]
     try:
         api_key = decrypt_value(config.api_key_encrypted) if config.api_key_encrypted else None
         text = await call_llm(
@@ -79,3 +137,10 @@ async def test_llm(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logger.warning("LLM test failed for %s/%s: %s", config.provider, config.model_name, e)
         raise HTTPException(status_code=502, detail=f"LLM test call failed: {e}")
+
+
+@router.delete("/cache")
+async def purge_cache(db: AsyncSession = Depends(get_db)):
+    """Drop all cached analyses, e.g. after improving the prompt outside the config."""
+    deleted = await cache.purge(db)
+    return {"deleted": deleted}
@@ -0,0 +1,188 @@
+"""Spread LLM requests over the active configs.
+
+A request goes to the healthy config with the lowest expected wait. The
+expected wait is the config's recent median latency times (requests in
+flight + 1), divided by its weight. Configs without samples yet count as
+DEFAULT_LATENCY_SEC, so new endpoints get traffic. Weight 0 marks a
+backup that is only used when the others fail.
+
+When a config errors, the request fails over to the next one. The failing
+config drops to the end of the ranking for a cooldown that doubles with
+each consecutive failure. Errors caused by the request itself (a bad or
+oversized prompt, a content policy refusal) would fail on every config, so
+they are raised right away and do not count against the config.
+
+With PT_LLM_HEDGE_REQUESTS enabled, a request that has not been answered
+within the config's p95 latency is sent again. The copy goes to the next
+config, or to the same one if it is the only config. The first answer
+wins.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+import litellm
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 100
+MIN_HEDGE_SAMPLES = 20
+DEFAULT_LATENCY_SEC = 1.0
+FAILURE_COOLDOWN_SEC = 30.0
+MAX_COOLDOWN_SEC = 600.0
+
+
+class _Endpoint:
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.in_flight = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+    def quantile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def hedge_delay(self) -> float | None:
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return self.quantile(0.95)
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        cooldown = min(FAILURE_COOLDOWN_SEC * 2 ** (self.failures - 1), MAX_COOLDOWN_SEC)
+        self.down_until = time.monotonic() + cooldown
+
+
+# Request-level 4xx errors; ContextWindowExceeded and ContentPolicyViolation are BadRequestErrors
+_REQUEST_ERRORS = (litellm.BadRequestError, litellm.UnprocessableEntityError)
+
+_endpoints: dict[int, _Endpoint] = {}
+_hedged = 0
+
+
+def _endpoint(config) -> _Endpoint:
+    return _endpoints.setdefault(config.id, _Endpoint())
+
+
+def _label(config) -> str:
+    return f"{config.provider}/{config.model_name} (#{config.id})"
+
+
+def rank(configs: list) -> list:
+    """Order configs by expected wait; configs in cooldown go last, soonest back first."""
+    now = time.monotonic()
+
+    def expected_wait(config) -> tuple:
+        endpoint = _endpoint(config)
+        latency = endpoint.quantile(0.5) or DEFAULT_LATENCY_SEC
+        if not config.weight:
+            return True, latency * (endpoint.in_flight + 1)
+        return False, latency * (endpoint.in_flight + 1) / config.weight
+
+    healthy = [config for config in configs if _endpoint(config).down_until <= now]
+    down = [config for config in configs if _endpoint(config).down_until > now]
+    return sorted(healthy, key=expected_wait) + sorted(down, key=lambda config: _endpoint(config).down_until)
+
+
+async def _timed(config, attempt: Callable[..., Awaitable]):
+    endpoint = _endpoint(config)
+    endpoint.in_flight += 1
+    start = time.monotonic()
+    try:
+        result = await attempt(config)
+    except _REQUEST_ERRORS:
+        raise
+    except Exception:
+        endpoint.record_failure()
+        raise
+    finally:
+        endpoint.in_flight -= 1
+    endpoint.record_success(time.monotonic() - start)
+    return result
+
+
+async def _hedge(config, backup, attempt: Callable[..., Awaitable]):
+    global _hedged
+    delay = _endpoint(config).hedge_delay() if settings.llm_hedge_requests else None
+    first = asyncio.ensure_future(_timed(config, attempt))
+    if delay is None:
+        return await first
+
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            _hedged += 1
+            logger.debug(f"No answer from {_label(config)} after {delay:.1f}s, hedging with {_label(backup)}")
+            tasks.append(asyncio.ensure_future(_timed(backup, attempt)))
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+                if isinstance(error, _REQUEST_ERRORS):
+                    raise error
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def route(configs: list, attempt: Callable[..., Awaitable]):
+    """Run ``attempt(config)`` on the best config, failing over to the others in turn.
+
+    Raises the last error if every config failed, or a request error at once.
+    """
+    ranked = rank(configs)
+    error = None
+    for index, config in enumerate(ranked):
+        backup = ranked[index + 1] if index + 1 < len(ranked) else config
+        try:
+            return await _hedge(config, backup, attempt)
+        except _REQUEST_ERRORS:
+            raise
+        except Exception as e:
+            error = e
+            if index + 1 < len(ranked):
+                logger.warning(f"LLM {_label(config)} failed ({e}), failing over to {_label(ranked[index + 1])}")
+    raise error
+
+
+def get_stats(configs: list) -> dict:
+    now = time.monotonic()
+    endpoints = []
+    for config in configs:
+        endpoint = _endpoint(config)
+        median = endpoint.quantile(0.5)
+        endpoints.append({
+            "id": config.id,
+            "provider": config.provider,
+            "model": config.model_name,
+            "weight": config.weight,
+            "in_flight": endpoint.in_flight,
+            "latency_ms": round(median * 1000) if median is not None else None,
+            "healthy": endpoint.down_until <= now,
+        })
+    return {"endpoints": endpoints, "hedged": _hedged}
+
+
+def reset() -> None:
+    global _hedged
+    _endpoints.clear()
+    _hedged = 0
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional
 
 # Providers that support each field
@@ -6,21 +6,52 @@ PROVIDERS_WITH_API_KEY = {"openai", "anthropic", "custom"}
 PROVIDERS_WITH_BASE_URL = {"openai", "ollama", "custom"}
 
 
+def _check_provider_fields(provider: str, api_key: str | None, api_base_url: str | None) -> None:
+    if provider in (PROVIDERS_WITH_API_KEY | PROVIDERS_WITH_BASE_URL):
+        if api_key and provider not in PROVIDERS_WITH_API_KEY:
+            raise ValueError(f"Provider '{provider}' does not use an API key")
+        if api_base_url and provider not in PROVIDERS_WITH_BASE_URL:
+            raise ValueError(f"Provider '{provider}' does not use a base URL")
+
+
 class LLMConfigRequest(BaseModel):
     provider: str
     model_name: str
     api_key: Optional[str] = None
     api_base_url: Optional[str] = None
     system_prompt: Optional[str] = None
+    rpm_limit: Optional[int] = Field(None, ge=1)
+    tpm_limit: Optional[int] = Field(None, ge=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    weight: int = Field(1, ge=0)
+
+    @model_validator(mode="after")
+    def validate_provider_fields(self):
+        _check_provider_fields(self.provider, self.api_key, self.api_base_url)
+        return self
+
+
+class LLMEndpointRequest(LLMConfigRequest):
+    is_active: bool = True
+
+
+class LLMEndpointUpdateRequest(BaseModel):
+    """Partial update of an endpoint: only the fields sent are changed."""
+    provider: Optional[str] = None
+    model_name: Optional[str] = None
+    api_key: Optional[str] = None
+    api_base_url: Optional[str] = None
+    system_prompt: Optional[str] = None
+    rpm_limit: Optional[int] = Field(None, ge=1)
+    tpm_limit: Optional[int] = Field(None, ge=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    weight: Optional[int] = Field(None, ge=0)
+    is_active: Optional[bool] = None
 
     @model_validator(mode="after")
     def validate_provider_fields(self):
-        known = self.provider in (PROVIDERS_WITH_API_KEY | PROVIDERS_WITH_BASE_URL)
-        if known:
-            if self.api_key and self.provider not in PROVIDERS_WITH_API_KEY:
-                raise ValueError(f"Provider '{self.provider}' does not use an API key")
-            if self.api_base_url and self.provider not in PROVIDERS_WITH_BASE_URL:
-                raise ValueError(f"Provider '{self.provider}' does not use a base URL")
+        if self.provider is not None:
+            _check_provider_fields(self.provider, self.api_key, self.api_base_url)
         return self
 
 
@@ -34,5 +65,9 @@ class LLMConfigResponse(BaseModel):
     system_prompt: str
     is_default: bool = True
     default_system_prompt: str = ""
+    rpm_limit: Optional[int] = None
+    tpm_limit: Optional[int] = None
+    max_concurrency: Optional[int] = None
+    weight: int = 1
 
     model_config = {"from_attributes": True}
@@ -1,14 +1,26 @@
+import functools
 import json
+import logging
+import re
+from collections.abc import Callable
+
 import litellm
 from pydantic import ValidationError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.core.encryption import decrypt_value
+from app.modules.analysers.llm import cache, limiter, preprocess, repair, routing, streaming
 from app.modules.analysers.llm.models import LLMConfig
 from app.schemas.analysis import AnalysisResult
 
+logger = logging.getLogger(__name__)
+
 _active_requests: int = 0
+_repaired = 0
+_reasked = 0
+_RESPONSE_FORMAT_ERROR_RE = re.compile(r"response_format|json_schema|json mode|structured output", re.IGNORECASE)
 
 
 async def check_configured(db: AsyncSession) -> bool:
@@ -17,29 +29,71 @@ async def check_configured(db: AsyncSession) -> bool:
     return result.scalar_one_or_none() is not None
 
 
+async def active_configs(db: AsyncSession) -> list[LLMConfig]:
+    """Active configs, the primary (lowest id) first. Its system prompt applies to all."""
+    result = await db.execute(
+        select(LLMConfig).where(LLMConfig.is_active.is_(True)).order_by(LLMConfig.id)
+    )
+    return list(result.scalars())
+
+
 async def get_status(db: AsyncSession) -> dict | None:
     """Status hook: return current LLM configuration summary."""
-    result = await db.execute(select(LLMConfig).where(LLMConfig.is_active.is_(True)))
-    config = result.scalar_one_or_none()
-    if not config:
+    configs = await active_configs(db)
+    if not configs:
         return None
+    rate_limits = [limiter.for_config(config).get_stats() for config in configs]
     return {
-        "provider": config.provider,
-        "model": config.model_name,
+        "provider": configs[0].provider,
+        "model": configs[0].model_name,
         "mode": "active" if _active_requests > 0 else "idle",
+        "rate_limit": {
+            "waiting": sum(stats["waiting"] for stats in rate_limits),
+            "in_flight": sum(stats["in_flight"] for stats in rate_limits),
+            "paused_sec": max(stats["paused_sec"] for stats in rate_limits),
+            "rate_limited": sum(stats["rate_limited"] for stats in rate_limits),
+        },
+        "routing": routing.get_stats(configs),
+        "cache": await cache.get_stats(db),
+        "preprocessing": preprocess.get_stats(),
+        "parsing": {"repaired": _repaired, "reasked": _reasked, **streaming.get_stats()},
     }
 
 
-async def call_llm(config: LLMConfig, api_key: str | None, messages: list[dict], **kwargs) -> str:
-    """Call LLM via LiteLLM and return the response text."""
-    model = f"{config.provider}/{config.model_name}" if config.provider != "openai" else config.model_name
-    response = await litellm.acompletion(
-        model=model,
-        messages=messages,
-        api_key=api_key,
-        api_base=config.api_base_url or None,
-        **kwargs,
-    )
+def _litellm_model(config: LLMConfig) -> str:
+    return f"{config.provider}/{config.model_name}" if config.provider != "openai" else config.model_name
+
+
+async def call_llm(
+    config: LLMConfig, api_key: str | None, messages: list[dict],
+    early_answer: Callable[[str], str | None] | None = None, **kwargs,
+) -> str:
+    """Call LLM via LiteLLM and return the response text.
+
+    Waits for the config's rate limits and concurrency cap (see limiter).
+    With ``early_answer`` the response is streamed and cut short as soon as
+    it returns an answer for the text so far (see streaming).
+    """
+    input_tokens = sum(preprocess.count_tokens(str(message.get("content") or "")) for message in messages)
+    stream = early_answer is not None and settings.llm_streaming
+
+    async def request():
+        response = await litellm.acompletion(
+            model=_litellm_model(config),
+            messages=messages,
+            api_key=api_key,
+            api_base=config.api_base_url or None,
+            **({"stream": True} if stream else {}),
+            **kwargs,
+        )
+        if isinstance(response, litellm.CustomStreamWrapper):
+            # Read within the limiter, so the concurrency cap covers the whole stream
+            return await streaming.read(response, early_answer, input_tokens)
+        return response
+
+    response = await limiter.for_config(config).run(request, input_tokens + (kwargs.get("max_tokens") or 0))
+    if isinstance(response, streaming.StreamedResponse):
+        return response.text
     return response.choices[0].message.content
 
 
@@ -72,39 +126,290 @@ Rules:
 Do not include any text outside the JSON object."""
 
 
-async def analyze(raw_data: dict, db: AsyncSession) -> tuple[AnalysisResult, dict]:
-    """Analyze raw input data using the configured LLM. Returns (parsed_result, raw_response_dict).
+BATCH_INSTRUCTIONS = """
 
-    Raises on any failure (no config, API error, parse error) so the caller
-    can handle errors via normal exception flow.
-    """
-    result = await db.execute(select(LLMConfig).where(LLMConfig.is_active.is_(True)))
-    config = result.scalar_one_or_none()
-    if not config:
+You will receive a JSON array of emails, each as {"id": number, "email": {...}}.
+Analyze each email independently. Return ONLY a JSON object {"results": [...]}
+with one object per email in the array, in the same order. Each object follows
+the schema above and additionally contains the "id" of its email."""
+
+# Only emails this short are packed into a shared prompt
+BATCH_ITEM_MAX_TOKENS = 1000
+MAX_BATCH_OUTPUT_TOKENS = 4096
+
+
+async def _require_configs(db: AsyncSession) -> list[LLMConfig]:
+    configs = await active_configs(db)
+    if not configs:
         raise RuntimeError("No LLM configured")
+    return configs
+
+
+def _model_id(configs: list[LLMConfig]) -> str:
+    """Identifies the answering models for the cache; any active config may answer."""
+    return ",".join(f"{config.provider}/{config.model_name}@{config.api_base_url or ''}" for config in configs)
+
+
+def _api_key(config: LLMConfig) -> str | None:
+    return decrypt_value(config.api_key_encrypted) if config.api_key_encrypted else None
+
+
+def _token_budget(configs: list[LLMConfig], prompt: str) -> int:
+    # One message is built for all configs, so it must fit the smallest context
+    return min(preprocess.token_budget(_litellm_model(config), prompt) for config in configs)
+
+
+@functools.lru_cache(maxsize=64)
+def _response_format(litellm_model: str, with_schema: bool) -> dict | None:
+    """Strictest output format the model supports: the AnalysisResult schema, JSON mode or none."""
+    try:
+        if with_schema and litellm.supports_response_schema(model=litellm_model):
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "analysis_result", "schema": AnalysisResult.model_json_schema()},
+            }
+        if "response_format" in (litellm.get_supported_openai_params(model=litellm_model) or []):
+            return {"type": "json_object"}
+    except Exception:
+        pass
+    return None
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """Whether a BadRequestError is about response_format, not the request itself."""
+    if isinstance(error, (litellm.ContextWindowExceededError, litellm.ContentPolicyViolationError)):
+        return False
+    return bool(_RESPONSE_FORMAT_ERROR_RE.search(str(error)))
+
+
+async def _call(configs: list[LLMConfig], messages: list[dict], with_schema: bool = True, **kwargs) -> str:
+    """call_llm on the best active config, with failover and hedging (see routing).
+
+    Requests structured output where supported; the batch prompt answers
+    with a list, so it only asks for JSON mode (``with_schema=False``).
+    """
+    async def attempt(config: LLMConfig) -> str:
+        model = _litellm_model(config)
+        response_format = _response_format(model, with_schema)
+        if response_format:
+            try:
+                return await call_llm(config, _api_key(config), messages, response_format=response_format, **kwargs)
+            except litellm.BadRequestError as e:
+                if not _rejects_response_format(e):
+                    raise
+                logger.info(f"{model} rejected structured output ({e}), retrying without")
+        return await call_llm(config, _api_key(config), messages, **kwargs)
+
+    return await routing.route(configs, attempt)
+
+
+def _validate(raw) -> tuple[AnalysisResult, dict, bool]:
+    """Validate an answer, dropping optional fields that do not fit the schema.
+
+    Returns (parsed_result, raw_response_dict, whether fields were dropped).
+    """
+    try:
+        return AnalysisResult.model_validate(raw), raw, False
+    except ValidationError as e:
+        fields = {error["loc"][0] for error in e.errors() if error["loc"]}
+        if not isinstance(raw, dict) or not fields or "is_relevant" in fields:
+            raise
+    cleaned = {key: value for key, value in raw.items() if key not in fields}
+    return AnalysisResult.model_validate(cleaned), cleaned, True
+
 
-    api_key = decrypt_value(config.api_key_encrypted) if config.api_key_encrypted else None
+def _check_repaired(parsed: AnalysisResult) -> None:
+    # A cut-off answer may have lost exactly the field that made it relevant
+    if parsed.is_relevant and not (parsed.order_number or parsed.tracking_number):
+        raise ValueError("Repaired LLM response has no order or tracking number")
 
-    user_message = json.dumps(raw_data, ensure_ascii=False, indent=2)
-    prompt = config.system_prompt or SYSTEM_PROMPT
+
+def _parse(raw_text: str) -> tuple[AnalysisResult, dict]:
+    """Parse an answer, repairing it locally if needed. Raises ValueError if it is unusable."""
+    global _repaired
+    try:
+        raw = json.loads(raw_text)
+        repaired = False
+    except json.JSONDecodeError:
+        raw = repair.repair_json(raw_text)
+        repaired = True
+    parsed, raw_dict, dropped = _validate(raw)
+    if repaired or dropped:
+        _check_repaired(parsed)
+        _repaired += 1
+    return parsed, raw_dict
+
+
+async def _store(key: str | None, model_id: str, raw_dict: dict) -> None:
+    if not key:
+        return
+    try:
+        await cache.store(key, model_id[:255], raw_dict)
+    except Exception as e:
+        logger.warning(f"Could not cache LLM analysis: {e}")
+
+
+async def _complete(configs: list[LLMConfig], prompt: str, user_message: str) -> tuple[AnalysisResult, dict]:
+    """One LLM request for one email.
+
+    An answer that does not parse is repaired locally first; the model is
+    only asked again if that fails.
+    """
     messages = [
         {"role": "system", "content": prompt},
         {"role": "user", "content": user_message},
     ]
 
-    global _active_requests
-    raw_text = None
+    global _active_requests, _reasked
     _active_requests += 1
     try:
         for attempt in range(2):
+            raw_text = await _call(
+                configs, messages, max_tokens=preprocess.OUTPUT_TOKENS,
+                early_answer=streaming.irrelevant_answer,
+            )
             try:
-                raw_text = await call_llm(config, api_key, messages, max_tokens=2048)
-                raw_dict = json.loads(raw_text)
-                parsed = AnalysisResult.model_validate(raw_dict)
-                return parsed, raw_dict
-            except (json.JSONDecodeError, ValidationError):
+                return _parse(raw_text)
+            except ValueError as e:
                 if attempt == 0:
+                    _reasked += 1
+                    logger.info(f"Unusable LLM response ({e}), asking again")
                     continue
                 raise ValueError(f"Failed to parse LLM response after 2 attempts: {raw_text}")
     finally:
         _active_requests -= 1
+
+
+async def analyze(raw_data: dict, db: AsyncSession) -> tuple[AnalysisResult, dict]:
+    """Analyze raw input data using the configured LLM. Returns (parsed_result, raw_response_dict).
+
+    Identical content analysed with the same prompt and model is answered
+    from the analysis cache without an LLM call. Otherwise the content is
+    compacted and truncated to the token budget first (see preprocess), and
+    the request goes to the best of the active configs (see routing).
+
+    Raises on any failure (no config, API error, parse error) so the caller
+    can handle errors via normal exception flow.
+    """
+    configs = await _require_configs(db)
+    prompt = configs[0].system_prompt or SYSTEM_PROMPT
+
+    model_id = _model_id(configs)
+    cache_key = cache.cache_key(prompt, model_id, raw_data) if cache.enabled() else None
+    if cache_key:
+        cached = await cache.get_cached(db, cache_key)
+        if cached is not None:
+            return AnalysisResult.model_validate(cached), cached
+
+    user_message = preprocess.build_user_message(raw_data, _token_budget(configs, prompt))
+    parsed, raw_dict = await _complete(configs, prompt, user_message)
+    await _store(cache_key, model_id, raw_dict)
+    return parsed, raw_dict
+
+
+def _pack(messages: dict[int, str], budget: int) -> list[list[int]]:
+    """Group short emails into prompts of at most analysis_batch_size emails within the token budget."""
+    groups, current, used = [], [], 0
+    for index, message in messages.items():
+        tokens = preprocess.count_tokens(message)
+        if tokens > BATCH_ITEM_MAX_TOKENS:
+            groups.append([index])
+            continue
+        if current and (len(current) >= settings.analysis_batch_size or used + tokens > budget):
+            groups.append(current)
+            current, used = [], 0
+        current.append(index)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def _complete_batch(
+    configs: list[LLMConfig], prompt: str, messages: dict[int, str],
+) -> dict[int, tuple[AnalysisResult, dict]]:
+    """One LLM request for several emails. Returns the results that came back valid, by index."""
+    user_message = "[" + ",".join(
+        f'{{"id":{index},"email":{message}}}' for index, message in messages.items()
+    ) + "]"
+    llm_messages = [
+        {"role": "system", "content": prompt + BATCH_INSTRUCTIONS},
+        {"role": "user", "content": user_message},
+    ]
+
+    global _active_requests
+    _active_requests += 1
+    try:
+        raw_text = await _call(
+            configs, llm_messages, with_schema=False,
+            max_tokens=min(preprocess.OUTPUT_TOKENS * len(messages), MAX_BATCH_OUTPUT_TOKENS),
+        )
+    finally:
+        _active_requests -= 1
+
+    try:
+        answer = json.loads(raw_text)
+        repaired = False
+    except json.JSONDecodeError:
+        answer = repair.repair_json(raw_text)
+        repaired = True
+    if isinstance(answer, dict):
+        # {"results": [...]} as asked; a bare array is accepted as well
+        answer = next((value for value in answer.values() if isinstance(value, list)), [])
+    results = {}
+    for entry in answer if isinstance(answer, list) else []:
+        if not isinstance(entry, dict) or entry.get("id") not in messages:
+            continue
+        try:
+            parsed, raw_dict, dropped = _validate({key: value for key, value in entry.items() if key != "id"})
+            if repaired or dropped:
+                _check_repaired(parsed)
+        except ValueError:
+            continue
+        results[entry["id"]] = parsed, raw_dict
+    return results
+
+
+async def analyze_batch(items: list[dict], db: AsyncSession) -> list[tuple[AnalysisResult, dict] | Exception]:
+    """Analyze several emails, packing short ones into shared LLM prompts.
+
+    Returns one (parsed_result, raw_response_dict) or exception per item, in
+    order. Emails missing or invalid in a batch answer are retried singly.
+    """
+    configs = await _require_configs(db)
+    prompt = configs[0].system_prompt or SYSTEM_PROMPT
+    model_id = _model_id(configs)
+
+    results: list = [None] * len(items)
+    keys: dict[int, str | None] = {}
+    messages: dict[int, str] = {}
+    budget = _token_budget(configs, prompt + BATCH_INSTRUCTIONS)
+    for index, raw_data in enumerate(items):
+        keys[index] = cache.cache_key(prompt, model_id, raw_data) if cache.enabled() else None
+        if keys[index]:
+            cached = await cache.get_cached(db, keys[index])
+            if cached is not None:
+                results[index] = AnalysisResult.model_validate(cached), cached
+                continue
+        messages[index] = preprocess.build_user_message(raw_data, budget)
+
+    for group in _pack(messages, budget):
+        answered = {}
+        if len(group) > 1:
+            try:
+                answered = await _complete_batch(configs, prompt, {i: messages[i] for i in group})
+            except Exception as e:
+                logger.warning(f"Batch LLM request for {len(group)} emails failed: {e}, analysing singly")
+            if len(answered) < len(group):
+                logger.info(f"Batch answer covered {len(answered)} of {len(group)} emails, analysing the rest singly")
+        for index in group:
+            try:
+                if index in answered:
+                    results[index] = answered[index]
+                else:
+                    results[index] = await _complete(configs, prompt, messages[index])
+            except Exception as e:
+                results[index] = e
+                continue
+            await _store(keys[index], model_id, results[index][1])
+    return results
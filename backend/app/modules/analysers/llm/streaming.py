@@ -0,0 +1,101 @@
+"""Read streamed LLM answers, stopping as soon as the outcome is known.
+
+Most analysed emails are irrelevant, and their answer is decided by the
+first key: {"is_relevant": false}. The stream is checked while it is
+short, and once is_relevant is false it is closed and the canonical
+irrelevant answer is returned. That saves waiting for the rest of the
+completion, and its output tokens. Relevant answers are assembled chunk
+by chunk and parsed when the stream ends.
+"""
+
+import logging
+import re
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+from app.modules.analysers.llm import preprocess
+
+logger = logging.getLogger(__name__)
+
+# The verdict comes first; later text is not checked for it
+EARLY_STOP_WINDOW_CHARS = 200
+IRRELEVANT_ANSWER = '{"is_relevant": false}'
+
+_IRRELEVANT_RE = re.compile(r"""["']is_relevant["']\s*:\s*(?:false|False)\b""")
+
+_stopped_early = 0
+
+
+@dataclass
+class StreamedResponse:
+    """What the limiter needs from a response, for a consumed stream."""
+    text: str
+    usage: SimpleNamespace
+    _hidden_params: dict = field(default_factory=dict)
+
+
+def irrelevant_answer(text: str) -> str | None:
+    """Early answer for analysis prompts: the irrelevant result once it is certain."""
+    return IRRELEVANT_ANSWER if _IRRELEVANT_RE.search(text) else None
+
+
+def _delta_text(chunk) -> str:
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    delta = choices[0].delta
+    if delta.content:
+        return delta.content
+    # Providers that implement structured output as a tool call stream the JSON as arguments
+    return "".join(
+        call.function.arguments or ""
+        for call in (getattr(delta, "tool_calls", None) or [])
+        if call.function
+    )
+
+
+async def _close(stream) -> None:
+    underlying = getattr(stream, "completion_stream", None)
+    close = getattr(underlying, "aclose", None) or getattr(underlying, "close", None)
+    if close is None:
+        return
+    try:
+        result = close()
+        if hasattr(result, "__await__"):
+            await result
+    except Exception as e:
+        logger.debug(f"Closing LLM stream failed: {e}")
+
+
+async def read(stream, early_answer: Callable[[str], str | None] | None, input_tokens: int) -> StreamedResponse:
+    """Consume a LiteLLM stream; stop once ``early_answer`` returns an answer.
+
+    Streams carry no usage, so it is estimated from the text received.
+    """
+    global _stopped_early
+    parts: list[str] = []
+    length = 0
+    text = None
+    async for chunk in stream:
+        piece = _delta_text(chunk)
+        if not piece:
+            continue
+        parts.append(piece)
+        length += len(piece)
+        if early_answer and length - len(piece) < EARLY_STOP_WINDOW_CHARS:
+            text = early_answer("".join(parts))
+            if text is not None:
+                _stopped_early += 1
+                await _close(stream)
+                break
+    received = "".join(parts)
+    return StreamedResponse(
+        text=received if text is None else text,
+        usage=SimpleNamespace(total_tokens=input_tokens + preprocess.count_tokens(received)),
+        _hidden_params=getattr(stream, "_hidden_params", None) or {},
+    )
+
+
+def get_stats() -> dict:
+    return {"stopped_early": _stopped_early}
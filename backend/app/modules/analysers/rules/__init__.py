@@ -0,0 +1,15 @@
+from app.core.module_base import ModuleInfo
+from app.modules.analysers.rules.router import router
+from app.modules.analysers.rules.service import analyze, get_status
+
+MODULE_INFO = ModuleInfo(
+    key="rules",
+    name="Rule-based Analyser",
+    type="analyser",
+    version="1.0.0",
+    description="Recognize known carrier and marketplace emails (DHL, UPS, Hermes, DPD, GLS, Amazon, eBay) without an LLM",
+    router=router,
+    models=[],
+    status=get_status,
+    analyze=analyze,
+)
@@ -0,0 +1,132 @@
+"""Known sender formats: carriers and marketplaces with stable notification emails.
+
+A format is picked by sender domain: the sender must be one of the format's
+registrable domains or a subdomain of one, so look-alikes such as
+amazon.de.example.net do not match. Its identifier pattern must match for
+the email to be recognized; everything else (status, amounts) is read from
+the shared keyword tables below. All patterns are compiled at import.
+"""
+
+import re
+from dataclasses import dataclass
+
+CARRIER = "carrier"
+MARKETPLACE = "marketplace"
+
+_ANCHOR = r"(?:sendungsnummer|paketnummer|sendungs-?nr\.?|tracking(?:[ -]?(?:number|nummer|id|nr\.?))?|trackingnummer)\s*[:#]?\s*"
+
+
+@dataclass(frozen=True)
+class SenderFormat:
+    name: str
+    kind: str  # CARRIER (tracking number) or MARKETPLACE (order number)
+    domains: tuple[str, ...]  # registrable domains, e.g. "dhl.de" matches dhl.de and mail.dhl.de
+    identifier: re.Pattern
+
+    def match_domain(self, domain: str) -> str | None:
+        """The registrable domain of ``domain`` if it belongs to this sender, else None."""
+        for registrable in self.domains:
+            if domain == registrable or domain.endswith("." + registrable):
+                return registrable
+        return None
+
+
+FORMATS = [
+    SenderFormat(
+        name="UPS",
+        kind=CARRIER,
+        domains=("ups.com",),
+        identifier=re.compile(r"\b(1Z[0-9A-Z]{16})\b"),
+    ),
+    SenderFormat(
+        name="DHL",
+        kind=CARRIER,
+        domains=("dhl.de", "dhl.com", "deutschepost.de"),
+        identifier=re.compile(
+            r"\b(JJD\d{12,20})\b|" + _ANCHOR + r"(\d{12}|\d{20})\b", re.IGNORECASE,
+        ),
+    ),
+    SenderFormat(
+        name="Hermes",
+        kind=CARRIER,
+        domains=("myhermes.de", "myhermes.co.uk", "hermesworld.com", "hermes-europe.co.uk"),
+        identifier=re.compile(r"\b(H\d{19})\b|" + _ANCHOR + r"(\d{14})\b", re.IGNORECASE),
+    ),
+    SenderFormat(
+        name="DPD",
+        kind=CARRIER,
+        domains=("dpd.de", "dpd.com", "dpd.co.uk", "dpd.at"),
+        identifier=re.compile(_ANCHOR + r"(\d{14})\b", re.IGNORECASE),
+    ),
+    SenderFormat(
+        name="GLS",
+        kind=CARRIER,
+        domains=("gls-group.eu", "gls-group.com", "gls-pakete.de"),
+        identifier=re.compile(_ANCHOR + r"(\d{11,12}|[A-Z0-9]{8})\b", re.IGNORECASE),
+    ),
+    SenderFormat(
+        name="Amazon",
+        kind=MARKETPLACE,
+        domains=(
+            "amazon.de", "amazon.com", "amazon.co.uk", "amazon.fr", "amazon.it", "amazon.es", "amazon.nl",
+            "amazon.ca",
+        ),
+        identifier=re.compile(r"\b(\d{3}-\d{7}-\d{7})\b"),
+    ),
+    SenderFormat(
+        name="eBay",
+        kind=MARKETPLACE,
+        domains=("ebay.de", "ebay.com", "ebay.co.uk", "ebay.fr", "ebay.it", "ebay.es", "ebay.at", "ebay.nl"),
+        identifier=re.compile(r"\b(\d{2}-\d{5}-\d{5})\b"),
+    ),
+]
+
+# Marketplace shipping emails name the carrier next to its tracking number
+CARRIER_MENTIONS = [
+    (fmt, re.compile(rf"\b{re.escape(fmt.name)}\b", re.IGNORECASE)) for fmt in FORMATS if fmt.kind == CARRIER
+]
+
+# Checked in order, subject before body; the first hit wins. Out-for-delivery
+# comes before delivered because "wird heute zugestellt" contains "zugestellt".
+STATUS_KEYWORDS = [
+    ("out_for_delivery", re.compile(
+        r"out for delivery|heute zugestellt|in zustellung|zustellfahrzeug|arriving today|kommt heute",
+        re.IGNORECASE,
+    )),
+    ("delivered", re.compile(
+        r"\bdelivered\b|\bzugestellt\b|wurde geliefert|ist da\b|abgeholt",
+        re.IGNORECASE,
+    )),
+    ("in_transit", re.compile(
+        r"in transit|on (?:its|the) way|unterwegs|auf dem weg|im paketzentrum",
+        re.IGNORECASE,
+    )),
+    ("shipped", re.compile(
+        r"\bshipped\b|dispatched|versandt|verschickt|versendet|has been sent",
+        re.IGNORECASE,
+    )),
+    ("shipment_preparing", re.compile(
+        r"being prepared|wird vorbereitet|angekündigt|elektronisch angekündigt|label created",
+        re.IGNORECASE,
+    )),
+    ("ordered", re.compile(
+        r"order confirm|thank you for your order|thanks for your order|bestellbestätigung"
+        r"|bestellung eingegangen|vielen dank für ihre bestellung|danke für deine bestellung"
+        r"|you(?:'ve| have)? (?:bought|ordered)|du hast .* gekauft|bestellt\b",
+        re.IGNORECASE,
+    )),
+]
+
+DOCUMENT_TYPES = {
+    "ordered": "order_confirmation",
+    "shipped": "shipment_confirmation",
+    "delivered": "delivery_confirmation",
+}
+
+TOTAL_RE = re.compile(
+    r"\b(?:gesamtbetrag|gesamtsumme|bestellsumme|order total|grand total|total)\s*:?\s*"
+    r"(EUR|USD|GBP|€|\$|£)?\s*(\d{1,3}(?:[.,\s]\d{3})*(?:[.,]\d{2})|\d+(?:[.,]\d{2})?)\s*(EUR|€)?",
+    re.IGNORECASE,
+)
+
+CURRENCIES = {"€": "EUR", "$": "USD", "£": "GBP"}
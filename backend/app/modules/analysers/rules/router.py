@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import get_admin_user
+from app.modules.analysers.rules.formats import FORMATS
+
+router = APIRouter(tags=["rules"], dependencies=[Depends(get_admin_user)])
+
+
+@router.get("/formats")
+async def list_formats():
+    return [
+        {"name": fmt.name, "kind": fmt.kind, "domains": list(fmt.domains)}
+        for fmt in FORMATS
+    ]
@@ -0,0 +1,153 @@
+import logging
+import re
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.module_base import AnalyserSkipped
+from app.modules.analysers.rules.formats import (
+    CARRIER,
+    CARRIER_MENTIONS,
+    CURRENCIES,
+    DOCUMENT_TYPES,
+    FORMATS,
+    STATUS_KEYWORDS,
+    TOTAL_RE,
+    SenderFormat,
+)
+from app.schemas.analysis import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+_SENDER_DOMAIN_RE = re.compile(r"@([\w-]+(?:\.[\w-]+)+)")
+
+_recognized = 0
+_skipped = 0
+
+
+async def get_status(db: AsyncSession) -> dict | None:
+    """Status hook: recognized and skipped emails since this process started."""
+    return {"recognized": _recognized, "skipped": _skipped}
+
+
+def _sender_domain(sender: str) -> str | None:
+    match = _SENDER_DOMAIN_RE.search(sender.lower())
+    return match.group(1) if match else None
+
+
+def _find_format(domain: str) -> tuple[SenderFormat, str] | None:
+    """The format for a sender domain and the registrable domain it matched."""
+    for fmt in FORMATS:
+        registrable = fmt.match_domain(domain)
+        if registrable:
+            return fmt, registrable
+    return None
+
+
+def _carrier_tracking(text: str) -> tuple[str, str] | None:
+    """(carrier, tracking number) of a carrier named in a marketplace email."""
+    for fmt, mention in CARRIER_MENTIONS:
+        if mention.search(text):
+            tracking_number = _identifier(fmt, text)
+            if tracking_number:
+                return fmt.name, tracking_number
+    return None
+
+
+def _identifier(fmt: SenderFormat, text: str) -> str | None:
+    match = fmt.identifier.search(text)
+    if not match:
+        return None
+    return next(group for group in match.groups() if group)
+
+
+def _status(subject: str, body: str) -> str | None:
+    for text in (subject, body):
+        for status, pattern in STATUS_KEYWORDS:
+            if pattern.search(text):
+                return status
+    return None
+
+
+def _parse_amount(value: str) -> float:
+    value = value.replace(" ", "")
+    # The last separator followed by exactly two digits is the decimal point
+    if len(value) > 3 and value[-3] in ",.":
+        value = value[:-3].replace(",", "").replace(".", "") + "." + value[-2:]
+    else:
+        value = value.replace(",", "").replace(".", "")
+    return float(value)
+
+
+def _total(body: str) -> tuple[float | None, str | None]:
+    match = TOTAL_RE.search(body)
+    if not match:
+        return None, None
+    prefix, amount, suffix = match.groups()
+    symbol = prefix or suffix
+    return _parse_amount(amount), CURRENCIES.get(symbol, symbol)
+
+
+def recognize(raw_data: dict) -> AnalysisResult | None:
+    """Build an analysis for a known sender format, or None if not recognized."""
+    subject = raw_data.get("subject") or ""
+    body = raw_data.get("body") or ""
+    domain = _sender_domain(raw_data.get("sender") or "")
+    if not domain:
+        return None
+    found = _find_format(domain)
+    if not found:
+        return None
+    fmt, registrable = found
+    identifier = _identifier(fmt, f"{subject}\n{body}")
+    status = _status(subject, body)
+    if not identifier or not status:
+        return None
+
+    if fmt.kind == CARRIER:
+        return AnalysisResult(
+            is_relevant=True,
+            document_type=DOCUMENT_TYPES.get(status, "shipment_update"),
+            tracking_number=identifier,
+            carrier=fmt.name,
+            status=status,
+        )
+
+    # Past the order confirmation, the order is only trackable with the carrier's
+    # tracking number; without one, the next analyser gets to look for it
+    carrier = tracking_number = None
+    if status != "ordered":
+        shipment = _carrier_tracking(f"{subject}\n{body}")
+        if not shipment:
+            return None
+        carrier, tracking_number = shipment
+
+    total_amount, currency = _total(body)
+    email_date = raw_data.get("email_date")
+    return AnalysisResult(
+        is_relevant=True,
+        document_type=DOCUMENT_TYPES.get(status, "shipment_update"),
+        order_number=identifier,
+        vendor_name=fmt.name,
+        vendor_domain=registrable,
+        tracking_number=tracking_number,
+        carrier=carrier,
+        status=status,
+        order_date=email_date[:10] if email_date and status == "ordered" else None,
+        total_amount=total_amount,
+        currency=currency,
+    )
+
+
+async def analyze(raw_data: dict, db: AsyncSession) -> tuple[AnalysisResult, dict]:
+    """Analyze an email from a known carrier or marketplace. Returns (parsed_result, raw_response_dict).
+
+    Raises AnalyserSkipped for anything it does not recognize, so the next
+    analyser (usually the LLM) takes over.
+    """
+    global _recognized, _skipped
+    result = recognize(raw_data)
+    if result is None:
+        _skipped += 1
+        raise AnalyserSkipped("No known sender format")
+    _recognized += 1
+    return result, result.model_dump(exclude_none=True)
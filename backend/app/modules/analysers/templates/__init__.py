@@ -0,0 +1,17 @@
+from app.core.module_base import ModuleInfo
+from app.modules.analysers.templates.router import router
+from app.modules.analysers.templates.models import VendorTemplate
+from app.modules.analysers.templates.service import analyze, get_status, learn
+
+MODULE_INFO = ModuleInfo(
+    key="templates",
+    name="Learned Templates",
+    type="analyser",
+    version="1.0.0",
+    description="Learn per-vendor email templates from analysed emails and extract repeat layouts without an LLM",
+    router=router,
+    models=[VendorTemplate],
+    status=get_status,
+    analyze=analyze,
+    learn=learn,
+)
@@ -0,0 +1,206 @@
+"""Fingerprint email layouts and learn where their values are.
+
+A layout is identified by the sender domain plus the ordered labels of its
+"Label: value" lines, with digits masked. Two order confirmations from the
+same shop therefore share a fingerprint even though their values differ.
+
+For each analysed email, the order number, tracking number and total are
+located in the text. The words just before each value become its anchor,
+together with the shape of the value. Fields that are identical in every
+result (vendor, carrier, status) become constants. Once the last
+MIN_SAMPLES results agree, the layout has a template. The template needs
+an anchor for an order or tracking number.
+"""
+
+import functools
+import hashlib
+import re
+
+MIN_SAMPLES = 3
+MIN_LABELS = 2
+MAX_LABELS = 30
+MAX_PREFIX_CHARS = 30
+
+ANCHORED_FIELDS = ("order_number", "tracking_number", "total_amount")
+IDENTIFIER_FIELDS = ("order_number", "tracking_number")
+CONSTANT_FIELDS = ("document_type", "status", "carrier", "vendor_name", "vendor_domain", "currency")
+
+AMOUNT_SHAPE = r"\d{1,3}(?:[.,]?\d{3})*(?:[.,]\d{2})?"
+
+_SENDER_DOMAIN_RE = re.compile(r"@([\w-]+(?:\.[\w-]+)+)")
+_LABEL_RE = re.compile(r"^\s*([^:\n]{2,40}):")
+_URL_SCHEMES = {"http", "https", "mailto"}
+_DIGITS_RE = re.compile(r"\d+")
+_SENTENCE_END_RE = re.compile(r"[.!?]\s")
+_PREFIX_TOKEN_RE = re.compile(r"(\d+|\s+)")
+_VALUE_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[^A-Za-z0-9]")
+
+
+def sender_domain(sender: str) -> str | None:
+    match = _SENDER_DOMAIN_RE.search(sender.lower())
+    return match.group(1) if match else None
+
+
+def fingerprint(raw_data: dict) -> tuple[str, str] | None:
+    """Return (sender_domain, layout hash), or None if the layout has too few labels."""
+    domain = sender_domain(raw_data.get("sender") or "")
+    if not domain:
+        return None
+    labels = []
+    for line in (raw_data.get("body") or "").splitlines():
+        match = _LABEL_RE.match(line)
+        if not match:
+            continue
+        label = _DIGITS_RE.sub("#", match.group(1).strip().lower())
+        if label in _URL_SCHEMES or label in labels or not any(ch.isalpha() for ch in label):
+            continue
+        labels.append(label)
+        if len(labels) == MAX_LABELS:
+            break
+    if len(labels) < MIN_LABELS:
+        return None
+    digest = hashlib.sha256("\n".join([domain, *labels]).encode()).hexdigest()
+    return domain, digest
+
+
+def _text(raw_data: dict) -> str:
+    return f"{raw_data.get('subject') or ''}\n{raw_data.get('body') or ''}"
+
+
+def _prefix_pattern(prefix: str) -> str | None:
+    """Regex for the words before a value: the end of its sentence, digits masked."""
+    prefix = _SENTENCE_END_RE.split(prefix)[-1].strip()
+    if len(prefix) > MAX_PREFIX_CHARS:
+        # Do not start in the middle of a word
+        prefix = prefix[-MAX_PREFIX_CHARS:].partition(" ")[2]
+    if not any(ch.isalpha() for ch in prefix):
+        return None
+    parts = []
+    for token in _PREFIX_TOKEN_RE.split(prefix):
+        if not token:
+            continue
+        if token.isdigit():
+            parts.append(r"\d+")
+        elif token.isspace():
+            parts.append(r"\s+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def _shape(value: str) -> str:
+    """Regex for values like this one: runs of digits/letters, literal separators."""
+    parts = []
+    for token in _VALUE_TOKEN_RE.findall(value):
+        if token.isdigit():
+            parts.append(r"\d+")
+        elif token.isalpha():
+            parts.append(r"[A-Za-z]+")
+        elif token.isalnum():
+            parts.append(r"[A-Za-z0-9]+")
+        else:
+            parts.append(re.escape(token))
+    return "".join(parts)
+
+
+def parse_amount(text: str) -> float:
+    """Parse "1.234,56", "1,234.56" or "19" (the last separator before two digits is decimal)."""
+    if len(text) > 3 and text[-3] in ",.":
+        integer, decimals = text[:-3], text[-2:]
+    else:
+        integer, decimals = text, "00"
+    digits = "".join(_DIGITS_RE.findall(integer)) or "0"
+    return float(f"{digits}.{decimals}")
+
+
+def _amount_texts(value: float) -> list[str]:
+    plain = f"{value:.2f}"
+    grouped = f"{value:,.2f}"
+    german = grouped.replace(",", "_").replace(".", ",").replace("_", ".")
+    return list(dict.fromkeys([plain, plain.replace(".", ","), grouped, german]))
+
+
+@functools.lru_cache(maxsize=1024)
+def _anchor_regex(prefix: str, next_line: bool, shape: str) -> re.Pattern:
+    gap = r"[^\S\n]*\n\s*" if next_line else r"[^\S\n]*"
+    return re.compile(f"{prefix}{gap}({shape})")
+
+
+def _extract_value(anchor: dict, field: str, text: str):
+    match = _anchor_regex(anchor["prefix"], anchor["next_line"], anchor["shape"]).search(text)
+    if not match:
+        return None
+    return parse_amount(match.group(1)) if field == "total_amount" else match.group(1)
+
+
+def _locate(lines: list[str], candidates: list[str]) -> tuple[dict, str] | None:
+    """Find the first occurrence of a value and the anchor in front of it."""
+    for index, line in enumerate(lines):
+        for candidate in candidates:
+            pos = line.find(candidate)
+            if pos < 0:
+                continue
+            prefix = _prefix_pattern(line[:pos])
+            if prefix:
+                return {"prefix": prefix, "next_line": False}, candidate
+            if not line[:pos].strip() and index > 0:
+                prefix = _prefix_pattern(lines[index - 1])
+                if prefix:
+                    return {"prefix": prefix, "next_line": True}, candidate
+    return None
+
+
+def observe(raw_data: dict, analysis) -> dict:
+    """Record the anchors and constant fields of one analysed email."""
+    text = _text(raw_data)
+    lines = text.splitlines()
+    anchors = {}
+    for field in ANCHORED_FIELDS:
+        value = getattr(analysis, field)
+        if value is None:
+            continue
+        is_amount = field == "total_amount"
+        located = _locate(lines, _amount_texts(value) if is_amount else [str(value)])
+        if not located:
+            continue
+        anchor, found = located
+        anchor["shape"] = AMOUNT_SHAPE if is_amount else _shape(found)
+        # The anchor must lead back to this value, not to an earlier lookalike
+        if _extract_value(anchor, field, text) == value:
+            anchors[field] = anchor
+    constants = {
+        field: getattr(analysis, field)
+        for field in CONSTANT_FIELDS
+        if getattr(analysis, field) is not None
+    }
+    return {"anchors": anchors, "constants": constants}
+
+
+def build_template(observations: list[dict]) -> dict | None:
+    """Merge the latest observations into a template, or None if they disagree."""
+    if len(observations) < MIN_SAMPLES:
+        return None
+    first, *rest = observations[-MIN_SAMPLES:]
+    anchors = {
+        field: anchor for field, anchor in first["anchors"].items()
+        if all(other["anchors"].get(field) == anchor for other in rest)
+    }
+    if not any(field in anchors for field in IDENTIFIER_FIELDS):
+        return None
+    constants = {
+        field: value for field, value in first["constants"].items()
+        if all(other["constants"].get(field) == value for other in rest)
+    }
+    return {"anchors": anchors, "constants": constants}
+
+
+def extract(template: dict, raw_data: dict) -> dict | None:
+    """Apply a template; None if any anchored field is missing (layout changed)."""
+    text = _text(raw_data)
+    values = dict(template["constants"])
+    for field, anchor in template["anchors"].items():
+        value = _extract_value(anchor, field, text)
+        if value is None:
+            return None
+        values[field] = value
+    return values
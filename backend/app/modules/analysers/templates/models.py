@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, DateTime, Integer, String, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class VendorTemplate(Base):
+    """Extraction template learned from LLM results for one email layout of a sender domain."""
+    __tablename__ = "vendor_templates"
+    __table_args__ = (UniqueConstraint("sender_domain", "fingerprint"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    sender_domain: Mapped[str] = mapped_column(String(255), index=True)
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    # Anchors and constants observed in the most recent LLM results, oldest first
+    observations: Mapped[list] = mapped_column(JSON, default=list)
+    # Merged template; None while still learning
+    fields: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0)
+    misses: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_admin_user
+from app.database import get_db
+from app.modules.analysers.templates.models import VendorTemplate
+from app.modules.analysers.templates.schemas import VendorTemplateResponse
+
+router = APIRouter(tags=["templates"], dependencies=[Depends(get_admin_user)])
+
+
+@router.get("/templates", response_model=list[VendorTemplateResponse])
+async def list_templates(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(
+        select(VendorTemplate).order_by(VendorTemplate.sender_domain, VendorTemplate.id)
+    )
+    return [
+        VendorTemplateResponse(
+            id=template.id,
+            sender_domain=template.sender_domain,
+            active=template.fields is not None,
+            samples=len(template.observations),
+            fields=sorted({
+                *(template.fields or {}).get("anchors", {}),
+                *(template.fields or {}).get("constants", {}),
+            }),
+            hits=template.hits,
+            misses=template.misses,
+            updated_at=template.updated_at,
+        )
+        for template in result.scalars()
+    ]
+
+
+@router.delete("/templates/{template_id}", status_code=204)
+async def delete_template(template_id: int, db: AsyncSession = Depends(get_db)):
+    template = await db.get(VendorTemplate, template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    await db.delete(template)
+    await db.commit()
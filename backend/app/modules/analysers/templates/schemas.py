@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class VendorTemplateResponse(BaseModel):
+    id: int
+    sender_domain: str
+    active: bool
+    samples: int
+    fields: list[str]
+    hits: int
+    misses: int
+    updated_at: datetime
@@ -0,0 +1,87 @@
+import logging
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.module_base import AnalyserSkipped
+from app.modules.analysers.templates import extraction
+from app.modules.analysers.templates.models import VendorTemplate
+from app.schemas.analysis import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+async def get_status(db: AsyncSession) -> dict | None:
+    """Status hook: learned templates and how often they replaced an LLM call."""
+    result = await db.execute(
+        select(
+            func.count(VendorTemplate.fields),
+            func.count(),
+            func.coalesce(func.sum(VendorTemplate.hits), 0),
+            func.coalesce(func.sum(VendorTemplate.misses), 0),
+        )
+    )
+    active, total, hits, misses = result.one()
+    return {"active": active, "learning": total - active, "hits": hits, "misses": misses}
+
+
+async def _get_template(db: AsyncSession, domain: str, fingerprint: str) -> VendorTemplate | None:
+    result = await db.execute(
+        select(VendorTemplate).where(
+            VendorTemplate.sender_domain == domain,
+            VendorTemplate.fingerprint == fingerprint,
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def analyze(raw_data: dict, db: AsyncSession) -> tuple[AnalysisResult, dict]:
+    """Extract fields with the template learned for this email's layout.
+
+    Raises AnalyserSkipped when there is no template yet or the email does
+    not match it, so the next analyser (usually the LLM) takes over.
+    """
+    key = extraction.fingerprint(raw_data)
+    if key is None:
+        raise AnalyserSkipped("Layout cannot be fingerprinted")
+    template = await _get_template(db, *key)
+    if template is None or template.fields is None:
+        raise AnalyserSkipped("No learned template for this layout")
+
+    values = extraction.extract(template.fields, raw_data)
+    # Counted in SQL: batch workers analyse emails of the same layout concurrently
+    counters = update(VendorTemplate).where(VendorTemplate.id == template.id)
+    if values is None:
+        await db.execute(counters.values(misses=VendorTemplate.misses + 1))
+        raise AnalyserSkipped(f"Email does not match learned template {template.id}")
+    await db.execute(counters.values(hits=VendorTemplate.hits + 1))
+    result = AnalysisResult(is_relevant=True, **values)
+    return result, result.model_dump(exclude_none=True)
+
+
+async def learn(raw_data: dict, analysis: AnalysisResult, db: AsyncSession) -> None:
+    """Learn hook: record where another analyser found the values of this email."""
+    if not analysis.is_relevant:
+        return
+    key = extraction.fingerprint(raw_data)
+    if key is None:
+        return
+    observation = extraction.observe(raw_data, analysis)
+    if not any(field in observation["anchors"] for field in extraction.IDENTIFIER_FIELDS):
+        return
+
+    try:
+        async with db.begin_nested():
+            template = await _get_template(db, *key)
+            if template is None:
+                template = VendorTemplate(sender_domain=key[0], fingerprint=key[1], observations=[])
+                db.add(template)
+            was_active = template.fields is not None
+            template.observations = [*template.observations, observation][-extraction.MIN_SAMPLES:]
+            template.fields = extraction.build_template(template.observations)
+    except IntegrityError:
+        # Created concurrently by another worker; the next email will be recorded
+        return
+    if template.fields is not None and not was_active:
+        logger.info(f"Learned extraction template for {key[0]} ({len(template.fields['anchors'])} anchored fields)")
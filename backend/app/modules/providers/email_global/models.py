@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String, func
+from sqlalchemy import JSON, BigInteger, Boolean, ForeignKey, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -22,6 +22,10 @@ class GlobalMailConfig(Base):
     watched_folder_path: Mapped[str] = mapped_column(String(512), default="INBOX")
     last_seen_uid: Mapped[int] = mapped_column(Integer, default=0)
     uidvalidity: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=None)
+    highest_modseq: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, default=None)
+    filter_rules: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, default=None)
+    # Bumped on every sender address edit so other nodes reload their SenderIndex
+    sender_generation: Mapped[int] = mapped_column(Integer, default=0)
 
 
 class UserSenderAddress(Base):
@@ -12,6 +12,7 @@ from app.modules.providers.email_global.schemas import (
     GlobalMailConfigResponse,
     GlobalMailFoldersResponse,
 )
+from app.modules.providers.email_global.service import restart_global_watcher
 
 router = APIRouter(tags=["email-global"], dependencies=[Depends(get_admin_user)])
 
@@ -44,6 +45,7 @@ async def update_global_mail_config(
             polling_interval_sec=req.polling_interval_sec,
             use_polling=req.use_polling,
             watched_folder_path=req.watched_folder_path,
+            filter_rules=req.filter_rules.model_dump() if req.filter_rules else None,
         )
         db.add(config)
     else:
@@ -56,8 +58,11 @@ async def update_global_mail_config(
         config.polling_interval_sec = req.polling_interval_sec
         config.use_polling = req.use_polling
         config.watched_folder_path = req.watched_folder_path
+        if "filter_rules" in req.model_fields_set:
+            config.filter_rules = req.filter_rules.model_dump() if req.filter_rules else None
     await db.commit()
     await db.refresh(config)
+    await restart_global_watcher()
     return config
 
 
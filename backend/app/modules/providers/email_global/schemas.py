@@ -3,6 +3,8 @@ from typing import Optional
 
 from pydantic import BaseModel, EmailStr
 
+from app.modules._shared.email.search_filter import SearchFilterRules
+
 
 class GlobalMailConfigRequest(BaseModel):
     imap_host: str
@@ -13,6 +15,7 @@ class GlobalMailConfigRequest(BaseModel):
     polling_interval_sec: int = 300
     use_polling: bool = False
     watched_folder_path: str = "INBOX"
+    filter_rules: Optional[SearchFilterRules] = None  # left unchanged when omitted
 
 
 class GlobalMailConfigResponse(BaseModel):
@@ -25,6 +28,7 @@ class GlobalMailConfigResponse(BaseModel):
     use_polling: bool
     idle_supported: Optional[bool] = None
     watched_folder_path: str
+    filter_rules: Optional[SearchFilterRules] = None
 
     model_config = {"from_attributes": True}
 
@@ -0,0 +1,83 @@
+"""In-memory routing table for the global mailbox: sender address -> user.
+
+Routing an email is a dict lookup. The table is loaded when the watcher
+connects and kept in sync in two ways: sender-address edits on this node
+update it directly, and at most every CHECK_INTERVAL_SEC a one-row version
+query detects edits made through other nodes, which triggers a reload.
+
+The version is the generation counter that every edit bumps (see
+bump_generation), plus the row count and max id. The counter is needed
+because SQLite reuses the highest id after a delete, so a delete followed
+by an insert can leave count and max id unchanged. Count and max id still
+catch rows removed along with their user.
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.modules.providers.email_global.models import GlobalMailConfig, UserSenderAddress
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL_SEC = 30
+
+
+async def bump_generation(db: AsyncSession) -> None:
+    """Mark the sender addresses as changed for other nodes; commit with the edit."""
+    await db.execute(
+        update(GlobalMailConfig).values(sender_generation=GlobalMailConfig.sender_generation + 1)
+    )
+
+
+class SenderIndex:
+    def __init__(self, check_interval_sec: float = CHECK_INTERVAL_SEC):
+        self.check_interval_sec = check_interval_sec
+        self._users: dict[str, int] = {}
+        self._version: tuple[int, int, int] | None = None
+        self._checked_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def lookup(self, email_address: str) -> int | None:
+        """Return the user id registered for a normalized (lowercase) address."""
+        return self._users.get(email_address)
+
+    def add(self, email_address: str, user_id: int) -> None:
+        self._users[email_address] = user_id
+
+    def remove(self, email_address: str) -> None:
+        self._users.pop(email_address, None)
+
+    def invalidate(self) -> None:
+        """Force a version check (and reload if needed) on the next refresh."""
+        self._checked_at = None
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> None:
+        """Reload the table if it changed; without ``force``, checks at most every interval."""
+        if not force and self._checked_at is not None and (
+            time.monotonic() - self._checked_at < self.check_interval_sec
+        ):
+            return
+        async with self._lock:
+            generation = select(func.coalesce(func.max(GlobalMailConfig.sender_generation), 0)).scalar_subquery()
+            result = await db.execute(
+                select(func.count(), func.coalesce(func.max(UserSenderAddress.id), 0), generation)
+            )
+            version = tuple(result.one())
+            if force or version != self._version:
+                result = await db.execute(
+                    select(UserSenderAddress.email_address, UserSenderAddress.user_id)
+                )
+                self._users = dict(result.all())
+                self._version = version
+                logger.debug(f"Loaded {len(self._users)} sender addresses for global mail routing")
+            self._checked_at = time.monotonic()
+
+
+sender_index = SenderIndex()
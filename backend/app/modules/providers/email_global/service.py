@@ -1,30 +1,45 @@
 import asyncio
 import logging
 
-from sqlalchemy import func, select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import async_session
 from app.models.imap_settings import ImapSettings
 from app.models.module_config import ModuleConfig
+from app.modules._shared.email import cluster
 from app.modules._shared.email.imap_client import extract_email_from_header
 from app.modules._shared.email.imap_watcher import WorkerMode, WorkerState
 from app.modules._shared.email.imap_watch_loop import (
     ConnectResult,
     FetchContext,
     ImapWatcherCallbacks,
+    imap_settings_fingerprint,
+    load_poll_schedule,
+    select_folder,
     watch_loop,
 )
 from app.modules.providers.email_global.models import GlobalMailConfig, UserSenderAddress
+from app.modules.providers.email_global.sender_index import sender_index
+from app.services.orders.order_service import has_orders_in_transit
 
 logger = logging.getLogger(__name__)
 
 _global_task: asyncio.Task | None = None
 _global_state: WorkerState | None = None
+_global_fingerprint: tuple | None = None
+_global_enabled = False
+_global_lock = asyncio.Lock()
 
+POOL = "email-global"
+LEASE_KEY = "global"
 
-def get_global_state() -> WorkerState | None:
-    return _global_state
+
+def _local_states() -> dict[str, WorkerState]:
+    """State of the global watcher if it runs on this node, published on every heartbeat."""
+    if _global_task is None or _global_task.done() or _global_state is None:
+        return {}
+    return {LEASE_KEY: _global_state}
 
 
 def _build_global_callbacks() -> ImapWatcherCallbacks:
@@ -62,13 +77,33 @@ def _build_global_callbacks() -> ImapWatcherCallbacks:
             await db.commit()
             await db.refresh(config)
 
-        await imap.select(config.watched_folder_path)
+        selected = await select_folder(imap, config.watched_folder_path)
+        await sender_index.refresh(db, force=True)
+
+        settings_result = await db.execute(select(ImapSettings))
+        global_settings = settings_result.scalar_one_or_none()
+        check_uid = global_settings.check_uidvalidity if global_settings else True
+        if check_uid and selected.uidvalidity is not None:
+            if config.uidvalidity is None:
+                config.uidvalidity = selected.uidvalidity
+                await db.commit()
+            elif config.uidvalidity != selected.uidvalidity:
+                logger.warning(
+                    f"UIDVALIDITY changed for global mail: "
+                    f"{config.uidvalidity} -> {selected.uidvalidity}. Resetting."
+                )
+                config.uidvalidity = selected.uidvalidity
+                config.last_seen_uid = 0
+                config.highest_modseq = None
+                await db.commit()
 
         return ConnectResult(
             imap=imap,
             idle_supported=idle_supported,
             use_polling=config.use_polling,
             polling_interval_sec=config.polling_interval_sec,
+            selected=selected,
+            poll_schedule=await load_poll_schedule(db),
         )
 
     async def load_fetch_context(db: AsyncSession) -> FetchContext | None:
@@ -91,43 +126,59 @@ def _build_global_callbacks() -> ImapWatcherCallbacks:
             source_info=f"global / {config.watched_folder_path}",
             source_label="global mail",
             account_id=None,
+            highest_modseq=config.highest_modseq,
+            filter_rules=config.filter_rules,
         )
 
     async def route_email(sender: str, db: AsyncSession):
+        await sender_index.refresh(db)  # queries only once per check interval
         sender_email = extract_email_from_header(sender)
-        result = await db.execute(
-            select(UserSenderAddress).where(
-                UserSenderAddress.email_address == sender_email
-            )
-        )
-        sender_addr = result.scalar_one_or_none()
-        if not sender_addr:
+        user_id = sender_index.lookup(sender_email)
+        if user_id is None:
             logger.info(
                 f"Global mail: discarding email from unregistered sender: {sender_email}"
             )
             return None
-        return (sender_addr.user_id, "global_mail")
+        return (user_id, "global_mail")
+
+    async def has_active_shipments(db: AsyncSession) -> bool:
+        return await has_orders_in_transit(db, select(UserSenderAddress.user_id))
 
     async def save_uid(uid: int, db: AsyncSession) -> None:
-        result = await db.execute(select(GlobalMailConfig))
-        config = result.scalar_one_or_none()
-        if config:
-            config.last_seen_uid = uid
-            await db.commit()
+        await db.execute(update(GlobalMailConfig).values(last_seen_uid=uid))
+
+    async def save_modseq(modseq: int, db: AsyncSession) -> None:
+        await db.execute(update(GlobalMailConfig).values(highest_modseq=modseq))
 
     return ImapWatcherCallbacks(
         connect=connect,
         load_fetch_context=load_fetch_context,
         route_email=route_email,
         save_uid=save_uid,
+        save_modseq=save_modseq,
         log_label="global mail",
+        has_active_shipments=has_active_shipments,
     )
 
 
-def _start_global_watcher(config: GlobalMailConfig) -> None:
-    global _global_task, _global_state
-    if _global_task and not _global_task.done():
-        _global_task.cancel()
+def _config_fingerprint(config: GlobalMailConfig, settings: ImapSettings | None) -> tuple:
+    """Everything the running watcher read on connect; a change requires a restart."""
+    return (
+        config.imap_host,
+        config.imap_port,
+        config.imap_user,
+        config.imap_password_encrypted,
+        config.use_ssl,
+        config.use_polling,
+        config.polling_interval_sec,
+        config.watched_folder_path,
+        config.filter_rules,
+        imap_settings_fingerprint(settings),
+    )
+
+
+def _start_global_watcher(fingerprint: tuple) -> None:
+    global _global_task, _global_state, _global_fingerprint
     _global_state = WorkerState(
         folder_id=0,
         account_id=0,
@@ -135,21 +186,11 @@ def _start_global_watcher(config: GlobalMailConfig) -> None:
     )
     callbacks = _build_global_callbacks()
     _global_task = asyncio.create_task(watch_loop(callbacks, _global_state))
+    _global_fingerprint = fingerprint
 
 
-async def start_global_watcher():
-    """Startup hook: start global mail watcher if configured."""
-    async with async_session() as db:
-        result = await db.execute(select(GlobalMailConfig))
-        config = result.scalar_one_or_none()
-        if config:
-            _start_global_watcher(config)
-            logger.info("Global mail watcher started")
-
-
-async def stop_global_watcher():
-    """Shutdown hook: stop global mail watcher."""
-    global _global_task, _global_state
+async def _stop_global_task() -> None:
+    global _global_task, _global_state, _global_fingerprint
     if _global_task and not _global_task.done():
         _global_task.cancel()
         try:
@@ -158,26 +199,78 @@ async def stop_global_watcher():
             pass
     _global_task = None
     _global_state = None
+    _global_fingerprint = None
+
+
+async def reconcile_global_watcher():
+    """Run the global watcher on this node iff it is configured and assigned here.
+
+    Restarts it when the config changed and stops it when another node takes
+    over (see cluster). Also runs after every node heartbeat.
+    """
+    async with _global_lock:
+        async with async_session() as db:
+            config = (await db.execute(select(GlobalMailConfig))).scalar_one_or_none()
+            settings = (await db.execute(select(ImapSettings))).scalar_one_or_none()
+            nodes = await cluster.live_nodes(db, POOL)
+            wanted = config is not None and cluster.owner_of(LEASE_KEY, nodes) == cluster.NODE_ID
+            fingerprint = _config_fingerprint(config, settings) if config else None
+
+            if not wanted or fingerprint != _global_fingerprint or (
+                _global_task and _global_task.done()
+            ):
+                await _stop_global_task()
+
+            held = await cluster.sync_leases(db, LEASE_KEY, {LEASE_KEY} if wanted else set())
+
+        if LEASE_KEY not in held:
+            await _stop_global_task()
+        elif _global_task is None:
+            _start_global_watcher(fingerprint)
+            logger.info(f"Global mail watcher started on {cluster.NODE_ID}")
+
+
+async def start_global_watcher():
+    """Startup hook: start global mail watcher if configured and assigned to this node."""
+    global _global_enabled
+    _global_enabled = True
+    cluster.register_rebalancer(POOL, reconcile_global_watcher, _stop_global_task, _local_states)
+    await reconcile_global_watcher()
+
+
+async def stop_global_watcher():
+    """Shutdown hook: stop global mail watcher and release its lease."""
+    global _global_enabled
+    _global_enabled = False
+    await cluster.unregister_rebalancer(POOL)
+    async with _global_lock:
+        await _stop_global_task()
+        try:
+            async with async_session() as db:
+                await cluster.sync_leases(db, LEASE_KEY, set())
+        except Exception as e:
+            logger.warning(f"Could not release global watcher lease: {e}")
+
+
+async def restart_global_watcher():
+    """Apply config changes: restarts the watcher on whichever node runs it.
+
+    On this node it happens immediately; other nodes notice the changed
+    config on their next heartbeat.
+    """
+    if _global_enabled:
+        await reconcile_global_watcher()
 
 
 async def get_status(db: AsyncSession) -> dict | None:
-    """Status hook: return global mail watcher state."""
+    """Status hook: return global mail watcher state from whichever node runs it."""
     result = await db.execute(select(GlobalMailConfig))
     config = result.scalar_one_or_none()
     if not config:
         return None
 
-    state = _global_state
-    task = _global_task
-
-    is_running = task is not None and not task.done()
-
-    if state:
-        mode = state.mode
-    elif not is_running:
-        mode = "stopped"
-    else:
-        mode = "unknown"
+    states = await cluster.read_states(db, LEASE_KEY)
+    state = states.get(LEASE_KEY)
 
     sender_result = await db.execute(
         select(func.count()).select_from(UserSenderAddress)
@@ -186,8 +279,9 @@ async def get_status(db: AsyncSession) -> dict | None:
 
     return {
         "watching": config.watched_folder_path,
-        "running": is_running,
-        "mode": mode,
+        "running": state is not None,
+        "mode": state.mode if state else "stopped",
+        "node_id": state.node_id if state else None,
         "registered_senders": registered_senders,
         "last_scan_at": state.last_scan_at.isoformat() if state and state.last_scan_at else None,
         "next_scan_at": state.next_scan_at.isoformat() if state and state.next_scan_at else None,
@@ -6,6 +6,7 @@ from app.api.deps import get_current_user
 from app.database import get_db
 from app.models.module_config import ModuleConfig
 from app.modules.providers.email_global.models import GlobalMailConfig, UserSenderAddress
+from app.modules.providers.email_global.sender_index import bump_generation, sender_index
 from app.modules.providers.email_global.schemas import (
     CreateSenderAddressRequest,
     SenderAddressResponse,
@@ -61,8 +62,10 @@ async def create_sender_address(
 
     addr = UserSenderAddress(user_id=user.id, email_address=req.email_address.lower())
     db.add(addr)
+    await bump_generation(db)
     await db.commit()
     await db.refresh(addr)
+    sender_index.add(addr.email_address, addr.user_id)
     return addr
 
 
@@ -76,4 +79,6 @@ async def delete_sender_address(
     if not addr or addr.user_id != user.id:
         raise HTTPException(status_code=404, detail="Address not found")
     await db.delete(addr)
+    await bump_generation(db)
     await db.commit()
+    sender_index.remove(addr.email_address)
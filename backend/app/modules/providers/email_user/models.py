@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, Boolean, Integer, DateTime, ForeignKey, func
+from sqlalchemy import BigInteger, JSON, String, Boolean, Integer, DateTime, ForeignKey, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -37,5 +37,7 @@ class WatchedFolder(Base):
     last_seen_uid: Mapped[int] = mapped_column(Integer, default=0)
     max_email_age_days: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=None)
     uidvalidity: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=None)
+    highest_modseq: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, default=None)
+    filter_rules: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True, default=None)
 
     account = relationship("EmailAccount", back_populates="watched_folders")
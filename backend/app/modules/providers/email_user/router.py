@@ -1,4 +1,6 @@
-from fastapi import APIRouter, Depends
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -6,10 +8,19 @@ from app.database import get_db
 from app.models.imap_settings import ImapSettings
 from app.schemas.imap_settings import ImapSettingsRequest, ImapSettingsResponse
 from app.api.deps import get_admin_user
+from app.modules.providers.email_user.schemas import FolderStatusListResponse, FolderStatusResponse
+from app.modules.providers.email_user.service import list_folder_statuses, reconcile_watchers
 
 router = APIRouter(tags=["email-user"], dependencies=[Depends(get_admin_user)])
 
-DEFAULTS = ImapSettingsResponse(id=0, max_email_age_days=7, check_uidvalidity=True)
+DEFAULTS = ImapSettingsResponse(
+    id=0,
+    max_email_age_days=7,
+    check_uidvalidity=True,
+    adaptive_polling=False,
+    min_polling_interval_sec=60,
+    max_polling_interval_sec=1800,
+)
 
 
 @router.get("/settings", response_model=ImapSettingsResponse)
@@ -26,14 +37,32 @@ async def update_imap_settings(req: ImapSettingsRequest, db: AsyncSession = Depe
     result = await db.execute(select(ImapSettings))
     settings = result.scalar_one_or_none()
     if not settings:
-        settings = ImapSettings(
-            max_email_age_days=req.max_email_age_days,
-            check_uidvalidity=req.check_uidvalidity,
-        )
+        settings = ImapSettings(**req.model_dump())
         db.add(settings)
     else:
-        settings.max_email_age_days = req.max_email_age_days
-        settings.check_uidvalidity = req.check_uidvalidity
+        for field, value in req.model_dump().items():
+            setattr(settings, field, value)
     await db.commit()
     await db.refresh(settings)
+    await reconcile_watchers()
     return settings
+
+
+@router.get("/status/folders", response_model=FolderStatusListResponse)
+async def list_folder_status(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=200),
+    state: Optional[Literal[
+        "running", "stopped", "error",
+        "connecting", "idle", "polling", "processing", "error_backoff",
+    ]] = Query(None),
+    search: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    items, total = await list_folder_statuses(db, page, per_page, state, search)
+    return FolderStatusListResponse(
+        items=[FolderStatusResponse(**item) for item in items],
+        total=total,
+        page=page,
+        per_page=per_page,
+    )
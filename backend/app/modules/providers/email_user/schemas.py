@@ -1,6 +1,9 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
 
+from app.modules._shared.email.search_filter import SearchFilterRules
+
 
 class CreateAccountRequest(BaseModel):
     name: str
@@ -42,10 +45,12 @@ class AccountResponse(BaseModel):
 
 class WatchFolderRequest(BaseModel):
     folder_path: str
+    filter_rules: Optional[SearchFilterRules] = None
 
 
 class UpdateWatchedFolderRequest(BaseModel):
     max_email_age_days: Optional[int] = None
+    filter_rules: Optional[SearchFilterRules] = None
 
 
 class WatchedFolderResponse(BaseModel):
@@ -53,5 +58,34 @@ class WatchedFolderResponse(BaseModel):
     folder_path: str
     last_seen_uid: int
     max_email_age_days: Optional[int] = None
+    filter_rules: Optional[SearchFilterRules] = None
 
     model_config = {"from_attributes": True}
+
+
+class FolderStatusResponse(BaseModel):
+    folder_id: int
+    folder_path: str
+    account_id: int
+    account_name: str
+    account_active: bool
+    user_id: int
+    username: str
+    running: bool
+    mode: str
+    node_id: Optional[str] = None
+    last_scan_at: Optional[datetime] = None
+    next_scan_at: Optional[datetime] = None
+    last_activity_at: Optional[datetime] = None
+    queue_total: int = 0
+    queue_position: int = 0
+    current_email_subject: Optional[str] = None
+    current_email_sender: Optional[str] = None
+    error: Optional[str] = None
+
+
+class FolderStatusListResponse(BaseModel):
+    items: list[FolderStatusResponse]
+    total: int
+    page: int
+    per_page: int
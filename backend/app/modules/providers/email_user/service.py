@@ -1,36 +1,56 @@
 import asyncio
 import logging
-import re
 from datetime import datetime, timezone
 
-from sqlalchemy import select
+from sqlalchemy import String, cast, func, literal, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import aliased
 
 from app.database import async_session
 from app.models.imap_settings import ImapSettings
+from app.modules._shared.email import cluster
 from app.modules._shared.email.imap_watcher import WorkerMode, WorkerState
+from app.modules._shared.email.models import WatcherStatus
 from app.modules._shared.email.imap_watch_loop import (
     ConnectResult,
     FetchContext,
     ImapWatcherCallbacks,
+    imap_settings_fingerprint,
+    load_poll_schedule,
+    select_folder,
     watch_loop,
 )
 from app.modules.providers.email_user.models import EmailAccount, WatchedFolder
+from app.services.orders.order_service import has_orders_in_transit
 
 logger = logging.getLogger(__name__)
 
 _running_tasks: dict[int, asyncio.Task] = {}
 _worker_state: dict[int, WorkerState] = {}
+_fingerprints: dict[int, tuple] = {}
+_reconcile_lock = asyncio.Lock()
 
+POOL = "email-user"
+LEASE_PREFIX = "folder:"
 
-def get_worker_states() -> dict[int, WorkerState]:
-    return dict(_worker_state)
 
+def _lease_key(folder_id: int) -> str:
+    return f"{LEASE_PREFIX}{folder_id}"
 
-def is_folder_scanning(folder_id: int) -> bool:
-    """Check if a folder is currently mid-scan (processing emails)."""
-    state = _worker_state.get(folder_id)
+
+def _local_states() -> dict[str, WorkerState]:
+    """States of the watchers running on this node, published on every heartbeat."""
+    return {
+        _lease_key(fid): _worker_state[fid]
+        for fid, task in _running_tasks.items()
+        if not task.done() and fid in _worker_state
+    }
+
+
+async def is_folder_scanning(db: AsyncSession, folder_id: int) -> bool:
+    """Check if a folder is currently mid-scan (processing emails) on any node."""
+    states = await cluster.read_states(db, _lease_key(folder_id))
+    state = states.get(_lease_key(folder_id))
     return state is not None and state.mode == WorkerMode.PROCESSING
 
 
@@ -76,37 +96,30 @@ def _build_callbacks(account_id: int, folder_id: int) -> ImapWatcherCallbacks:
             await db.commit()
             await db.refresh(account)
 
-        select_response = await imap.select(folder.folder_path)
+        selected = await select_folder(imap, folder.folder_path)
 
         _, check_uid = await _get_effective_settings(db, folder)
-        if check_uid:
-            current_uidvalidity = None
-            if select_response and len(select_response) > 1:
-                for line in select_response[1]:
-                    line_str = line.decode() if isinstance(line, bytes) else str(line)
-                    match = re.search(r"UIDVALIDITY\s+(\d+)", line_str)
-                    if match:
-                        current_uidvalidity = int(match.group(1))
-                        break
-
-            if current_uidvalidity is not None:
-                if folder.uidvalidity is None:
-                    folder.uidvalidity = current_uidvalidity
-                    await db.commit()
-                elif folder.uidvalidity != current_uidvalidity:
-                    logger.warning(
-                        f"UIDVALIDITY changed for folder {folder.id}: "
-                        f"{folder.uidvalidity} -> {current_uidvalidity}. Resetting."
-                    )
-                    folder.uidvalidity = current_uidvalidity
-                    folder.last_seen_uid = 0
-                    await db.commit()
+        if check_uid and selected.uidvalidity is not None:
+            if folder.uidvalidity is None:
+                folder.uidvalidity = selected.uidvalidity
+                await db.commit()
+            elif folder.uidvalidity != selected.uidvalidity:
+                logger.warning(
+                    f"UIDVALIDITY changed for folder {folder.id}: "
+                    f"{folder.uidvalidity} -> {selected.uidvalidity}. Resetting."
+                )
+                folder.uidvalidity = selected.uidvalidity
+                folder.last_seen_uid = 0
+                folder.highest_modseq = None
+                await db.commit()
 
         return ConnectResult(
             imap=imap,
             idle_supported=idle_supported,
             use_polling=account.use_polling,
             polling_interval_sec=account.polling_interval_sec,
+            selected=selected,
+            poll_schedule=await load_poll_schedule(db),
         )
 
     async def load_fetch_context(db: AsyncSession) -> FetchContext | None:
@@ -125,6 +138,8 @@ def _build_callbacks(account_id: int, folder_id: int) -> ImapWatcherCallbacks:
             source_info=f"{account.imap_user} / {folder.folder_path}",
             source_label=f"folder {folder_id}",
             account_id=account.id,
+            highest_modseq=folder.highest_modseq,
+            filter_rules=folder.filter_rules,
         )
 
     async def route_email(sender: str, db: AsyncSession):
@@ -133,172 +148,274 @@ def _build_callbacks(account_id: int, folder_id: int) -> ImapWatcherCallbacks:
             return None
         return (account.user_id, "user_account")
 
+    async def has_active_shipments(db: AsyncSession) -> bool:
+        account = await db.get(EmailAccount, account_id)
+        if not account:
+            return False
+        return await has_orders_in_transit(db, [account.user_id])
+
     async def save_uid(uid: int, db: AsyncSession) -> None:
-        folder = await db.get(WatchedFolder, folder_id)
-        if folder:
-            folder.last_seen_uid = uid
-            await db.commit()
+        await db.execute(
+            update(WatchedFolder)
+            .where(WatchedFolder.id == folder_id)
+            .values(last_seen_uid=uid)
+        )
+
+    async def save_modseq(modseq: int, db: AsyncSession) -> None:
+        await db.execute(
+            update(WatchedFolder)
+            .where(WatchedFolder.id == folder_id)
+            .values(highest_modseq=modseq)
+        )
 
     return ImapWatcherCallbacks(
         connect=connect,
         load_fetch_context=load_fetch_context,
         route_email=route_email,
         save_uid=save_uid,
+        save_modseq=save_modseq,
         log_label=f"folder {folder_id}",
+        has_active_shipments=has_active_shipments,
     )
 
 
-async def start_all_watchers():
-    """Start watchers for all active accounts and their watched folders."""
-    async with async_session() as db:
-        result = await db.execute(
-            select(WatchedFolder)
-            .join(EmailAccount)
-            .where(EmailAccount.is_active == True)
-        )
-        folders = result.scalars().all()
-        for folder in folders:
-            key = folder.id
-            if key not in _running_tasks:
-                _worker_state[key] = WorkerState(folder_id=folder.id, account_id=folder.account_id)
-                callbacks = _build_callbacks(folder.account_id, folder.id)
-                task = asyncio.create_task(watch_loop(callbacks, _worker_state[key]))
-                _running_tasks[key] = task
-                logger.info(f"Started watcher for folder {folder.id} (account {folder.account_id})")
+def _watcher_fingerprint(
+    account: EmailAccount, folder: WatchedFolder, settings: ImapSettings | None,
+) -> tuple:
+    """Everything a running watcher read on connect; a change requires a restart."""
+    return (
+        account.imap_host,
+        account.imap_port,
+        account.imap_user,
+        account.imap_password_encrypted,
+        account.use_ssl,
+        account.use_polling,
+        account.polling_interval_sec,
+        folder.folder_path,
+        folder.max_email_age_days,
+        folder.filter_rules,
+        imap_settings_fingerprint(settings),
+    )
 
 
-async def stop_all_watchers():
-    """Stop all running user watchers."""
-    for key, task in _running_tasks.items():
+def _start_watcher(folder_id: int, account_id: int, fingerprint: tuple) -> None:
+    _worker_state[folder_id] = WorkerState(folder_id=folder_id, account_id=account_id)
+    callbacks = _build_callbacks(account_id, folder_id)
+    _running_tasks[folder_id] = asyncio.create_task(
+        watch_loop(callbacks, _worker_state[folder_id])
+    )
+    _fingerprints[folder_id] = fingerprint
+
+
+async def _stop_watchers(folder_ids: list[int]) -> None:
+    tasks = [_running_tasks.pop(fid) for fid in folder_ids if fid in _running_tasks]
+    for task in tasks:
         task.cancel()
-    _running_tasks.clear()
-    _worker_state.clear()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for fid in folder_ids:
+        _worker_state.pop(fid, None)
+        _fingerprints.pop(fid, None)
+
+
+async def reconcile_watchers():
+    """Bring this node's running watchers in line with the configured folders.
+
+    Diffs the watched folders of active accounts that are assigned to this
+    node (see cluster) against the running tasks: starts missing watchers,
+    stops removed, deactivated or reassigned ones, and restarts only those
+    whose configuration fingerprint changed (or whose task ended). A watcher
+    only runs while this node holds its lease. Untouched watchers keep their
+    IMAP connection. Also runs after every node heartbeat.
+    """
+    async with _reconcile_lock:
+        async with async_session() as db:
+            settings = (await db.execute(select(ImapSettings))).scalar_one_or_none()
+            result = await db.execute(
+                select(WatchedFolder, EmailAccount)
+                .join(EmailAccount)
+                .where(EmailAccount.is_active == True)
+            )
+            nodes = await cluster.live_nodes(db, POOL)
+            desired = {
+                folder.id: (account.id, _watcher_fingerprint(account, folder, settings))
+                for folder, account in result.all()
+                if cluster.owner_of(_lease_key(folder.id), nodes) == cluster.NODE_ID
+            }
+
+            stale = [
+                fid for fid, task in _running_tasks.items()
+                if fid not in desired
+                or task.done()
+                or _fingerprints.get(fid) != desired[fid][1]
+            ]
+            await _stop_watchers(stale)
+
+            held = await cluster.sync_leases(
+                db, LEASE_PREFIX, {_lease_key(fid) for fid in desired},
+            )
+
+        lost = [fid for fid in _running_tasks if _lease_key(fid) not in held]
+        await _stop_watchers(lost)
+
+        started = 0
+        for fid, (account_id, fingerprint) in desired.items():
+            if fid not in _running_tasks and _lease_key(fid) in held:
+                _start_watcher(fid, account_id, fingerprint)
+                started += 1
+
+        restarted = sum(1 for fid in stale if fid in desired)
+        stopped = len(stale) - restarted + len(lost)
+        if stopped or started:
+            logger.info(
+                f"Reconciled watchers: {started - restarted} started, "
+                f"{restarted} restarted, {stopped} stopped, "
+                f"{len(_running_tasks)} running on {cluster.NODE_ID}"
+            )
+
+
+async def _stop_local_watchers():
+    await _stop_watchers(list(_running_tasks))
 
 
-async def restart_watchers():
-    """Restart all watchers (call after account/folder changes)."""
-    await stop_all_watchers()
-    await start_all_watchers()
+async def start_all_watchers():
+    """Start watchers for the active folders assigned to this node."""
+    cluster.register_rebalancer(POOL, reconcile_watchers, _stop_local_watchers, _local_states)
+    await reconcile_watchers()
 
 
-async def restart_single_watcher(folder_id: int):
-    """Restart watcher for a single folder to trigger immediate scan."""
-    if folder_id in _running_tasks:
-        task = _running_tasks.pop(folder_id)
-        task.cancel()
+async def stop_all_watchers():
+    """Stop all user watchers on this node and release their leases."""
+    await cluster.unregister_rebalancer(POOL)
+    async with _reconcile_lock:
+        await _stop_local_watchers()
         try:
-            await task
-        except (asyncio.CancelledError, Exception):
-            pass
-        _worker_state.pop(folder_id, None)
+            async with async_session() as db:
+                await cluster.sync_leases(db, LEASE_PREFIX, set())
+        except Exception as e:
+            logger.warning(f"Could not release user watcher leases: {e}")
+
+
+async def restart_single_watcher(folder_id: int) -> bool:
+    """Restart watcher for a single folder to trigger an immediate scan.
+
+    Returns False if the folder is not watched on this node (inactive, or
+    assigned to another node).
+    """
+    async with _reconcile_lock:
+        # Checked under the lock: a reconcile may just have stopped the watcher
+        if folder_id in _running_tasks:
+            state = _worker_state.get(folder_id)
+            if state is None:
+                return False
+            fingerprint = _fingerprints.get(folder_id)
+            await _stop_watchers([folder_id])
+            _start_watcher(folder_id, state.account_id, fingerprint)
+            logger.info(f"Restarted watcher for folder {folder_id} (manual scan)")
+            return True
+
+    # Not started here yet (e.g. just activated); a fresh start scans too
+    await reconcile_watchers()
+    return folder_id in _running_tasks
 
-    async with async_session() as db:
-        folder = await db.get(WatchedFolder, folder_id)
-        if not folder:
-            return
-        account = await db.get(EmailAccount, folder.account_id)
-        if not account or not account.is_active:
-            return
-        _worker_state[folder_id] = WorkerState(folder_id=folder_id, account_id=folder.account_id)
-        callbacks = _build_callbacks(folder.account_id, folder_id)
-        task = asyncio.create_task(watch_loop(callbacks, _worker_state[folder_id]))
-        _running_tasks[folder_id] = task
-        logger.info(f"Restarted watcher for folder {folder_id} (manual scan)")
+
+def _live_folder_states():
+    return aliased(WatcherStatus, cluster.live_states(LEASE_PREFIX))
 
 
 async def get_status(db: AsyncSession) -> dict:
-    """Status hook: return per-user/account/folder worker state."""
-    from app.models.user import User
+    """Status hook: aggregated watcher counters across all nodes.
+
+    Computed with a few aggregate queries, independent of the number of
+    folders; per-folder details are paged via list_folder_statuses.
+    """
+    total_folders = (
+        await db.execute(select(func.count()).select_from(WatchedFolder))
+    ).scalar() or 0
 
+    state = _live_folder_states()
     result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.email_accounts)
-            .selectinload(EmailAccount.watched_folders)
-        )
+        select(state.mode, func.count(), func.count(state.error)).group_by(state.mode)
     )
-    all_users = result.scalars().all()
-
-    total_folders = 0
-    running_count = 0
-    error_count = 0
-
-    users_out = []
-    for user in all_users:
-        if not user.email_accounts:
-            continue
-
-        accounts_out = []
-        for account in user.email_accounts:
-            folders_out = []
-            for folder in account.watched_folders:
-                fid = folder.id
-                task = _running_tasks.get(fid)
-                state = _worker_state.get(fid)
-
-                is_running = task is not None and not task.done()
-                task_error = None
-                if task is not None and task.done():
-                    try:
-                        exc = task.exception()
-                        if exc:
-                            task_error = str(exc)
-                    except Exception:
-                        pass
-
-                if state:
-                    mode = state.mode
-                elif not is_running:
-                    mode = "stopped"
-                else:
-                    mode = "unknown"
-
-                last_scan_at = state.last_scan_at.isoformat() if state and state.last_scan_at else None
-                next_scan_at = state.next_scan_at.isoformat() if state and state.next_scan_at else None
-                last_activity_at = state.last_activity_at.isoformat() if state and state.last_activity_at else None
-                q_total = state.queue_total if state else 0
-                q_position = state.queue_position if state else 0
-                current_subject = state.current_email_subject if state else None
-                current_sender = state.current_email_sender if state else None
-                error = state.error if state else task_error
-
-                total_folders += 1
-                if is_running:
-                    running_count += 1
-                if error:
-                    error_count += 1
-
-                folders_out.append({
-                    "folder_id": fid,
-                    "folder_path": folder.folder_path,
-                    "running": is_running,
-                    "mode": mode,
-                    "last_scan_at": last_scan_at,
-                    "next_scan_at": next_scan_at,
-                    "last_activity_at": last_activity_at,
-                    "queue_total": q_total,
-                    "queue_position": q_position,
-                    "current_email_subject": current_subject,
-                    "current_email_sender": current_sender,
-                    "error": error,
-                })
-
-            accounts_out.append({
-                "account_id": account.id,
-                "account_name": account.name,
-                "is_active": account.is_active,
-                "folders": folders_out,
-            })
-
-        users_out.append({
-            "user_id": user.id,
-            "username": user.username,
-            "accounts": accounts_out,
-        })
+    modes: dict[str, int] = {}
+    errors = 0
+    for mode, count, error_count in result.all():
+        modes[mode] = count
+        errors += error_count
 
     return {
         "total_folders": total_folders,
-        "running": running_count,
-        "errors": error_count,
-        "users": users_out,
+        "running": sum(modes.values()),
+        "errors": errors,
+        "modes": modes,
     }
+
+
+async def list_folder_statuses(
+    db: AsyncSession,
+    page: int,
+    per_page: int,
+    state: str | None = None,
+    search: str | None = None,
+) -> tuple[list[dict], int]:
+    """Return one page of per-folder watcher state and the total number of matches.
+
+    ``state`` is "running", "stopped", "error" or a WorkerMode; ``search``
+    matches username, account name, IMAP user and folder path.
+    """
+    from app.models.user import User
+
+    live = _live_folder_states()
+    query = (
+        select(WatchedFolder, EmailAccount, User, live)
+        .join(EmailAccount, WatchedFolder.account_id == EmailAccount.id)
+        .join(User, EmailAccount.user_id == User.id)
+        .outerjoin(live, live.key == literal(LEASE_PREFIX) + cast(WatchedFolder.id, String))
+    )
+
+    if state == "running":
+        query = query.where(live.key.is_not(None))
+    elif state == "stopped":
+        query = query.where(live.key.is_(None))
+    elif state == "error":
+        query = query.where(live.error.is_not(None))
+    elif state:
+        query = query.where(live.mode == state)
+    if search:
+        pattern = f"%{search}%"
+        query = query.where(or_(
+            User.username.ilike(pattern),
+            EmailAccount.name.ilike(pattern),
+            EmailAccount.imap_user.ilike(pattern),
+            WatchedFolder.folder_path.ilike(pattern),
+        ))
+
+    count_query = select(func.count()).select_from(query.subquery())
+    total = (await db.execute(count_query)).scalar() or 0
+
+    query = query.order_by(User.username, EmailAccount.name, WatchedFolder.folder_path, WatchedFolder.id)
+    query = query.offset((page - 1) * per_page).limit(per_page)
+    result = await db.execute(query)
+
+    items = []
+    for folder, account, user, status in result.all():
+        items.append({
+            "folder_id": folder.id,
+            "folder_path": folder.folder_path,
+            "account_id": account.id,
+            "account_name": account.name,
+            "account_active": account.is_active,
+            "user_id": user.id,
+            "username": user.username,
+            "running": status is not None,
+            "mode": status.mode if status else "stopped",
+            "node_id": status.node_id if status else None,
+            "last_scan_at": status.last_scan_at if status else None,
+            "next_scan_at": status.next_scan_at if status else None,
+            "last_activity_at": status.last_activity_at if status else None,
+            "queue_total": status.queue_total if status else 0,
+            "queue_position": status.queue_position if status else 0,
+            "current_email_subject": status.current_email_subject if status else None,
+            "current_email_sender": status.current_email_sender if status else None,
+            "error": status.error if status else None,
+        })
+    return items, total
@@ -12,7 +12,7 @@ from app.modules.providers.email_user.schemas import (
     WatchFolderRequest, UpdateWatchedFolderRequest, WatchedFolderResponse,
 )
 from app.api.deps import get_current_user
-from app.modules.providers.email_user.service import restart_watchers, restart_single_watcher, is_folder_scanning
+from app.modules.providers.email_user.service import reconcile_watchers, restart_single_watcher, is_folder_scanning
 
 user_router = APIRouter(tags=["email-user"])
 
@@ -59,6 +59,7 @@ async def update_account(account_id: int, req: UpdateAccountRequest, user: User
             setattr(account, field, value)
     await db.commit()
     await db.refresh(account)
+    await reconcile_watchers()
     return account
 
 
@@ -69,6 +70,7 @@ async def delete_account(account_id: int, user: User = Depends(get_current_user)
         raise HTTPException(status_code=404, detail="Account not found")
     await db.delete(account)
     await db.commit()
+    await reconcile_watchers()
 
 
 @user_router.post("/accounts/{account_id}/test")
@@ -126,11 +128,15 @@ async def add_watched(account_id: int, req: WatchFolderRequest, user: User = Dep
     account = await db.get(EmailAccount, account_id)
     if not account or account.user_id != user.id:
         raise HTTPException(status_code=404, detail="Account not found")
-    folder = WatchedFolder(account_id=account_id, folder_path=req.folder_path)
+    folder = WatchedFolder(
+        account_id=account_id,
+        folder_path=req.folder_path,
+        filter_rules=req.filter_rules.model_dump() if req.filter_rules else None,
+    )
     db.add(folder)
     await db.commit()
     await db.refresh(folder)
-    await restart_watchers()
+    await reconcile_watchers()
     return folder
 
 
@@ -144,7 +150,7 @@ async def remove_watched(account_id: int, folder_id: int, user: User = Depends(g
         raise HTTPException(status_code=404, detail="Folder not found")
     await db.delete(folder)
     await db.commit()
-    await restart_watchers()
+    await reconcile_watchers()
 
 
 @user_router.patch("/accounts/{account_id}/folders/watched/{folder_id}", response_model=WatchedFolderResponse)
@@ -162,6 +168,7 @@ async def update_watched(
         setattr(folder, field, value)
     await db.commit()
     await db.refresh(folder)
+    await reconcile_watchers()
     return folder
 
 
@@ -176,7 +183,14 @@ async def scan_folder(
     folder = await db.get(WatchedFolder, folder_id)
     if not folder or folder.account_id != account_id:
         raise HTTPException(status_code=404, detail="Folder not found")
-    if is_folder_scanning(folder_id):
+    if await is_folder_scanning(db, folder_id):
         raise HTTPException(status_code=409, detail="Folder is already being scanned")
-    await restart_single_watcher(folder_id)
+    if not await restart_single_watcher(folder_id):
+        await db.refresh(account)
+        if not account.is_active:
+            raise HTTPException(status_code=409, detail="Account is inactive; activate it to scan its folders")
+        raise HTTPException(
+            status_code=409,
+            detail="Folder is being watched by another server; try again shortly",
+        )
     return {"status": "scan_triggered"}
@@ -1,14 +1,26 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 
 class ImapSettingsRequest(BaseModel):
     max_email_age_days: int = 7
     check_uidvalidity: bool = True
+    adaptive_polling: bool = False
+    min_polling_interval_sec: int = Field(default=60, ge=10)
+    max_polling_interval_sec: int = Field(default=1800, ge=10)
+
+    @model_validator(mode="after")
+    def check_polling_bounds(self):
+        if self.min_polling_interval_sec > self.max_polling_interval_sec:
+            raise ValueError("min_polling_interval_sec must not exceed max_polling_interval_sec")
+        return self
 
 
 class ImapSettingsResponse(BaseModel):
     id: int
     max_email_age_days: int
     check_uidvalidity: bool
+    adaptive_polling: bool
+    min_polling_interval_sec: int
+    max_polling_interval_sec: int
 
     model_config = {"from_attributes": True}
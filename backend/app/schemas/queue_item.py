@@ -10,6 +10,8 @@ class QueueItemSummaryResponse(BaseModel):
     source_type: str
     source_info: str
     error_message: str | None
+    prefilter_score: int | None = None
+    prefilter_decision: str | None = None
     order_id: int | None
     cloned_from_id: int | None
     created_at: datetime
@@ -4,6 +4,7 @@ from pydantic import BaseModel, Field
 class QueueSettingsResponse(BaseModel):
     max_age_days: int = Field(ge=1)
     max_per_user: int = Field(ge=1)
+    prefilter_enabled: bool
 
     model_config = {"from_attributes": True}
 
@@ -11,3 +12,4 @@ class QueueSettingsResponse(BaseModel):
 class UpdateQueueSettingsRequest(BaseModel):
     max_age_days: int = Field(ge=1)
     max_per_user: int = Field(ge=1)
+    prefilter_enabled: bool = True
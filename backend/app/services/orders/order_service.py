@@ -171,6 +171,19 @@ async def get_order_counts(
     }
 
 
+IN_TRANSIT_STATUSES = ("shipped", "in_transit", "out_for_delivery")
+
+
+async def has_orders_in_transit(db: AsyncSession, user_ids) -> bool:
+    """Return True if any of the given users (ids or an id subquery) has an order on its way."""
+    query = (
+        select(Order.id)
+        .where(Order.user_id.in_(user_ids), Order.status.in_(IN_TRANSIT_STATUSES))
+        .limit(1)
+    )
+    return (await db.execute(query)).first() is not None
+
+
 async def get_order_detail(
     db: AsyncSession,
     user_id: int,
@@ -0,0 +1,125 @@
+"""Cheap local relevance check that runs before any analyser.
+
+Most queued emails are newsletters, account notices and social
+notifications that an analyser only ever marks irrelevant. This scores an
+email from keywords, the sender and the shapes of order and tracking
+numbers, and rejects it only when it is clearly noise. Anything that looks
+like an order or a shipment always goes on to the analysers.
+"""
+
+import re
+from dataclasses import dataclass
+
+PASSED = "passed"
+REJECTED = "rejected"
+
+# Total score at or below which an email without strong signals is rejected
+REJECT_THRESHOLD = -3
+
+# Only the start of the body is scanned; order details are near the top
+MAX_BODY_CHARS = 20000
+
+# Any match is a strong signal: the email goes to the analysers
+_STRONG_PATTERNS = [
+    re.compile(r"\b1Z[0-9A-Z]{16}\b"),  # UPS
+    re.compile(r"\bJJD\d{12,20}\b"),  # DHL / DPD parcel ids
+    re.compile(r"\b\d{3}-\d{7}-\d{7}\b"),  # Amazon order numbers
+    re.compile(
+        r"\b(?:tracking|sendungs|paket|shipment|trackingnummer)[\w-]*"
+        r"(?:\s*(?:number|nummer|no\.?|nr\.?|id|#))?\s*[:#]?\s*[A-Z0-9][A-Z0-9-]{7,}\b",
+        re.IGNORECASE,
+    ),
+    re.compile(
+        r"\b(?:order|bestell|auftrags)(?:ung)?[\w-]*"
+        r"\s*(?:number|nummer|no\.?|nr\.?|id|#)\s*[:#]?\s*[A-Z0-9][A-Z0-9-]{3,}\b",
+        re.IGNORECASE,
+    ),
+]
+
+_CARRIER_DOMAINS = (
+    "dhl", "dpd", "ups", "hermesworld", "myhermes", "gls-group", "gls-pakete",
+    "fedex", "usps", "royalmail", "postnl", "post.at", "swisspost", "amazon",
+)
+
+_SOCIAL_DOMAINS = (
+    "facebook", "facebookmail", "instagram", "linkedin", "twitter", "x.com",
+    "tiktok", "pinterest", "reddit", "redditmail", "discord", "slack",
+    "xing", "meetup", "quora", "youtube",
+)
+
+_BULK_LOCAL_PARTS = ("newsletter", "news", "marketing", "promo", "promotions", "angebote", "deals")
+
+_POSITIVE_KEYWORDS = (
+    "order", "bestellung", "bestellt", "shipped", "versandt", "versendet",
+    "shipping", "versand", "tracking", "sendung", "lieferung", "delivery",
+    "delivered", "zugestellt", "zustellung", "package", "paket", "parcel",
+    "dispatched", "out for delivery", "invoice", "rechnung", "abholung",
+)
+
+_NEGATIVE_KEYWORDS = (
+    "newsletter", "unsubscribe", "abmelden", "abbestellen", "password reset",
+    "reset your password", "passwort zurücksetzen", "verify your email",
+    "confirm your email", "bestätige deine e-mail", "security alert",
+    "sicherheitswarnung", "new sign-in", "neue anmeldung", "liked your",
+    "commented on", "mentioned you", "followed you", "friend request",
+    "connection request", "webinar", "weekly digest", "your daily digest",
+)
+
+_ADDRESS_RE = re.compile(r"([\w.+-]+)@([\w-]+(?:\.[\w-]+)+)")
+
+
+@dataclass
+class Verdict:
+    score: int
+    decision: str
+
+
+def _domain_matches(domain: str, names: tuple[str, ...]) -> bool:
+    labels = domain.split(".")
+    for name in names:
+        if "." in name:
+            if domain == name or domain.endswith("." + name):
+                return True
+        elif name in labels:
+            return True
+    return False
+
+
+def _sender_score(sender: str) -> tuple[int, bool]:
+    """Score the sender address; the flag marks a carrier or shop domain."""
+    match = _ADDRESS_RE.search(sender.lower())
+    if not match:
+        return 0, False
+    local_part, domain = match.groups()
+    if _domain_matches(domain, _CARRIER_DOMAINS):
+        return 2, True
+    score = 0
+    if _domain_matches(domain, _SOCIAL_DOMAINS):
+        score -= 3
+    if local_part in _BULK_LOCAL_PARTS or domain.startswith(("news.", "newsletter.", "mailing.")):
+        score -= 1
+    return score, False
+
+
+def evaluate(raw_data: dict) -> Verdict:
+    """Score a queued email and decide whether it needs an analyser."""
+    subject = raw_data.get("subject") or ""
+    body = (raw_data.get("body") or "")[:MAX_BODY_CHARS]
+    sender = raw_data.get("sender") or ""
+
+    score, trusted_sender = _sender_score(sender)
+    text = f"{subject}\n{body}"
+    strong = trusted_sender or any(pattern.search(text) for pattern in _STRONG_PATTERNS)
+
+    lowered = text.lower()
+    subject_lowered = subject.lower()
+    for keyword in _POSITIVE_KEYWORDS:
+        if keyword in lowered:
+            score += 2 if keyword in subject_lowered else 1
+    for keyword in _NEGATIVE_KEYWORDS:
+        if keyword in lowered:
+            score -= 2 if keyword in subject_lowered else 1
+
+    if strong or score > REJECT_THRESHOLD:
+        return Verdict(score=score, decision=PASSED)
+    return Verdict(score=score, decision=REJECTED)
@@ -1,12 +1,18 @@
 import logging
+from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import select
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database import async_session
 from app.models.queue_item import QueueItem
+from app.models.queue_settings import QueueSettings
+from app.services.queue import prefilter
 from app.services.orders.order_matcher import DefaultOrderMatcher
 from app.services.orders.order_service import create_or_update_order
-from app.core.module_registry import get_active_analysers
+from app.core.module_base import AnalyserSkipped
+from app.core.module_registry import get_active_analysers, get_module
 from app.services.notification_service import notify_user, NotificationEvent
 
 logger = logging.getLogger(__name__)
@@ -15,20 +21,111 @@ _matcher = DefaultOrderMatcher()
 _no_analyser_warned = False
 
 
-async def _run_analysis(raw_data: dict, db, analysers: list[tuple[str, callable]]):
-    """Try each analyser in priority order, falling back to the next on failure."""
-    last_error = None
+async def reset_stuck_queue_items(session: AsyncSession, older_than_sec: int = 0) -> int:
+    """Reset queue items stuck at 'processing' back to 'queued'.
+
+    Recovers items of a worker that crashed or restarted mid-batch. Called on
+    startup and periodically with older_than_sec set, so items that another
+    node is still processing are left alone.
+    """
+    stmt = update(QueueItem).where(QueueItem.status == "processing")
+    if older_than_sec:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=older_than_sec)
+        stmt = stmt.where(QueueItem.updated_at < cutoff)
+    result = await session.execute(
+        stmt.values(status="queued", updated_at=func.now()).execution_options(synchronize_session=False)
+    )
+    count = result.rowcount
+    if count:
+        logger.info(f"Reset {count} stuck queue item(s) from 'processing' to 'queued'.")
+    return count
+
+
+async def _prefilter_enabled(db) -> bool:
+    result = await db.execute(select(QueueSettings.prefilter_enabled))
+    enabled = result.scalar_one_or_none()
+    return enabled is None or enabled
+
+
+def _batch_hooks(analysers: list[tuple[str, callable]]) -> dict[str, callable]:
+    """analyze_batch hooks of the chain's modules, unless batching is turned off.
+
+    Only used where the chain holds the module's own analyze callable.
+    """
+    if settings.analysis_batch_size <= 1:
+        return {}
+    hooks = {}
     for module_key, analyze in analysers:
+        info = get_module(module_key)
+        if info and info.analyze_batch and info.analyze is analyze:
+            hooks[module_key] = info.analyze_batch
+    return hooks
+
+
+async def _run_analysis(
+    items: dict[int, dict], db, analysers: list[tuple[str, callable]], batch_hooks: dict[str, callable],
+) -> dict[int, tuple | Exception]:
+    """Try each analyser in priority order, falling back to the next on failure.
+
+    ``items`` maps queue item ids to raw data. An analyser with a batch hook
+    gets all still-unanalysed items in one call. Returns, per item id,
+    (module_key, analysis, raw_response) of the analyser that succeeded or
+    the last error.
+    """
+    outcomes: dict[int, tuple | Exception] = {}
+    pending = dict(items)
+    for module_key, analyze in analysers:
+        if not pending:
+            break
+        batch = batch_hooks.get(module_key)
+        if batch and len(pending) > 1:
+            try:
+                results = await batch(list(pending.values()), db)
+            except Exception as e:
+                results = [e] * len(pending)
+        else:
+            results = []
+            for raw_data in pending.values():
+                try:
+                    results.append(await analyze(raw_data, db))
+                except Exception as e:
+                    results.append(e)
+
+        for item_id, result in zip(list(pending), results):
+            if isinstance(result, AnalyserSkipped):
+                logger.debug(f"Analyser {module_key} skipped: {result}")
+            elif isinstance(result, Exception):
+                logger.warning(f"Analyser {module_key} failed: {result}, trying next")
+            else:
+                analysis, raw_response = result
+                outcomes[item_id] = (module_key, analysis, raw_response)
+                del pending[item_id]
+                continue
+            outcomes[item_id] = result
+
+    for item_id in pending:
+        outcomes.setdefault(item_id, RuntimeError("No analysers available"))
+    return outcomes
+
+
+async def _learn(source_key: str, raw_data: dict, analysis, db, analysers: list[tuple[str, callable]]):
+    """Pass a result to the other active analysers that learn from results."""
+    for module_key, _ in analysers:
+        info = get_module(module_key)
+        if module_key == source_key or not info or not info.learn:
+            continue
         try:
-            return await analyze(raw_data, db)
+            await info.learn(raw_data, analysis, db)
         except Exception as e:
-            logger.warning(f"Analyser {module_key} failed: {e}, trying next")
-            last_error = e
-    raise last_error or RuntimeError("No analysers available")
+            logger.warning(f"Analyser {module_key} failed to learn from result: {e}")
 
 
 async def process_next_item() -> None:
-    """Pick one queued item and process it. Called by the scheduler every 5s."""
+    """Pick queued items and process them. Called by the scheduler every 5s.
+
+    Takes one item, or up to analysis_batch_size items when an active
+    analyser can analyse batches.
+    """
     global _no_analyser_warned
 
     analysers = await get_active_analysers()
@@ -39,91 +136,120 @@ async def process_next_item() -> None:
         return
 
     _no_analyser_warned = False
+    batch_hooks = _batch_hooks(analysers)
 
     async with async_session() as db:
-        # Pick the oldest queued item
+        # Pick the oldest queued items
         result = await db.execute(
             select(QueueItem)
             .where(QueueItem.status == "queued")
             .order_by(QueueItem.created_at.asc())
-            .limit(1)
+            .limit(settings.analysis_batch_size if batch_hooks else 1)
             .with_for_update(skip_locked=True)
         )
-        item = result.scalar_one_or_none()
-        if not item:
+        items = result.scalars().all()
+        if not items:
             return
 
-        item_id = item.id
-        item.status = "processing"
+        use_prefilter = await _prefilter_enabled(db)
+        claimed: dict[int, dict] = {}
+        for item in items:
+            # Retries are explicit user requests and always reach the analysers
+            if item.cloned_from_id is None and use_prefilter:
+                verdict = prefilter.evaluate(item.raw_data)
+                item.prefilter_score = verdict.score
+                item.prefilter_decision = verdict.decision
+                if verdict.decision == prefilter.REJECTED:
+                    item.status = "completed"
+                    logger.debug(f"Queue item {item.id} rejected by prefilter (score {verdict.score})")
+                    continue
+            item.status = "processing"
+            claimed[item.id] = item.raw_data
         await db.commit()
+        if not claimed:
+            return
 
         try:
-            analysis, raw_response = await _run_analysis(item.raw_data, db, analysers)
+            outcomes = await _run_analysis(claimed, db, analysers, batch_hooks)
+        except Exception as e:
+            outcomes = {item_id: e for item_id in claimed}
+        for item_id, outcome in outcomes.items():
+            await _complete_item(db, item_id, outcome, analysers)
 
-            item.extracted_data = raw_response
 
-            if not analysis.is_relevant:
-                item.status = "completed"
-                await db.commit()
-                return
+async def _complete_item(db, item_id: int, outcome: tuple | Exception, analysers: list[tuple[str, callable]]) -> None:
+    """Turn an analysis outcome into an order update and notification, or mark the item failed."""
+    try:
+        if isinstance(outcome, Exception):
+            raise outcome
+        source_key, analysis, raw_response = outcome
+        item = await db.get(QueueItem, item_id)
+        await _learn(source_key, item.raw_data, analysis, db, analysers)
 
-            # Find matching order
-            existing_order = await _matcher.find_match(analysis, item.user_id, db)
+        item.extracted_data = raw_response
 
-            # Create or update order
-            order = await create_or_update_order(
-                analysis=analysis,
-                user_id=item.user_id,
-                existing_order=existing_order,
-                source_type=item.source_type,
-                source_info=item.source_info,
-                db=db,
-            )
+        if not analysis.is_relevant:
+            item.status = "completed"
+            await db.commit()
+            return
+
+        # Find matching order
+        existing_order = await _matcher.find_match(analysis, item.user_id, db)
+
+        # Create or update order
+        order = await create_or_update_order(
+            analysis=analysis,
+            user_id=item.user_id,
+            existing_order=existing_order,
+            source_type=item.source_type,
+            source_info=item.source_info,
+            db=db,
+        )
 
-            item.order_id = order.id
+        item.order_id = order.id
 
-            # Determine notification event type
-            if existing_order:
-                if order.status == "delivered":
-                    notification_event = NotificationEvent.PACKAGE_DELIVERED
-                else:
-                    notification_event = NotificationEvent.TRACKING_UPDATE
+        # Determine notification event type
+        if existing_order:
+            if order.status == "delivered":
+                notification_event = NotificationEvent.PACKAGE_DELIVERED
             else:
-                notification_event = NotificationEvent.NEW_ORDER
+                notification_event = NotificationEvent.TRACKING_UPDATE
+        else:
+            notification_event = NotificationEvent.NEW_ORDER
 
-            # Send notifications (fire-and-forget, errors are logged)
-            try:
-                await notify_user(
-                    user_id=item.user_id,
-                    event_type=notification_event,
-                    event_data={
-                        "order_id": order.id,
-                        "order_number": order.order_number,
-                        "tracking_number": order.tracking_number,
-                        "vendor_name": order.vendor_name,
-                        "status": order.status,
-                        "carrier": order.carrier,
-                        "items": [i.get("name", "") for i in (order.items or [])],
-                    },
-                )
-            except Exception as e:
-                logger.error(f"Notification dispatch failed for order {order.id}: {e}")
+        # Send notifications (fire-and-forget, errors are logged)
+        try:
+            await notify_user(
+                user_id=item.user_id,
+                event_type=notification_event,
+                event_data={
+                    "order_id": order.id,
+                    "order_number": order.order_number,
+                    "tracking_number": order.tracking_number,
+                    "vendor_name": order.vendor_name,
+                    "status": order.status,
+                    "carrier": order.carrier,
+                    "items": [i.get("name", "") for i in (order.items or [])],
+                },
+            )
+        except Exception as e:
+            logger.error(f"Notification dispatch failed for order {order.id}: {e}")
 
-            item.status = "completed"
-            await db.commit()
+        item.status = "completed"
+        await db.commit()
 
-        except Exception as e:
-            logger.error(f"Failed to process queue item {item_id}: {e}")
-            try:
-                await db.rollback()
-            except Exception:
-                pass
-            try:
-                async with async_session() as err_db:
-                    err_item = await err_db.get(QueueItem, item_id)
-                    if err_item:
-                        err_item.status = "failed"
-                        err_item.error_message = str(e)
-                        await err_db.commit()
-            except Exception as inner:
-                logger.error(f"Could not mark queue item {item_id} as failed: {inner}")
+    except Exception as e:
+        logger.error(f"Failed to process queue item {item_id}: {e}")
+        try:
+            await db.rollback()
+        except Exception:
+            pass
+        try:
+            async with async_session() as err_db:
+                err_item = await err_db.get(QueueItem, item_id)
+                if err_item:
+                    err_item.status = "failed"
+                    err_item.error_message = str(e)
+                    await err_db.commit()
+        except Exception as inner:
+            logger.error(f"Could not mark queue item {item_id} as failed: {inner}")
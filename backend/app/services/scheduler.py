@@ -5,6 +5,7 @@ from apscheduler import AsyncScheduler, ScheduleLookupError
 from apscheduler.datastores.sqlalchemy import SQLAlchemyDataStore
 from apscheduler.triggers.interval import IntervalTrigger
 
+from app.config import settings
 from app.database import async_session, engine
 
 logger = logging.getLogger(__name__)
@@ -26,13 +27,16 @@ async def _run_queue_worker() -> None:
 
 
 async def _run_retention_cleanup() -> None:
-    """Wrapper that calls cleanup_queue."""
+    """Wrapper that calls cleanup_queue and requeues items of crashed workers."""
     from app.services.queue.queue_retention import cleanup_queue
+    from app.services.queue.queue_worker import reset_stuck_queue_items
 
     _job_metadata["retention_cleanup"]["last_run"] = datetime.now(timezone.utc).isoformat()
     try:
         async with async_session() as db:
             await cleanup_queue(db)
+            await reset_stuck_queue_items(db, settings.queue_processing_timeout_sec)
+            await db.commit()
         _job_metadata["retention_cleanup"]["last_status"] = "success"
     except Exception as e:
         logger.error(f"Retention cleanup job failed: {e}")
@@ -51,7 +55,7 @@ async def create_scheduler() -> AsyncScheduler:
         "last_status": None,
     }
     _job_metadata["retention_cleanup"] = {
-        "description": "Clean up old queue items",
+        "description": "Clean up old queue items and requeue items of crashed workers",
         "interval_seconds": 600,
         "last_run": None,
         "last_status": None,
@@ -41,9 +41,10 @@ async def client(db_session: AsyncSession):
 
     app.dependency_overrides[get_db] = override_get_db
     with (
-        patch("app.modules.providers.email_user.user_router.restart_watchers", new_callable=AsyncMock),
+        patch("app.modules.providers.email_user.user_router.reconcile_watchers", new_callable=AsyncMock),
         patch("app.modules.providers.email_user.user_router.restart_single_watcher", new_callable=AsyncMock),
-        patch("app.modules.providers.email_user.user_router.is_folder_scanning", return_value=False),
+        patch("app.modules.providers.email_user.router.reconcile_watchers", new_callable=AsyncMock),
+        patch("app.modules.providers.email_user.user_router.is_folder_scanning", new_callable=AsyncMock, return_value=False),
         patch("app.api.modules.enable_module", new_callable=AsyncMock),
         patch("app.api.modules.disable_module", new_callable=AsyncMock),
     ):
@@ -252,6 +252,30 @@ async def test_scan_folder_already_scanning(client, admin_token):
         assert resp.status_code == 409
 
 
+@pytest.mark.asyncio
+async def test_scan_folder_not_watched_here(client, admin_token):
+    create = await client.post("/api/v1/providers/email-user/accounts", json=ACCOUNT_DATA, headers=auth(admin_token))
+    account_id = create.json()["id"]
+    folder_resp = await client.post(
+        f"/api/v1/providers/email-user/accounts/{account_id}/folders/watched",
+        json={"folder_path": "INBOX"},
+        headers=auth(admin_token),
+    )
+    scan_url = f"/api/v1/providers/email-user/accounts/{account_id}/folders/watched/{folder_resp.json()['id']}/scan"
+
+    with patch("app.modules.providers.email_user.user_router.restart_single_watcher", return_value=False):
+        resp = await client.post(scan_url, headers=auth(admin_token))
+        assert resp.status_code == 409
+        assert "another server" in resp.json()["detail"]
+
+        await client.patch(
+            f"/api/v1/providers/email-user/accounts/{account_id}", json={"is_active": False}, headers=auth(admin_token),
+        )
+        resp = await client.post(scan_url, headers=auth(admin_token))
+        assert resp.status_code == 409
+        assert "inactive" in resp.json()["detail"]
+
+
 @pytest.mark.asyncio
 async def test_scan_unauthenticated(client):
     resp = await client.post("/api/v1/providers/email-user/accounts/1/folders/watched/1/scan")
@@ -1,4 +1,16 @@
+import importlib
+from unittest.mock import patch
+
 import pytest
+from sqlalchemy import event, select
+
+from app.models.user import User
+from app.modules.providers.email_global import service
+from app.modules.providers.email_global.models import GlobalMailConfig, UserSenderAddress
+from app.modules.providers.email_global.sender_index import SenderIndex
+
+# The package re-exports the APIRouter under the same name as the module
+user_router = importlib.import_module("app.modules.providers.email_global.user_router")
 
 
 @pytest.fixture
@@ -65,6 +77,26 @@ async def test_patch_updates_existing(client, admin_token):
     assert resp.json()["imap_host"] == "imap2.example.com"
 
 
+@pytest.mark.asyncio
+async def test_patch_keeps_filter_rules_when_omitted(client, admin_token):
+    url = "/api/v1/modules/providers/email-global/config"
+    payload = {
+        "imap_host": "imap.example.com",
+        "imap_user": "global@example.com",
+        "imap_password": "secret",
+        "filter_rules": {"sender_deny": ["newsletter@shop.example"]},
+    }
+    resp = await client.patch(url, json=payload, headers=auth(admin_token))
+    assert resp.json()["filter_rules"]["sender_deny"] == ["newsletter@shop.example"]
+
+    payload.pop("filter_rules")
+    resp = await client.patch(url, json=payload, headers=auth(admin_token))
+    assert resp.json()["filter_rules"]["sender_deny"] == ["newsletter@shop.example"]
+
+    resp = await client.patch(url, json={**payload, "filter_rules": None}, headers=auth(admin_token))
+    assert resp.json()["filter_rules"] is None
+
+
 @pytest.mark.asyncio
 async def test_non_admin_denied(client, user_token):
     resp = await client.get("/api/v1/modules/providers/email-global/config", headers=auth(user_token))
@@ -120,3 +152,69 @@ async def test_info_returns_unconfigured_when_module_disabled(client, admin_toke
     resp = await client.get("/api/v1/providers/email-global/info", headers=auth(user_token))
     assert resp.status_code == 200
     assert resp.json()["configured"] is False
+
+
+@pytest.mark.asyncio
+async def test_route_email_uses_in_memory_sender_index(client, user_token, db_session):
+    index = SenderIndex()
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with patch.object(service, "sender_index", index), patch.object(user_router, "sender_index", index):
+        resp = await client.post(
+            "/api/v1/providers/email-global/sender-addresses",
+            json={"email_address": "Me@Example.com"},
+            headers=auth(user_token),
+        )
+        assert resp.status_code == 201
+        user_id = (await db_session.execute(select(User.id).where(User.username == "user1"))).scalar_one()
+        route_email = service._build_global_callbacks().route_email
+
+        # Loaded on first use, then served from memory
+        assert await route_email("Me <me@example.com>", db_session) == (user_id, "global_mail")
+        sync_engine = db_session.bind.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", record)
+        try:
+            assert await route_email("ME@example.com", db_session) == (user_id, "global_mail")
+            assert await route_email("Shop <shop@example.com>", db_session) is None
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", record)
+        assert statements == []
+
+        # An address added through another node shows up after the next version check
+        db_session.add(UserSenderAddress(user_id=user_id, email_address="shop@example.com"))
+        await db_session.commit()
+        assert await route_email("shop@example.com", db_session) is None
+        index.invalidate()
+        assert await route_email("shop@example.com", db_session) == (user_id, "global_mail")
+
+        # Deleting through the API updates the index directly
+        addresses = await client.get("/api/v1/providers/email-global/sender-addresses", headers=auth(user_token))
+        me = next(a for a in addresses.json() if a["email_address"] == "me@example.com")
+        await client.delete(f"/api/v1/providers/email-global/sender-addresses/{me['id']}", headers=auth(user_token))
+        assert await route_email("me@example.com", db_session) is None
+
+
+@pytest.mark.asyncio
+async def test_sender_index_notices_replaced_address_from_another_node(client, user_token, db_session):
+    db_session.add(GlobalMailConfig(imap_host="imap.example.com", imap_user="inbox@example.com", imap_password_encrypted="x"))
+    await db_session.commit()
+    other_node, index = SenderIndex(), SenderIndex()
+    url = "/api/v1/providers/email-global/sender-addresses"
+
+    with patch.object(user_router, "sender_index", other_node):
+        old = (await client.post(url, json={"email_address": "old@example.com"}, headers=auth(user_token))).json()
+        await index.refresh(db_session)
+        assert index.lookup("old@example.com") is not None
+
+        # SQLite hands the freed id to the next row, so count and max id stay the same
+        await client.delete(f"{url}/{old['id']}", headers=auth(user_token))
+        new = (await client.post(url, json={"email_address": "new@example.com"}, headers=auth(user_token))).json()
+        assert new["id"] == old["id"]
+
+    index.invalidate()
+    await index.refresh(db_session)
+    assert index.lookup("old@example.com") is None
+    assert index.lookup("new@example.com") is not None
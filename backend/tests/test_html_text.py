@@ -0,0 +1,62 @@
+from email.message import EmailMessage
+
+from app.modules._shared.email.html_text import html_to_text
+from app.modules._shared.email.imap_client import parse_email
+
+
+MARKETING_HTML = """<!DOCTYPE html>
+<html><head><title>Your order</title>
+<style>td > p { color: red } .hidden { display: none }</style></head>
+<body><!-- preheader <b>ignored</b> -->
+<table width="100%"><tr><td>
+  <table><tr><td><img src="logo.png" alt="a > b"></td></tr>
+  <tr><td><p>Hello&nbsp;Max,</p>
+    <p>your order <b>ORD-123</b> has shipped &amp; is on its way.</p>
+    <a href="https://www.dhl.de/verfolgen.html?piececode=JJD000390007&amp;lang=de">Track parcel</a>
+    <a href='https://shop.example.com/unsubscribe'>Unsubscribe</a>
+  </td></tr></table>
+</td></tr>
+<tr><td><table>
+  <tr><th>Item</th><th>Qty</th><th>Price</th></tr>
+  <tr><td>USB Cable<td>2<td>12.99 EUR</tr>
+</table></td></tr></table>
+<SCRIPT>var x = "<td>not text</td>";</SCRIPT>
+Thanks<br/>Your Shop
+</body></html>"""
+
+
+def test_html_to_text_extracts_visible_text():
+    text = html_to_text(MARKETING_HTML)
+    assert "Hello Max," in text
+    assert "your order ORD-123 has shipped & is on its way." in text
+    assert "Item | Qty | Price" in text
+    assert "USB Cable | 2 | 12.99 EUR" in text
+    assert "Thanks\nYour Shop" in text
+    for hidden in ("Your order", "color", "preheader", "not text"):
+        assert hidden not in text
+
+
+def test_html_to_text_keeps_only_tracking_links():
+    text = html_to_text(MARKETING_HTML)
+    assert "Track parcel (https://www.dhl.de/verfolgen.html?piececode=JJD000390007&lang=de)" in text
+    assert "unsubscribe" not in text
+
+
+def test_html_to_text_caps_output():
+    html = "<html><body>" + "<p>Line of filler text</p>" * 10_000 + "</body></html>"
+    text = html_to_text(html, max_chars=1000)
+    assert len(text) <= 1000
+    assert text.startswith("Line of filler text")
+
+
+def test_html_to_text_tolerates_broken_markup():
+    assert html_to_text("<head><title>x</title><body>Hi <b>there</b> a < b") == "Hi there a < b"
+    assert html_to_text("before<style>unclosed { }") == "before"
+
+
+def test_parse_email_caps_plain_text_body():
+    msg = EmailMessage()
+    msg["Subject"] = "Huge"
+    msg.set_content("x" * 200_000)
+    parsed = parse_email(msg.as_bytes())
+    assert len(parsed.body) == 50_000
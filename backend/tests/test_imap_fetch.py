@@ -0,0 +1,521 @@
+"""Tests for the shared IMAP fetch logic (app.modules._shared.email.imap_watch_loop)."""
+
+import asyncio
+import threading
+from email.message import EmailMessage
+from unittest.mock import patch
+
+import pytest
+from aioimaplib import Response
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.auth import hash_password
+from app.core.encryption import encrypt_value
+from app.models.imap_settings import ImapSettings
+from app.models.order import Order
+from app.models.queue_item import QueueItem
+from app.models.user import User
+from app.modules._shared.email import imap_client, imap_watch_loop
+from app.modules._shared.email.email_fetcher import IncomingEmail, dedup_and_enqueue_batch
+from app.modules._shared.email.imap_watch_loop import (
+    ConnectThrottle,
+    PollSchedule,
+    SelectResult,
+    fetch_new_emails,
+    idle_loop,
+    jittered_backoff,
+    load_poll_schedule,
+    next_poll_interval,
+    parse_select_response,
+    poll_loop,
+)
+from app.modules._shared.email.models import ProcessedEmail
+from app.modules._shared.email.search_filter import build_search_criteria
+from app.modules.providers.email_user.models import EmailAccount, WatchedFolder
+from app.modules.providers.email_user.service import _build_callbacks
+
+
+def _make_email(uid: int) -> bytes:
+    msg = EmailMessage()
+    msg["Subject"] = f"Order {uid} shipped"
+    msg["From"] = "Shop <shop@example.com>"
+    msg["Message-ID"] = f"<msg-{uid}@example.com>"
+    msg["Date"] = "Mon, 19 Oct 2026 10:00:00 +0000"
+    msg.set_content(f"Your order ORD-{uid} is on its way.")
+    return msg.as_bytes()
+
+
+class FakeImap:
+    """Minimal stand-in for aioimaplib.IMAP4_SSL serving a fixed mailbox."""
+
+    def __init__(self, messages: dict[int, bytes], capabilities=("IMAP4REV1",), fail_on_uid=None):
+        self.messages = messages
+        self.capabilities = set(capabilities)
+        self.commands: list[tuple] = []
+        self.fail_on_uid = fail_on_uid
+
+    def has_capability(self, capability: str) -> bool:
+        return capability in self.capabilities
+
+    async def uid_search(self, criteria: str):
+        self.commands.append(("search", criteria))
+        if not criteria.isascii() and "LITERAL+" not in self.capabilities:
+            return Response("BAD", [b"Could not parse command"])
+        start = int(criteria.split()[1].split(":")[0])
+        uids = [str(u) for u in sorted(self.messages) if u >= start]
+        return Response("OK", [" ".join(uids).encode(), b"SEARCH completed"])
+
+    async def uid(self, command: str, uid_set: str, parts: str):
+        self.commands.append((command, uid_set, parts))
+        lines: list = []
+        for uid in (int(u) for u in uid_set.split(",")):
+            if uid == self.fail_on_uid and parts == "(RFC822)":
+                raise ConnectionError("connection lost")
+            raw = self.messages[uid]
+            if "HEADER.FIELDS" in parts:
+                raw = b"\r\n".join(
+                    line for line in raw.split(b"\n") if line.lower().startswith(b"message-id")
+                ) + b"\r\n\r\n"
+            lines.append(f"{uid} FETCH (UID {uid} BODY[] {{{len(raw)}}}".encode())
+            lines.append(bytearray(raw))
+            lines.append(b")")
+        lines.append(b"FETCH completed")
+        return Response("OK", lines)
+
+
+class FakeIdleImap(FakeImap):
+    """FakeImap that delivers one queued IDLE push per wait, then drops the connection."""
+
+    def __init__(self, messages, pushes, on_wait=None):
+        super().__init__(messages)
+        self.pushes = list(pushes)
+        self.on_wait = on_wait
+
+    async def idle_start(self, timeout=None):
+        return asyncio.create_task(asyncio.sleep(0))
+
+    async def wait_server_push(self):
+        if self.on_wait:
+            self.on_wait()
+        if not self.pushes:
+            raise ConnectionError("connection lost")
+        new_messages, push = self.pushes.pop(0)
+        self.messages.update(new_messages)
+        return push
+
+    def idle_done(self):
+        pass
+
+
+@pytest.fixture
+async def folder(db_session):
+    user = User(username="fetchuser", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    account = EmailAccount(
+        user_id=user.id,
+        name="Fetch Account",
+        imap_host="imap.example.com",
+        imap_port=993,
+        imap_user="user@example.com",
+        imap_password_encrypted=encrypt_value("password"),
+        use_ssl=True,
+    )
+    db_session.add(account)
+    await db_session.flush()
+    folder = WatchedFolder(
+        account_id=account.id, folder_path="INBOX", last_seen_uid=0, uidvalidity=777,
+    )
+    db_session.add(folder)
+    await db_session.commit()
+    return folder
+
+
+async def _fetch(db_session, folder, imap, selected=None):
+    callbacks = _build_callbacks(folder.account_id, folder.id)
+    ctx = await callbacks.load_fetch_context(db_session)
+    await fetch_new_emails(imap, ctx, callbacks, db_session, None, selected)
+
+
+def test_parse_select_response_reads_uidvalidity_and_modseq():
+    response = Response("OK", [
+        b"FLAGS (\\Answered \\Seen)",
+        b"OK [UIDVALIDITY 3857529045] UIDs valid",
+        b"OK [HIGHESTMODSEQ 715194045007]",
+        b"[READ-WRITE] SELECT completed",
+    ])
+    result = parse_select_response(response)
+    assert result.uidvalidity == 3857529045
+    assert result.highest_modseq == 715194045007
+
+
+def test_parse_select_response_without_condstore():
+    response = Response("OK", [b"OK [UIDVALIDITY 42] UIDs valid", b"SELECT completed"])
+    result = parse_select_response(response)
+    assert result.uidvalidity == 42
+    assert result.highest_modseq is None
+
+
+@pytest.mark.asyncio
+async def test_unchanged_modseq_skips_search(db_session, folder):
+    folder.highest_modseq = 100
+    await db_session.commit()
+    imap = FakeImap({1: _make_email(1)}, capabilities=("CONDSTORE",))
+
+    await _fetch(db_session, folder, imap, SelectResult(uidvalidity=777, highest_modseq=100))
+
+    assert imap.commands == []
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert items == []
+
+
+@pytest.mark.asyncio
+async def test_changed_modseq_fetches_and_stores_modseq(db_session, folder):
+    folder.highest_modseq = 100
+    await db_session.commit()
+    imap = FakeImap({1: _make_email(1), 2: _make_email(2)}, capabilities=("CONDSTORE",))
+
+    await _fetch(db_session, folder, imap, SelectResult(uidvalidity=777, highest_modseq=105))
+
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert len(items) == 2
+    await db_session.refresh(folder)
+    assert folder.highest_modseq == 105
+    assert folder.last_seen_uid == 2
+
+
+def test_build_search_criteria_compiles_filter_rules():
+    assert build_search_criteria(None) == ""
+    assert build_search_criteria({"sender_allow": []}) == ""
+    rules = {
+        "sender_allow": ["amazon.de", "dhl.de", "ups.com"],
+        "sender_deny": ["marketing@amazon.de"],
+        "subject_keywords": ['Order "123"'],
+        "gmail_raw": "category:updates",
+    }
+    assert build_search_criteria(rules) == (
+        'OR FROM "amazon.de" OR FROM "dhl.de" FROM "ups.com" '
+        'NOT FROM "marketing@amazon.de" '
+        'SUBJECT "Order \\"123\\""'
+    )
+    assert build_search_criteria(rules, gmail=True).endswith(' X-GM-RAW "category:updates"')
+
+
+@pytest.mark.asyncio
+async def test_filter_rules_are_added_to_uid_search(db_session, folder):
+    folder.filter_rules = {"sender_allow": ["shop@example.com"], "gmail_raw": "category:updates"}
+    await db_session.commit()
+
+    imap = FakeImap({1: _make_email(1)})
+    await _fetch(db_session, folder, imap)
+    # Without X-GM-EXT-1 the Gmail query is dropped
+    assert imap.commands[0][1].endswith(' FROM "shop@example.com"')
+
+    gmail = FakeImap({1: _make_email(1)}, capabilities=("X-GM-EXT-1",))
+    folder.last_seen_uid = 0
+    await db_session.commit()
+    await _fetch(db_session, folder, gmail)
+    assert gmail.commands[0][1].endswith('FROM "shop@example.com" X-GM-RAW "category:updates"')
+
+
+def test_build_search_criteria_sends_non_ascii_values_as_literals():
+    rules = {"sender_deny": ["news@shöp.de"], "subject_keywords": ["Bestellbestätigung", "Order"]}
+    assert build_search_criteria(rules, literals=True) == (
+        'NOT FROM {13+}\r\nnews@shöp.de OR SUBJECT {19+}\r\nBestellbestätigung SUBJECT "Order"'
+    )
+    # Without LITERAL+ the rules are widened rather than narrowed
+    assert build_search_criteria(rules) == ""
+
+
+@pytest.mark.asyncio
+async def test_non_ascii_subject_rule_searches_with_literals(db_session, folder):
+    folder.filter_rules = {"subject_keywords": ["Bestellbestätigung"]}
+    await db_session.commit()
+
+    imap = FakeImap({1: _make_email(1)}, capabilities=("LITERAL+",))
+    await _fetch(db_session, folder, imap)
+    assert imap.commands[0][1].endswith(" SUBJECT {19+}\r\nBestellbestätigung")
+    await db_session.refresh(folder)
+    assert folder.last_seen_uid == 1
+
+    # A server without LITERAL+ gets no subject rule at all
+    plain = FakeImap({2: _make_email(2)})
+    await _fetch(db_session, folder, plain)
+    assert "SUBJECT" not in plain.commands[0][1]
+
+
+@pytest.mark.asyncio
+async def test_failed_uid_search_raises(db_session, folder):
+    imap = FakeImap({1: _make_email(1)})
+
+    async def bad_search(criteria):
+        return Response("BAD", [b"Error in IMAP command UID SEARCH"])
+
+    imap.uid_search = bad_search
+    with pytest.raises(RuntimeError, match="UID SEARCH failed.*Error in IMAP command"):
+        await _fetch(db_session, folder, imap)
+
+
+@pytest.mark.asyncio
+async def test_full_rescan_skips_processed_message_ids(db_session, folder):
+    db_session.add(ProcessedEmail(
+        account_id=folder.account_id, folder_path="INBOX", email_uid=1,
+        message_id="<msg-1@example.com>",
+    ))
+    db_session.add(ProcessedEmail(
+        account_id=folder.account_id, folder_path="INBOX", email_uid=3,
+        message_id="<msg-3@example.com>",
+    ))
+    await db_session.commit()
+    imap = FakeImap({1: _make_email(1), 2: _make_email(2), 3: _make_email(3)})
+
+    await _fetch(db_session, folder, imap)
+
+    full_fetches = [c for c in imap.commands if c[0] == "fetch" and c[2] == "(RFC822)"]
+    assert [c[1] for c in full_fetches] == ["2"]
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert [i.raw_data["message_id"] for i in items] == ["<msg-2@example.com>"]
+    await db_session.refresh(folder)
+    assert folder.last_seen_uid == 3
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_commits_uid_with_enqueued_items(db_session, folder):
+    """A failure mid-scan keeps committed checkpoints and drops the uncommitted tail."""
+    imap = FakeImap({uid: _make_email(uid) for uid in range(1, 6)}, fail_on_uid=4)
+    callbacks = _build_callbacks(folder.account_id, folder.id)
+    ctx = await callbacks.load_fetch_context(db_session)
+
+    with patch("app.modules._shared.email.imap_watch_loop.CHECKPOINT_EVERY_MESSAGES", 2):
+        with pytest.raises(ConnectionError):
+            await fetch_new_emails(imap, ctx, callbacks, db_session, None)
+    await db_session.rollback()
+
+    await db_session.refresh(folder)
+    assert folder.last_seen_uid == 2
+    assert ctx.last_seen_uid == 2
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert sorted(i.raw_data["email_uid"] for i in items) == [1, 2]
+
+
+def _incoming(message_id: str, uid: int, user_id: int) -> IncomingEmail:
+    return IncomingEmail(
+        message_id=message_id, subject="Order", sender="shop@example.com", body="body",
+        email_date=None, email_uid=uid, user_id=user_id, source_info="INBOX",
+        account_id=None, folder_path="INBOX", source="global_mail",
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_dedup_uses_single_lookup(db_session, folder):
+    db_session.add(ProcessedEmail(
+        account_id=None, folder_path="INBOX", email_uid=1, message_id="<a@x>", source="global_mail",
+    ))
+    await db_session.commit()
+    user_id = (await db_session.execute(select(User.id))).scalar_one()
+
+    statements: list[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", record)
+    try:
+        enqueued = await dedup_and_enqueue_batch([
+            _incoming("<a@x>", 1, user_id),
+            _incoming("<b@x>", 2, user_id),
+            _incoming("<b@x>", 3, user_id),
+            _incoming("<c@x>", 4, user_id),
+        ], db_session)
+        await db_session.commit()
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
+
+    assert enqueued == 2
+    lookups = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    assert len(lookups) == 1
+    processed = (await db_session.execute(select(ProcessedEmail.message_id))).scalars().all()
+    assert sorted(processed) == ["<a@x>", "<b@x>", "<c@x>"]
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert sorted(i.raw_data["email_uid"] for i in items) == [2, 4]
+
+
+@pytest.mark.asyncio
+async def test_parse_email_async_runs_off_the_event_loop():
+    msg = EmailMessage()
+    msg["Subject"] = "=?utf-8?q?Bestellung_versandt?="
+    msg["From"] = "Shop <shop@example.com>"
+    msg["Date"] = "Mon, 19 Oct 2026 10:00:00 +0000"
+    msg.set_content("<html><body><p>Order <b>ORD-1</b></p></body></html>", subtype="html")
+
+    threads = []
+    original = imap_client.parse_email
+
+    def recording_parse(raw):
+        threads.append(threading.current_thread().name)
+        return original(raw)
+
+    with patch.object(imap_client, "parse_email", recording_parse):
+        parsed = await imap_client.parse_email_async(msg.as_bytes())
+
+    assert threads and threads[0].startswith("email-parse")
+    assert parsed.subject == "Bestellung versandt"
+    assert parsed.message_id == ""
+    assert parsed.email_date is not None
+    assert "ORD-1" in parsed.body
+
+
+@pytest.mark.asyncio
+async def test_idle_loop_holds_no_session_while_waiting(db_session, folder):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    open_sessions = 0
+    open_while_waiting = []
+
+    class CountingSession:
+        async def __aenter__(self):
+            nonlocal open_sessions
+            open_sessions += 1
+            self.session = factory()
+            return await self.session.__aenter__()
+
+        async def __aexit__(self, *exc):
+            nonlocal open_sessions
+            open_sessions -= 1
+            return await self.session.__aexit__(*exc)
+
+    imap = FakeIdleImap(
+        {1: _make_email(1)},
+        pushes=[({2: _make_email(2)}, [b"2 EXISTS"])],
+        on_wait=lambda: open_while_waiting.append(open_sessions),
+    )
+    callbacks = _build_callbacks(folder.account_id, folder.id)
+    ctx = await callbacks.load_fetch_context(db_session)
+    await fetch_new_emails(imap, ctx, callbacks, db_session, None)
+
+    with patch.object(imap_watch_loop, "async_session", CountingSession):
+        await idle_loop(imap, ctx, callbacks, None)
+
+    assert open_while_waiting == [0, 0]
+    assert open_sessions == 0
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert sorted(i.raw_data["email_uid"] for i in items) == [1, 2]
+    await db_session.refresh(folder)
+    assert folder.last_seen_uid == 2
+
+
+class FakePollImap(FakeImap):
+    """FakeImap whose re-SELECTs report the given UIDVALIDITY values, one per poll."""
+
+    def __init__(self, messages, polls):
+        super().__init__(messages)
+        self.polls = list(polls)
+        self.logged_out = False
+
+    async def select(self, mailbox):
+        self.commands.append(("select", mailbox))
+        new_messages, uidvalidity = self.polls.pop(0)
+        self.messages.update(new_messages)
+        return Response("OK", [f"OK [UIDVALIDITY {uidvalidity}]".encode(), b"SELECT completed"])
+
+    async def noop(self):
+        self.commands.append(("noop",))
+
+    async def logout(self):
+        self.logged_out = True
+
+
+@pytest.mark.asyncio
+async def test_poll_loop_reuses_connection_until_uidvalidity_changes(db_session, folder):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    imap = FakePollImap({1: _make_email(1)}, polls=[({2: _make_email(2)}, 777), ({}, 778)])
+    callbacks = _build_callbacks(folder.account_id, folder.id)
+    ctx = await callbacks.load_fetch_context(db_session)
+    await fetch_new_emails(imap, ctx, callbacks, db_session, None)
+
+    with patch.object(imap_watch_loop, "async_session", factory):
+        await poll_loop(imap, ctx, callbacks, 0, None, SelectResult(777, None))
+
+    assert [c[0] for c in imap.commands].count("select") == 2
+    assert imap.logged_out
+    items = (await db_session.execute(select(QueueItem))).scalars().all()
+    assert sorted(i.raw_data["email_uid"] for i in items) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_poll_keepalive_sends_noop_during_long_intervals():
+    imap = FakePollImap({}, polls=[])
+    with patch.object(imap_watch_loop, "POLL_KEEPALIVE_SEC", 0.01):
+        await imap_watch_loop._sleep_with_keepalive(imap, 0.035)
+    assert imap.commands == [("noop",)] * 3
+
+
+def test_next_poll_interval_adapts_within_bounds():
+    schedule = PollSchedule(min_interval_sec=60, max_interval_sec=1800)
+    # New mail drops straight to the minimum
+    assert next_poll_interval(1200, 300, schedule, enqueued=2, shipments_active=False) == 60
+    # Quiet folders back off exponentially up to the maximum
+    assert next_poll_interval(60, 300, schedule, enqueued=0, shipments_active=False) == 120
+    assert next_poll_interval(1200, 600, schedule, enqueued=0, shipments_active=False) == 1800
+    # ... but never beyond a few times the account's own interval
+    assert next_poll_interval(1200, 300, schedule, enqueued=0, shipments_active=False) == 1200
+    assert next_poll_interval(240, 120, schedule, enqueued=0, shipments_active=False) == 480
+    assert next_poll_interval(480, 120, schedule, enqueued=0, shipments_active=False) == 480
+    # Parcels in transit cap the backoff at half the configured interval
+    assert next_poll_interval(60, 300, schedule, enqueued=0, shipments_active=True) == 120
+    assert next_poll_interval(1200, 300, schedule, enqueued=0, shipments_active=True) == 150
+    assert next_poll_interval(60, 60, schedule, enqueued=0, shipments_active=True) == 60
+
+
+@pytest.mark.asyncio
+async def test_adaptive_polling_is_opt_in(db_session):
+    assert await load_poll_schedule(db_session) is None
+    db_session.add(ImapSettings())
+    await db_session.flush()
+    assert await load_poll_schedule(db_session) is None
+
+    imap_settings = (await db_session.execute(select(ImapSettings))).scalar_one()
+    imap_settings.adaptive_polling = True
+    await db_session.flush()
+    assert await load_poll_schedule(db_session) == PollSchedule(min_interval_sec=60, max_interval_sec=1800)
+
+
+@pytest.mark.asyncio
+async def test_has_active_shipments_reflects_orders_in_transit(db_session, folder):
+    callbacks = _build_callbacks(folder.account_id, folder.id)
+    assert await callbacks.has_active_shipments(db_session) is False
+
+    user_id = (await db_session.execute(select(User.id))).scalar_one()
+    db_session.add(Order(user_id=user_id, order_number="ORD-1", status="in_transit"))
+    await db_session.commit()
+    assert await callbacks.has_active_shipments(db_session) is True
+
+
+@pytest.mark.asyncio
+async def test_connect_throttle_spaces_simultaneous_connects():
+    throttle = ConnectThrottle(rate=50)
+    loop = asyncio.get_running_loop()
+    released: list[float] = []
+
+    async def connect():
+        await throttle.wait()
+        released.append(loop.time())
+
+    await asyncio.gather(*(connect() for _ in range(5)))
+
+    gaps = [b - a for a, b in zip(released, released[1:])]
+    assert len(released) == 5
+    assert all(gap >= 0.015 for gap in gaps)
+
+
+@pytest.mark.asyncio
+async def test_connect_throttle_disabled_with_zero_rate():
+    throttle = ConnectThrottle(rate=0)
+    await asyncio.wait_for(asyncio.gather(*(throttle.wait() for _ in range(100))), timeout=1)
+
+
+def test_jittered_backoff_stays_within_half_to_full_delay():
+    delays = {jittered_backoff(120) for _ in range(50)}
+    assert all(60 <= d <= 120 for d in delays)
+    assert len(delays) > 1
@@ -29,6 +29,9 @@ async def test_get_returns_defaults_when_no_row(client, admin_token):
     data = resp.json()
     assert data["max_email_age_days"] == 7
     assert data["check_uidvalidity"] is True
+    assert data["adaptive_polling"] is False
+    assert data["min_polling_interval_sec"] == 60
+    assert data["max_polling_interval_sec"] == 1800
 
 
 @pytest.mark.asyncio
@@ -71,6 +74,22 @@ async def test_get_after_put(client, admin_token):
     assert resp.json()["max_email_age_days"] == 60
 
 
+@pytest.mark.asyncio
+async def test_put_adaptive_polling_bounds(client, admin_token):
+    payload = {"adaptive_polling": True, "min_polling_interval_sec": 30, "max_polling_interval_sec": 600}
+    resp = await client.put("/api/v1/modules/providers/email-user/settings", json=payload, headers=auth(admin_token))
+    assert resp.status_code == 200
+    assert resp.json()["min_polling_interval_sec"] == 30
+    assert resp.json()["max_polling_interval_sec"] == 600
+
+
+@pytest.mark.asyncio
+async def test_put_rejects_inverted_polling_bounds(client, admin_token):
+    payload = {"min_polling_interval_sec": 900, "max_polling_interval_sec": 300}
+    resp = await client.put("/api/v1/modules/providers/email-user/settings", json=payload, headers=auth(admin_token))
+    assert resp.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_non_admin_denied(client, user_token):
     resp = await client.get("/api/v1/modules/providers/email-user/settings", headers=auth(user_token))
@@ -150,3 +150,91 @@ async def test_patch_config_empty_string_prompt_treated_as_default(client, admin
     data = resp.json()
     assert data["is_default"] is True
     assert data["system_prompt"] == data["default_system_prompt"]
+
+
+@pytest.mark.asyncio
+async def test_patch_config_rate_limits(client, admin_token):
+    limited = {**LLM_CONFIG, "rpm_limit": 500, "tpm_limit": 200000, "max_concurrency": 4}
+    resp = await client.patch("/api/v1/modules/analysers/llm/config", json=limited, headers=auth(admin_token))
+    assert resp.status_code == 200
+    data = resp.json()
+    assert (data["rpm_limit"], data["tpm_limit"], data["max_concurrency"]) == (500, 200000, 4)
+
+    # Omitted limits are kept, null means unlimited
+    resp = await client.patch("/api/v1/modules/analysers/llm/config", json=LLM_CONFIG, headers=auth(admin_token))
+    assert resp.json()["rpm_limit"] == 500
+    resp = await client.patch(
+        "/api/v1/modules/analysers/llm/config", json={**LLM_CONFIG, "rpm_limit": None}, headers=auth(admin_token),
+    )
+    assert resp.json()["rpm_limit"] is None
+
+    resp = await client.patch(
+        "/api/v1/modules/analysers/llm/config", json={**LLM_CONFIG, "max_concurrency": 0}, headers=auth(admin_token),
+    )
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_purge_analysis_cache(client, admin_token, user_token, db_session):
+    from datetime import datetime, timedelta, timezone
+    from app.modules.analysers.llm.models import LLMAnalysisCache
+
+    now = datetime.now(timezone.utc)
+    db_session.add(LLMAnalysisCache(
+        key="a" * 64, model="openai/gpt-4o-mini@", result={"is_relevant": False},
+        created_at=now, expires_at=now + timedelta(hours=1),
+    ))
+    await db_session.commit()
+
+    resp = await client.delete("/api/v1/modules/analysers/llm/cache", headers=auth(user_token))
+    assert resp.status_code == 403
+    resp = await client.delete("/api/v1/modules/analysers/llm/cache", headers=auth(admin_token))
+    assert resp.status_code == 200
+    assert resp.json() == {"deleted": 1}
+
+
+@pytest.mark.asyncio
+async def test_manage_additional_configs(client, admin_token):
+    await client.patch("/api/v1/modules/analysers/llm/config", json=LLM_CONFIG, headers=auth(admin_token))
+    backup = {**LLM_CONFIG, "model_name": "gpt-4o", "weight": 0}
+    resp = await client.post("/api/v1/modules/analysers/llm/configs", json=backup, headers=auth(admin_token))
+    assert resp.status_code == 201
+    backup_id = resp.json()["id"]
+    assert resp.json()["weight"] == 0
+
+    resp = await client.get("/api/v1/modules/analysers/llm/configs", headers=auth(admin_token))
+    assert [config["model_name"] for config in resp.json()] == [LLM_CONFIG["model_name"], "gpt-4o"]
+
+    # The primary config is still the first active one
+    resp = await client.get("/api/v1/modules/analysers/llm/config", headers=auth(admin_token))
+    assert resp.json()["model_name"] == LLM_CONFIG["model_name"]
+
+    resp = await client.patch(
+        f"/api/v1/modules/analysers/llm/configs/{backup_id}", json={**backup, "is_active": False}, headers=auth(admin_token),
+    )
+    assert resp.json()["is_active"] is False
+
+    resp = await client.delete(f"/api/v1/modules/analysers/llm/configs/{backup_id}", headers=auth(admin_token))
+    assert resp.status_code == 204
+    resp = await client.delete(f"/api/v1/modules/analysers/llm/configs/{backup_id}", headers=auth(admin_token))
+    assert resp.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_partial_patch_keeps_other_endpoint_fields(client, admin_token):
+    endpoint = {
+        **LLM_CONFIG, "system_prompt": "Custom prompt", "rpm_limit": 500, "tpm_limit": 200000, "max_concurrency": 4,
+    }
+    resp = await client.post("/api/v1/modules/analysers/llm/configs", json=endpoint, headers=auth(admin_token))
+    config_id = resp.json()["id"]
+
+    resp = await client.patch(
+        f"/api/v1/modules/analysers/llm/configs/{config_id}", json={"weight": 3}, headers=auth(admin_token),
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["weight"] == 3
+    assert data["system_prompt"] == "Custom prompt"
+    assert (data["rpm_limit"], data["tpm_limit"], data["max_concurrency"]) == (500, 200000, 4)
+    assert data["model_name"] == LLM_CONFIG["model_name"]
+    assert data["is_active"] is True
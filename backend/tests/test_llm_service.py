@@ -20,7 +20,9 @@ def _make_llm_response(content: str):
 
 @pytest.fixture
 async def llm_config(db_session):
-    """Insert an active LLM config into the test DB."""
+    """Insert an active LLM config into the test DB; the analysis cache writes to it too."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
     config = LLMConfig(
         provider="openai",
         model_name="gpt-4o-mini",
@@ -30,7 +32,8 @@ async def llm_config(db_session):
     )
     db_session.add(config)
     await db_session.commit()
-    return config
+    with patch("app.modules.analysers.llm.cache.async_session", async_sessionmaker(db_session.bind, expire_on_commit=False)):
+        yield config
 
 
 @pytest.mark.asyncio
@@ -210,3 +213,461 @@ async def test_analyze_uses_default_prompt_when_none(db_session, llm_config):
     system_msg = messages[0]
     assert system_msg["role"] == "system"
     assert system_msg["content"] == SYSTEM_PROMPT
+
+
+@pytest.mark.asyncio
+async def test_analyze_reuses_cached_result_for_identical_content(db_session, llm_config):
+    """The same email delivered twice (other mailbox, retry) costs one LLM call."""
+    raw = {"is_relevant": True, "order_number": "ORD-1", "status": "ordered"}
+    email = {"subject": "Your order", "sender": "shop@example.com", "body": "Order ORD-1\n\nThanks!"}
+
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.return_value = _make_llm_response(json.dumps(raw))
+
+        first, _ = await analyze({**email, "message_id": "<a@x>", "email_uid": 1}, db=db_session)
+        second, second_raw = await analyze(
+            {**email, "body": "Order ORD-1  Thanks!", "message_id": "<a@x>", "email_uid": 42},
+            db=db_session,
+        )
+        assert mock_llm.call_count == 1
+        assert second == first
+        assert second_raw == raw
+
+        # A different prompt is a different cache entry
+        llm_config.system_prompt = "Custom prompt"
+        await db_session.commit()
+        await analyze(email, db=db_session)
+        assert mock_llm.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_analysis_cache_evicts_oldest_beyond_max_entries(db_session, llm_config):
+    from sqlalchemy import select
+    from app.modules.analysers.llm import cache
+    from app.modules.analysers.llm.models import LLMAnalysisCache
+    from app.modules.analysers.llm.service import SYSTEM_PROMPT
+
+    with (
+        patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm,
+        patch.object(cache.settings, "llm_cache_max_entries", 2),
+        patch.object(cache, "EVICT_EVERY_STORES", 1),
+    ):
+        mock_llm.return_value = _make_llm_response(json.dumps({"is_relevant": False}))
+        for i in range(3):
+            await analyze({"subject": f"Mail {i}", "sender": "a@b.c", "body": "x"}, db=db_session)
+
+    keys = (await db_session.execute(select(LLMAnalysisCache.key))).scalars().all()
+    assert len(keys) == 2
+    oldest = cache.cache_key(
+        SYSTEM_PROMPT, "openai/gpt-4o-mini@", {"subject": "Mail 0", "sender": "a@b.c", "body": "x"},
+    )
+    assert oldest not in keys
+
+
+def test_compact_body_strips_history_boilerplate_and_repeats():
+    from app.modules.analysers.llm.preprocess import compact_body
+
+    order = "Vielen Dank für Ihre Bestellung 302-1234567-7654321 bei unserem Shop.\n"
+    body = (
+        order
+        + "Artikel:   Tastatur\t\t Menge: 1\n\n\n\n"
+        + "Artikel:   Maus Menge: 1\n"
+        + order
+        + "Newsletter abbestellen: https://shop.example/unsubscribe\n"
+        + "Amtsgericht München HRB 12345\n"
+        + "-- \nIhr Shop-Team\n"
+        + "Am 01.02.2026 um 10:00 schrieb Kunde <k@example.com>:\n> alte Nachricht\n"
+    )
+    assert compact_body(body) == (
+        "Vielen Dank für Ihre Bestellung 302-1234567-7654321 bei unserem Shop.\n"
+        "Artikel: Tastatur Menge: 1\n\n"
+        "Artikel: Maus Menge: 1"
+    )
+
+    # A forward with little own text keeps the quoted content
+    forwarded = "FYI\nOn Mon, 2 Feb 2026 Shop <shop@example.com> wrote:\n> Ihre Bestellung 12345 wurde versandt"
+    assert "Ihre Bestellung 12345" in compact_body(forwarded)
+
+
+@pytest.mark.asyncio
+async def test_analyze_sends_compact_body_within_token_budget(db_session, llm_config):
+    from app.modules.analysers.llm import preprocess
+
+    body = "Order ORD-1 confirmed.\n" + "\n".join(f"Line {i} of a very long legal text" for i in range(5000))
+    with (
+        patch.object(preprocess.settings, "llm_max_input_tokens", 500),
+        patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm,
+    ):
+        mock_llm.return_value = _make_llm_response(json.dumps({"is_relevant": False}))
+        await analyze({"subject": "Order", "sender": "a@b.c", "body": body, "email_date": None}, db=db_session)
+
+    user_message = mock_llm.call_args.kwargs["messages"][1]["content"]
+    sent = json.loads(user_message)
+    assert sent["body"].startswith("Order ORD-1 confirmed.")
+    assert "email_date" not in sent and "\n  " not in user_message
+    assert preprocess.count_tokens(user_message) <= 500
+    stats = preprocess.get_stats()
+    assert stats["tokens_saved"] > 0
+
+
+def _batch_answer(drop_ids=()):
+    """acompletion side effect answering every email of a batch prompt, except ``drop_ids``."""
+    async def answer(**kwargs):
+        content = kwargs["messages"][1]["content"]
+        emails = json.loads(content)
+        if isinstance(emails, dict):
+            # Single-email prompt
+            return _make_llm_response(json.dumps({"is_relevant": True, "order_number": emails["subject"]}))
+        return _make_llm_response(json.dumps([
+            {"id": entry["id"], "is_relevant": True, "order_number": entry["email"]["subject"]}
+            for entry in emails if entry["id"] not in drop_ids
+        ]))
+    return answer
+
+
+@pytest.mark.asyncio
+async def test_analyze_batch_packs_emails_and_retries_missing_singly(db_session, llm_config):
+    from app.modules.analysers.llm.service import analyze_batch
+
+    items = [{"subject": f"ORD-{i}", "sender": "shop@example.com", "body": "Thanks for your order"} for i in range(3)]
+    with patch(
+        "app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock,
+        side_effect=_batch_answer(drop_ids={2}),
+    ) as mock_llm:
+        results = await analyze_batch(items, db_session)
+
+    assert [result[0].order_number for result in results] == ["ORD-0", "ORD-1", "ORD-2"]
+    # One batch request, then the email missing from its answer on its own
+    assert mock_llm.await_count == 2
+    assert "JSON array" in mock_llm.call_args_list[0].kwargs["messages"][0]["content"]
+    assert "id" not in results[0][1]
+
+    # All three are cached now; a repeat needs no request at all
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        results = await analyze_batch(items, db_session)
+    mock_llm.assert_not_called()
+    assert [result[0].order_number for result in results] == ["ORD-0", "ORD-1", "ORD-2"]
+
+
+@pytest.mark.asyncio
+async def test_queue_worker_analyses_claimed_items_in_one_batch(db_session, llm_config):
+    from contextlib import asynccontextmanager
+    from sqlalchemy import select
+    from app.core.auth import hash_password
+    from app.models.queue_item import QueueItem
+    from app.models.user import User
+    from app.modules.analysers.llm import service
+
+    user = User(username="batchuser", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    for i in range(4):
+        db_session.add(QueueItem(
+            user_id=user.id, status="queued", source_type="email", source_info="INBOX",
+            raw_data={"subject": f"ORD-{i}", "sender": "shop@example.com", "body": "Your order is confirmed"},
+        ))
+    await db_session.commit()
+
+    @asynccontextmanager
+    async def mock_async_session():
+        yield db_session
+
+    with (
+        patch("app.services.queue.queue_worker.async_session", mock_async_session),
+        patch(
+            "app.services.queue.queue_worker.get_active_analysers", new_callable=AsyncMock,
+            return_value=[("llm", service.analyze)],
+        ),
+        patch("app.services.queue.queue_worker.settings.analysis_batch_size", 3),
+        patch(
+            "app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock,
+            side_effect=_batch_answer(),
+        ) as mock_llm,
+    ):
+        from app.services.queue.queue_worker import process_next_item
+        await process_next_item()
+
+    items = (await db_session.execute(select(QueueItem).order_by(QueueItem.id))).scalars().all()
+    assert [item.status for item in items] == ["completed", "completed", "completed", "queued"]
+    assert all(item.order_id for item in items[:3])
+    mock_llm.assert_awaited_once()
+
+
+def test_limiter_adapts_to_provider_headers():
+    from app.modules.analysers.llm.limiter import Limiter
+
+    limiter = Limiter(rpm=60)
+    limiter.update_from_headers({
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "1m30s",
+        "x-ratelimit-limit-tokens": "40000",
+        "x-ratelimit-remaining-tokens": "1000",
+    })
+    assert 85 <= limiter.get_stats()["paused_sec"] <= 90
+    assert limiter.requests.level <= 0
+    # Token limit reported by the provider applies without being configured
+    assert limiter.tokens.capacity == 40000
+    assert limiter.tokens.level <= 1000
+
+
+@pytest.mark.asyncio
+async def test_call_llm_queues_again_after_rate_limit(db_session, llm_config):
+    import httpx
+    import litellm
+    from app.modules.analysers.llm import limiter
+    from app.modules.analysers.llm.service import call_llm
+
+    limiter.reset()
+    rate_limited = litellm.RateLimitError(
+        "Rate limit reached", "openai", "gpt-4o-mini",
+        response=httpx.Response(429, headers={"retry-after-ms": "50"}, request=httpx.Request("POST", "http://llm")),
+    )
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = [rate_limited, _make_llm_response("OK")]
+        text = await call_llm(llm_config, "sk-test-key", [{"role": "user", "content": "Hi"}], max_tokens=5)
+
+    assert text == "OK"
+    assert mock_llm.call_count == 2
+    assert limiter.for_config(llm_config).get_stats()["rate_limited"] == 1
+
+
+@pytest.mark.asyncio
+async def test_call_llm_respects_concurrency_cap(db_session, llm_config):
+    import asyncio
+    from app.modules.analysers.llm import limiter
+    from app.modules.analysers.llm.service import call_llm
+
+    limiter.reset()
+    llm_config.max_concurrency = 2
+    running = 0
+    peak = 0
+
+    async def slow_completion(**kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return _make_llm_response("OK")
+
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", side_effect=slow_completion):
+        texts = await asyncio.gather(*(
+            call_llm(llm_config, None, [{"role": "user", "content": "Hi"}]) for _ in range(5)
+        ))
+
+    assert texts == ["OK"] * 5
+    assert peak == 2
+
+
+async def _add_config(db_session, model_name: str, weight: int = 1) -> LLMConfig:
+    config = LLMConfig(provider="openai", model_name=model_name, api_base_url="", is_active=True, weight=weight)
+    db_session.add(config)
+    await db_session.commit()
+    return config
+
+
+@pytest.mark.asyncio
+async def test_routing_prefers_weighted_configs_and_keeps_backups_last(db_session, llm_config):
+    from app.modules.analysers.llm import routing
+
+    routing.reset()
+    heavy = await _add_config(db_session, "gpt-4o", weight=3)
+    backup = await _add_config(db_session, "gpt-4o-backup", weight=0)
+
+    assert routing.rank([llm_config, heavy, backup]) == [heavy, llm_config, backup]
+    # A busy config yields to an idle one
+    routing._endpoint(heavy).in_flight = 3
+    assert routing.rank([llm_config, heavy, backup]) == [llm_config, heavy, backup]
+
+
+@pytest.mark.asyncio
+async def test_analyze_fails_over_to_next_config(db_session, llm_config):
+    from app.modules.analysers.llm import routing
+
+    routing.reset()
+    second = await _add_config(db_session, "gpt-4o")
+    models = []
+
+    async def completion(**kwargs):
+        models.append(kwargs["model"])
+        if kwargs["model"] == "gpt-4o-mini":
+            raise RuntimeError("Service unavailable")
+        return _make_llm_response(json.dumps({"is_relevant": False}))
+
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", side_effect=completion):
+        analysis, _ = await analyze({"subject": "Hello", "body": "first"}, db=db_session)
+        assert analysis.is_relevant is False
+        assert models == ["gpt-4o-mini", "gpt-4o"]
+
+        # The failed config sits out its cooldown
+        await analyze({"subject": "Hello", "body": "second"}, db=db_session)
+        assert models[2:] == ["gpt-4o"]
+
+    stats = {endpoint["id"]: endpoint for endpoint in routing.get_stats([llm_config, second])["endpoints"]}
+    assert stats[llm_config.id]["healthy"] is False
+    assert stats[second.id]["healthy"] is True
+
+
+@pytest.mark.asyncio
+async def test_request_error_does_not_fail_over_or_penalise_configs(db_session, llm_config):
+    import litellm
+    from app.modules.analysers.llm import routing
+
+    routing.reset()
+    second = await _add_config(db_session, "gpt-4o")
+    models = []
+
+    async def completion(**kwargs):
+        models.append(kwargs["model"])
+        raise litellm.ContextWindowExceededError(
+            message="This model's maximum context length is 128000 tokens", model=kwargs["model"], llm_provider="openai",
+        )
+
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", side_effect=completion):
+        with pytest.raises(litellm.ContextWindowExceededError):
+            await analyze({"subject": "Hello", "body": "huge"}, db=db_session)
+
+    assert len(models) == 1
+    stats = routing.get_stats([llm_config, second])["endpoints"]
+    assert all(endpoint["healthy"] for endpoint in stats)
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_takes_first_answer(db_session, llm_config):
+    import asyncio
+    from app.modules.analysers.llm import routing
+    from app.config import settings
+
+    routing.reset()
+    await _add_config(db_session, "gpt-4o", weight=0)
+    routing._endpoint(llm_config).latencies.extend([0.01] * routing.MIN_HEDGE_SAMPLES)
+
+    async def completion(**kwargs):
+        if kwargs["model"] == "gpt-4o-mini":
+            await asyncio.sleep(5)
+        return _make_llm_response(json.dumps({"is_relevant": False}))
+
+    with patch.object(settings, "llm_hedge_requests", True), \
+            patch("app.modules.analysers.llm.service.litellm.acompletion", side_effect=completion):
+        analysis, _ = await asyncio.wait_for(analyze({"subject": "Hello", "body": "slow"}, db=db_session), 2)
+
+    assert analysis.is_relevant is False
+    assert routing.get_stats([llm_config])["hedged"] == 1
+    # The slow request was cancelled, not counted as a failure
+    assert routing._endpoint(llm_config).in_flight == 0
+    assert routing._endpoint(llm_config).failures == 0
+
+
+def test_repair_json_fixes_common_defects():
+    from app.modules.analysers.llm.repair import repair_json
+
+    assert repair_json('```json\n{"is_relevant": true, "order_number": "A-1",}\n```\nLet me know if you need more.') == {
+        "is_relevant": True, "order_number": "A-1",
+    }
+    assert repair_json("Here you go: {'is_relevant': True, 'vendor_name': 'Bob\\'s Shop', 'carrier': None}") == {
+        "is_relevant": True, "vendor_name": "Bob's Shop", "carrier": None,
+    }
+    # Cut off in the middle of the second item: keep the complete one
+    assert repair_json('{"is_relevant": true, "order_number": "A-1", "items": [{"name": "Cable"}, {"name": "Mou') == {
+        "is_relevant": True, "order_number": "A-1", "items": [{"name": "Cable"}],
+    }
+    # A value that was cut off is dropped rather than completed
+    assert repair_json('{"is_relevant": true, "order_number": "12') == {"is_relevant": True}
+    with pytest.raises(ValueError):
+        repair_json("Not valid JSON {{{")
+
+
+@pytest.mark.asyncio
+async def test_analyze_repairs_answer_locally_before_asking_again(db_session, llm_config):
+    answers = [
+        # Truncated before the order number: unusable, so the model is asked again
+        '{"is_relevant": true, "vendor_name": "Shop", "order_num',
+        "Sure!\n```json\n{'is_relevant': True, 'order_number': 'ORD-7', 'total_amount': 'a lot',}\n```",
+    ]
+
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = [_make_llm_response(answer) for answer in answers]
+        analysis, raw_resp = await analyze({"subject": "Order ORD-7", "body": "Thanks for your order"}, db=db_session)
+
+    assert mock_llm.call_count == 2
+    assert analysis.order_number == "ORD-7"
+    # The mistyped optional field is dropped instead of failing the answer
+    assert analysis.total_amount is None
+    assert "total_amount" not in raw_resp
+    response_format = mock_llm.call_args.kwargs["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert "is_relevant" in response_format["json_schema"]["schema"]["properties"]
+
+
+def _make_llm_stream(pieces: list[str], consumed: list[str]):
+    """Mock LiteLLM stream yielding ``pieces`` as content deltas, recording what was read."""
+    import litellm
+    from types import SimpleNamespace
+
+    def chunks():
+        for piece in pieces:
+            consumed.append(piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece, tool_calls=None))])
+
+    stream = MagicMock(spec=litellm.CustomStreamWrapper)
+    stream.__aiter__.return_value = chunks()
+    stream.completion_stream = MagicMock()
+    stream.completion_stream.aclose = AsyncMock()
+    stream._hidden_params = {}
+    return stream
+
+
+@pytest.mark.asyncio
+async def test_analyze_stops_stream_once_email_is_irrelevant(db_session, llm_config):
+    consumed = []
+    stream = _make_llm_stream(
+        ['{"is_', 'relevant": fal', 'se, "document_type": null', ', "order_number": null', "}"], consumed,
+    )
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.return_value = stream
+        analysis, raw_resp = await analyze({"subject": "Our spring sale", "body": "Up to 50% off"}, db=db_session)
+
+    assert mock_llm.call_args.kwargs["stream"] is True
+    assert analysis.is_relevant is False
+    assert raw_resp == {"is_relevant": False}
+    # Stopped after the verdict, and the connection was closed
+    assert len(consumed) == 3
+    stream.completion_stream.aclose.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_analyze_assembles_streamed_relevant_result(db_session, llm_config):
+    consumed = []
+    pieces = ['{"is_relevant": ', "true, ", '"order_number": "ORD', '-42", "status": "ordered"}']
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.return_value = _make_llm_stream(pieces, consumed)
+        analysis, _ = await analyze({"subject": "Order ORD-42", "body": "Thanks for your order"}, db=db_session)
+
+    assert consumed == pieces
+    assert analysis.order_number == "ORD-42"
+    assert analysis.status == "ordered"
+
+
+@pytest.mark.asyncio
+async def test_structured_output_fallback_only_for_response_format_errors(db_session, llm_config):
+    import litellm
+    from app.modules.analysers.llm import routing
+
+    routing.reset()
+    rejected = litellm.BadRequestError("Invalid parameter: 'response_format' of type 'json_schema'", "gpt-4o-mini", "openai")
+    answer = _make_llm_response(json.dumps({"is_relevant": False}))
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = [rejected, answer, answer]
+        await analyze({"subject": "Hello", "body": "first"}, db=db_session)
+        assert "response_format" in mock_llm.call_args_list[0].kwargs
+        assert "response_format" not in mock_llm.call_args_list[1].kwargs
+        # The fallback applied to that call only
+        await analyze({"subject": "Hello", "body": "second"}, db=db_session)
+        assert "response_format" in mock_llm.call_args_list[2].kwargs
+
+    too_long = litellm.ContextWindowExceededError("This model's maximum context length is 128000 tokens", "gpt-4o-mini", "openai")
+    with patch("app.modules.analysers.llm.service.litellm.acompletion", new_callable=AsyncMock) as mock_llm:
+        mock_llm.side_effect = too_long
+        with pytest.raises(litellm.ContextWindowExceededError):
+            await analyze({"subject": "Hello", "body": "third"}, db=db_session)
+        assert mock_llm.call_count == 1
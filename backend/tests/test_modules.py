@@ -90,7 +90,7 @@ async def test_update_unknown_module(client, admin_token):
 @pytest.mark.asyncio
 async def test_reorder_module_priority(client, admin_token):
     """PATCH /modules/priority should update priority values."""
-    desired_order = ["email-global", "llm", "email-user", "notify-email", "notify-webhook"]
+    desired_order = ["email-global", "rules", "templates", "llm", "email-user", "notify-email", "notify-webhook"]
     resp = await client.patch(
         "/api/v1/modules/priority",
         json={"module_keys": desired_order},
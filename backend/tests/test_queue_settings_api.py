@@ -42,6 +42,7 @@ async def test_get_queue_settings(client, admin_token):
     # Default values
     assert data["max_age_days"] == 7
     assert data["max_per_user"] == 5000
+    assert data["prefilter_enabled"] is True
 
 
 @pytest.mark.asyncio
@@ -214,3 +215,23 @@ async def test_update_queue_settings_missing_fields(client, admin_token):
         headers=auth(admin_token),
     )
     assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_update_queue_settings_prefilter_toggle(client, admin_token):
+    """The prefilter can be switched off and keeps its value when omitted."""
+    resp = await client.patch(
+        "/api/v1/settings/queue/",
+        json={"max_age_days": 7, "max_per_user": 5000, "prefilter_enabled": False},
+        headers=auth(admin_token),
+    )
+    assert resp.status_code == 200
+    assert resp.json()["prefilter_enabled"] is False
+
+    resp = await client.patch(
+        "/api/v1/settings/queue/",
+        json={"max_age_days": 14, "max_per_user": 5000},
+        headers=auth(admin_token),
+    )
+    assert resp.status_code == 200
+    assert resp.json()["prefilter_enabled"] is False
@@ -66,3 +66,22 @@ async def test_reset_returns_zero_when_nothing_stuck(db_session):
     """Returns 0 when no items are stuck."""
     count = await reset_stuck_queue_items(db_session)
     assert count == 0
+
+
+async def test_reset_with_timeout_leaves_items_in_progress(db_session, test_user):
+    """With a timeout, only items claimed longer ago are requeued (another node may own the rest)."""
+    from datetime import datetime, timedelta, timezone
+
+    stale = _make_queue_item(test_user.id, status="processing")
+    fresh = _make_queue_item(test_user.id, status="processing")
+    db_session.add_all([stale, fresh])
+    await db_session.commit()
+    stale.updated_at = datetime.now(timezone.utc) - timedelta(hours=1)
+    await db_session.commit()
+
+    count = await reset_stuck_queue_items(db_session, older_than_sec=900)
+
+    assert count == 1
+    await db_session.refresh(stale)
+    await db_session.refresh(fresh)
+    assert (stale.status, fresh.status) == ("queued", "processing")
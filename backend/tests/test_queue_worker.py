@@ -339,6 +339,103 @@ async def test_process_irrelevant_item(db_session, test_user):
     assert result.scalars().all() == []
 
 
+NEWSLETTER = {
+    "subject": "Our spring newsletter",
+    "sender": "Shop <newsletter@shop.example>",
+    "body": "New arrivals and deals. Unsubscribe here.",
+}
+
+
+def test_prefilter_rejects_noise_but_keeps_order_signals():
+    from app.services.queue import prefilter
+
+    assert prefilter.evaluate(NEWSLETTER).decision == prefilter.REJECTED
+    assert prefilter.evaluate({
+        "subject": "Reset your password",
+        "sender": "no-reply@accounts.example.com",
+        "body": "Use this link for your password reset.",
+    }).decision == prefilter.REJECTED
+    assert prefilter.evaluate({
+        "subject": "Anna liked your photo",
+        "sender": "notification@facebookmail.com",
+        "body": "See what Anna liked.",
+    }).decision == prefilter.REJECTED
+
+    # A tracking number, order number or carrier sender always passes
+    assert prefilter.evaluate({**NEWSLETTER, "body": "Unsubscribe. Tracking: 1Z999AA10123456784"}).decision == prefilter.PASSED
+    assert prefilter.evaluate({**NEWSLETTER, "body": "Unsubscribe. Order no. 302-1234567-7654321"}).decision == prefilter.PASSED
+    assert prefilter.evaluate({**NEWSLETTER, "sender": "newsletter@dhl.de"}).decision == prefilter.PASSED
+    # Unknown mail without signals either way is left to the analysers
+    assert prefilter.evaluate({"subject": "Hi", "sender": "friend@example.com", "body": "Lunch?"}).decision == prefilter.PASSED
+
+
+@pytest.mark.asyncio
+async def test_prefilter_completes_noise_without_analyser(db_session, test_user):
+    """Items the prefilter rejects are completed without calling an analyser."""
+    rejected = _make_queue_item(test_user.id, raw_data=NEWSLETTER)
+    db_session.add(rejected)
+    await db_session.commit()
+
+    @asynccontextmanager
+    async def mock_async_session():
+        yield db_session
+
+    mock_analyze = AsyncMock(return_value=(AnalysisResult(is_relevant=False), {"is_relevant": False}))
+
+    with (
+        patch("app.services.queue.queue_worker.async_session", mock_async_session),
+        patch("app.services.queue.queue_worker.get_active_analysers", new_callable=AsyncMock, return_value=[("llm", mock_analyze)]),
+    ):
+        from app.services.queue.queue_worker import process_next_item
+        await process_next_item()
+
+        await db_session.refresh(rejected)
+        assert rejected.status == "completed"
+        assert rejected.prefilter_decision == "rejected"
+        assert rejected.prefilter_score <= -3
+        assert rejected.extracted_data is None
+        mock_analyze.assert_not_called()
+
+        # A retry of the same email bypasses the prefilter
+        retry = _make_queue_item(test_user.id, raw_data=NEWSLETTER, cloned_from_id=rejected.id)
+        db_session.add(retry)
+        await db_session.commit()
+        await process_next_item()
+
+    await db_session.refresh(retry)
+    assert retry.status == "completed"
+    assert retry.prefilter_decision is None
+    mock_analyze.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_prefilter_can_be_disabled(db_session, test_user):
+    from app.models.queue_settings import QueueSettings
+
+    db_session.add(QueueSettings(id=1, max_age_days=7, max_per_user=5000, prefilter_enabled=False))
+    item = _make_queue_item(test_user.id, raw_data=NEWSLETTER)
+    db_session.add(item)
+    await db_session.commit()
+
+    @asynccontextmanager
+    async def mock_async_session():
+        yield db_session
+
+    mock_analyze = AsyncMock(return_value=(AnalysisResult(is_relevant=False), {"is_relevant": False}))
+
+    with (
+        patch("app.services.queue.queue_worker.async_session", mock_async_session),
+        patch("app.services.queue.queue_worker.get_active_analysers", new_callable=AsyncMock, return_value=[("llm", mock_analyze)]),
+    ):
+        from app.services.queue.queue_worker import process_next_item
+        await process_next_item()
+
+    await db_session.refresh(item)
+    assert item.status == "completed"
+    assert item.prefilter_decision is None
+    mock_analyze.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_process_updates_existing_order(db_session, test_user):
     """QueueItem that matches existing order should update tracking info."""
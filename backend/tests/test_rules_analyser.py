@@ -0,0 +1,131 @@
+"""Tests for the rule-based analyser module (app.modules.analysers.rules)."""
+
+import logging
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core.auth import hash_password
+from app.core.module_base import AnalyserSkipped
+from app.models.queue_item import QueueItem
+from app.models.user import User
+from app.modules.analysers.rules import service
+from app.schemas.analysis import AnalysisResult
+
+
+@pytest.mark.parametrize("raw_data, expected", [
+    (
+        {
+            "subject": "Ihre Sendung wird heute zugestellt",
+            "sender": "DHL Paket <noreply@dhl.de>",
+            "body": "Sendungsnummer: 00340434161234567890",
+        },
+        {"carrier": "DHL", "tracking_number": "00340434161234567890", "status": "out_for_delivery"},
+    ),
+    (
+        {
+            "subject": "UPS Update: Delivered",
+            "sender": "UPS <mcinfo@ups.com>",
+            "body": "Tracking Number: 1Z999AA10123456784",
+        },
+        {"carrier": "UPS", "tracking_number": "1Z999AA10123456784", "status": "delivered",
+         "document_type": "delivery_confirmation"},
+    ),
+    (
+        {
+            "subject": "Ihr Hermes Paket ist unterwegs",
+            "sender": "noreply@myhermes.de",
+            "body": "Sendungsnummer H1000123456789012345",
+        },
+        {"carrier": "Hermes", "tracking_number": "H1000123456789012345", "status": "in_transit"},
+    ),
+    (
+        {
+            "subject": "Bestellbestätigung",
+            "sender": "Amazon.de <bestellbestaetigung@amazon.de>",
+            "body": "Bestellnummer 302-1234567-7654321\nZwischensumme: EUR 10,00\nGesamtbetrag: EUR 1.234,56",
+            "email_date": "2026-01-05T10:00:00+00:00",
+        },
+        {"vendor_name": "Amazon", "vendor_domain": "amazon.de", "order_number": "302-1234567-7654321",
+         "status": "ordered", "document_type": "order_confirmation", "order_date": "2026-01-05",
+         "total_amount": 1234.56, "currency": "EUR"},
+    ),
+    (
+        {
+            "subject": "Your item has shipped",
+            "sender": "ebay@ebay.co.uk",
+            "body": "Order number: 12-34567-89012\nOrder total: £19.99\nSent with UPS, tracking 1Z999AA10123456784",
+        },
+        {"vendor_name": "eBay", "vendor_domain": "ebay.co.uk", "order_number": "12-34567-89012",
+         "status": "shipped", "total_amount": 19.99, "currency": "GBP",
+         "carrier": "UPS", "tracking_number": "1Z999AA10123456784"},
+    ),
+    (
+        {
+            "subject": "Dein Paket ist unterwegs",
+            "sender": "Amazon.de <versandbestaetigung@mail.amazon.de>",
+            "body": "Bestellnummer 302-1234567-7654321\nZusteller: DHL\nSendungsnummer: 00340434161234567890",
+        },
+        {"vendor_name": "Amazon", "vendor_domain": "amazon.de", "order_number": "302-1234567-7654321",
+         "status": "in_transit", "carrier": "DHL", "tracking_number": "00340434161234567890"},
+    ),
+])
+def test_recognizes_known_formats(raw_data, expected):
+    result = service.recognize(raw_data)
+    assert result is not None and result.is_relevant
+    assert result.model_dump(include=set(expected)) == expected
+
+
+@pytest.mark.parametrize("raw_data", [
+    # Unknown sender
+    {"subject": "Your order has shipped", "sender": "shop@example.com", "body": "Tracking: 1Z999AA10123456784"},
+    # Known sender without an identifier (marketing)
+    {"subject": "Angebote der Woche", "sender": "store-news@amazon.de", "body": "Jetzt bestellt und gespart"},
+    # Known sender and identifier but no recognizable status
+    {"subject": "Ihre Meinung zählt", "sender": "noreply@dhl.de", "body": "Sendungsnummer: 00340434161234567890"},
+    # Look-alike domains of known senders
+    {"subject": "Bestellbestätigung", "sender": "order@amazon.de.evil.example", "body": "Bestellnummer 302-1234567-7654321"},
+    {"subject": "Ihre Sendung wurde zugestellt", "sender": "noreply@dhl.example", "body": "Sendungsnummer: 00340434161234567890"},
+    # Marketplace shipping notice without a carrier tracking number
+    {"subject": "Your item has shipped", "sender": "ebay@ebay.com", "body": "Order number: 12-34567-89012"},
+])
+@pytest.mark.asyncio
+async def test_unrecognized_emails_are_skipped(raw_data):
+    with pytest.raises(AnalyserSkipped):
+        await service.analyze(raw_data, None)
+
+
+@pytest.mark.asyncio
+async def test_queue_falls_back_to_next_analyser_quietly(db_session, caplog):
+    user = User(username="rulesuser", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    item = QueueItem(
+        user_id=user.id, status="queued", source_type="email", source_info="INBOX",
+        raw_data={"subject": "Your order", "sender": "shop@example.com", "body": "Order ORD-1 confirmed"},
+    )
+    db_session.add(item)
+    await db_session.commit()
+
+    @asynccontextmanager
+    async def mock_async_session():
+        yield db_session
+
+    llm_analyze = AsyncMock(return_value=(AnalysisResult(is_relevant=False), {"is_relevant": False}))
+
+    with (
+        caplog.at_level(logging.WARNING),
+        patch("app.services.queue.queue_worker.async_session", mock_async_session),
+        patch(
+            "app.services.queue.queue_worker.get_active_analysers", new_callable=AsyncMock,
+            return_value=[("rules", service.analyze), ("llm", llm_analyze)],
+        ),
+    ):
+        from app.services.queue.queue_worker import process_next_item
+        await process_next_item()
+
+    await db_session.refresh(item)
+    assert item.status == "completed"
+    llm_analyze.assert_awaited_once()
+    assert "rules" not in caplog.text
@@ -1,6 +1,5 @@
-import asyncio
 from datetime import datetime, timedelta, timezone
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from sqlalchemy import select
@@ -9,6 +8,7 @@ from app.modules.providers.email_user.models import EmailAccount, WatchedFolder
 from app.models.user import User
 from app.models.module_config import ModuleConfig
 from app.core.auth import hash_password
+from app.modules._shared.email import cluster
 from app.modules._shared.email.imap_watcher import WorkerState, WorkerMode
 
 
@@ -141,43 +141,60 @@ async def test_status_modules_have_metadata(client, admin_token):
         assert "status" in mod
 
 
-@pytest.mark.asyncio
-async def test_status_email_user_with_folders(client, admin_token, db_session):
-    """The email-user module status should include user/account/folder hierarchy."""
-    user, account, folder = await _seed_user_account_folder(db_session)
+async def _publish_folder_states(db_session, states: dict[int, WorkerState], node_id="other-node"):
+    """Publish watcher states as if another node were running these folders."""
+    member = cluster._PoolMember(
+        AsyncMock(), AsyncMock(), lambda: {f"folder:{fid}": st for fid, st in states.items()},
+    )
+    with (
+        patch.dict(cluster._pools, {"email-user": member}),
+        patch.object(cluster, "NODE_ID", node_id),
+    ):
+        await cluster.publish_states(db_session)
+        await db_session.commit()
 
-    # Enable the email-user module so the status hook is invoked
-    await _enable_module(db_session, "email-user")
 
-    mock_task = MagicMock(spec=asyncio.Task)
-    mock_task.done.return_value = False
+async def _seed_folder_states(db_session):
+    """Seed three folders: one processing, one polling with an error, one stopped."""
+    user, account, inbox = await _seed_user_account_folder(db_session)
+    orders = WatchedFolder(account_id=account.id, folder_path="Orders", last_seen_uid=0)
+    archive = WatchedFolder(account_id=account.id, folder_path="Archive", last_seen_uid=0)
+    db_session.add_all([orders, archive])
+    await db_session.commit()
 
     now = datetime.now(timezone.utc)
-    state = WorkerState(
-        folder_id=folder.id,
-        account_id=account.id,
-        mode=WorkerMode.PROCESSING,
-        last_scan_at=now - timedelta(minutes=1),
-        next_scan_at=now + timedelta(minutes=1),
-        last_activity_at=now,
-        queue_total=5,
-        queue_position=2,
-        current_email_subject="Your order shipped",
-        current_email_sender="shop@example.com",
-        error=None,
-    )
-
-    with (
-        patch(
-            "app.modules.providers.email_user.service._running_tasks",
-            {folder.id: mock_task},
+    await _publish_folder_states(db_session, {
+        inbox.id: WorkerState(
+            folder_id=inbox.id,
+            account_id=account.id,
+            mode=WorkerMode.PROCESSING,
+            last_scan_at=now - timedelta(minutes=1),
+            next_scan_at=now + timedelta(minutes=1),
+            last_activity_at=now,
+            queue_total=5,
+            queue_position=2,
+            current_email_subject="Your order shipped",
+            current_email_sender="shop@example.com",
         ),
-        patch(
-            "app.modules.providers.email_user.service._worker_state",
-            {folder.id: state},
+        orders.id: WorkerState(
+            folder_id=orders.id,
+            account_id=account.id,
+            mode=WorkerMode.POLLING,
+            error="Login failed",
         ),
-    ):
-        resp = await client.get("/api/v1/system/status", headers=auth(admin_token))
+    })
+    return user, account, inbox, orders, archive
+
+
+@pytest.mark.asyncio
+async def test_status_email_user_counters(client, admin_token, db_session):
+    """The email-user module status should only carry aggregated counters."""
+    await _seed_folder_states(db_session)
+
+    # Enable the email-user module so the status hook is invoked
+    await _enable_module(db_session, "email-user")
+
+    resp = await client.get("/api/v1/system/status", headers=auth(admin_token))
 
     assert resp.status_code == 200
     data = resp.json()
@@ -185,31 +202,57 @@ async def test_status_email_user_with_folders(client, admin_token, db_session):
     # Find email-user module
     email_user_mod = next((m for m in data["modules"] if m["key"] == "email-user"), None)
     assert email_user_mod is not None
-    assert email_user_mod["status"] is not None
-
-    status = email_user_mod["status"]
-    assert status["total_folders"] == 1
-    assert status["running"] == 1
-    assert status["errors"] == 0
-
-    assert len(status["users"]) >= 1
-    u = next(u for u in status["users"] if u["user_id"] == user.id)
-    assert u["username"] == user.username
-
-    assert len(u["accounts"]) == 1
-    a = u["accounts"][0]
-    assert a["account_id"] == account.id
-    assert a["account_name"] == account.name
-
-    assert len(a["folders"]) == 1
-    f = a["folders"][0]
-    assert f["folder_id"] == folder.id
-    assert f["folder_path"] == "INBOX"
-    assert f["running"] is True
-    assert f["mode"] == "processing"
-    assert f["queue_total"] == 5
-    assert f["queue_position"] == 2
-    assert f["current_email_subject"] == "Your order shipped"
+    assert email_user_mod["status"] == {
+        "total_folders": 3,
+        "running": 2,
+        "errors": 1,
+        "modes": {"processing": 1, "polling": 1},
+    }
+
+
+@pytest.mark.asyncio
+async def test_folder_status_is_paginated_and_filterable(client, admin_token, db_session):
+    """Per-folder watcher state is served page by page from the email-user admin router."""
+    user, account, inbox, orders, archive = await _seed_folder_states(db_session)
+    url = "/api/v1/modules/providers/email-user/status/folders"
+
+    resp = await client.get(url, params={"per_page": 2}, headers=auth(admin_token))
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total"] == 3
+    assert [f["folder_path"] for f in data["items"]] == ["Archive", "INBOX"]
+    archive_out, inbox_out = data["items"]
+    assert archive_out["running"] is False
+    assert archive_out["mode"] == "stopped"
+    assert inbox_out["folder_id"] == inbox.id
+    assert inbox_out["username"] == user.username
+    assert inbox_out["account_name"] == account.name
+    assert inbox_out["running"] is True
+    assert inbox_out["mode"] == "processing"
+    assert inbox_out["node_id"] == "other-node"
+    assert inbox_out["queue_total"] == 5
+    assert inbox_out["queue_position"] == 2
+    assert inbox_out["current_email_subject"] == "Your order shipped"
+
+    resp = await client.get(url, params={"per_page": 2, "page": 2}, headers=auth(admin_token))
+    assert [f["folder_path"] for f in resp.json()["items"]] == ["Orders"]
+
+    for state, expected in [
+        ("error", ["Orders"]),
+        ("processing", ["INBOX"]),
+        ("running", ["INBOX", "Orders"]),
+        ("stopped", ["Archive"]),
+    ]:
+        resp = await client.get(url, params={"state": state}, headers=auth(admin_token))
+        assert [f["folder_path"] for f in resp.json()["items"]] == expected, state
+        assert resp.json()["total"] == len(expected)
+
+    resp = await client.get(url, params={"search": "ord"}, headers=auth(admin_token))
+    assert [f["folder_path"] for f in resp.json()["items"]] == ["Orders"]
+    assert resp.json()["items"][0]["error"] == "Login failed"
+
+    resp = await client.get(url, params={"state": "bogus"}, headers=auth(admin_token))
+    assert resp.status_code == 422
 
 
 @pytest.mark.asyncio
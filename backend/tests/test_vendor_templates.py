@@ -0,0 +1,150 @@
+"""Tests for learned vendor templates (app.modules.analysers.templates)."""
+
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.core.auth import hash_password
+from app.core.module_base import AnalyserSkipped
+from app.models.queue_item import QueueItem
+from app.models.user import User
+from app.modules.analysers.templates import extraction, service
+from app.modules.analysers.templates.models import VendorTemplate
+from app.schemas.analysis import AnalysisResult
+
+
+def _email(order_number: str, total: str, customer: str = "Max") -> dict:
+    return {
+        "subject": f"Deine Bestellung {order_number}",
+        "sender": "Shop <bestellung@shop.example>",
+        "body": (
+            f"Hallo {customer},\n"
+            "vielen Dank für deine Bestellung.\n"
+            f"Bestellnummer: {order_number}\n"
+            "Artikel: Tastatur\n"
+            f"Gesamtbetrag: {total} €\n"
+            "Zahlungsart: PayPal\n"
+        ),
+    }
+
+
+def _analysis(order_number: str, total: float) -> AnalysisResult:
+    return AnalysisResult(
+        is_relevant=True,
+        document_type="order_confirmation",
+        order_number=order_number,
+        vendor_name="Shop",
+        vendor_domain="shop.example",
+        status="ordered",
+        total_amount=total,
+        currency="EUR",
+        items=[{"name": "Tastatur", "quantity": 1}],
+    )
+
+
+def test_fingerprint_ignores_values_but_not_layout():
+    a = extraction.fingerprint(_email("SH-1001", "19,99"))
+    b = extraction.fingerprint(_email("SH-2002", "1.234,50", customer="Erika"))
+    assert a == b and a[0] == "shop.example"
+    other = {**_email("SH-1001", "19,99"), "body": "Sendung: 123\nStatus: unterwegs\n"}
+    assert extraction.fingerprint(other) != a
+    assert extraction.fingerprint({"sender": "a@shop.example", "body": "No labels here"}) is None
+
+
+@pytest.mark.asyncio
+async def test_template_is_learned_after_consistent_results(db_session):
+    samples = [("SH-1001", "19,99", 19.99), ("SH-1002", "5,00", 5.0), ("SH-1003", "1.234,50", 1234.5)]
+    for i, (number, text, total) in enumerate(samples):
+        with pytest.raises(AnalyserSkipped):
+            await service.analyze(_email(number, text), db_session)
+        await service.learn(_email(number, text), _analysis(number, total), db_session)
+        await db_session.commit()
+
+    result, raw = await service.analyze(_email("SH-2000", "42,00", customer="Erika"), db_session)
+    assert result.model_dump(exclude_none=True) == {
+        "is_relevant": True,
+        "document_type": "order_confirmation",
+        "order_number": "SH-2000",
+        "vendor_name": "Shop",
+        "vendor_domain": "shop.example",
+        "status": "ordered",
+        "total_amount": 42.0,
+        "currency": "EUR",
+    }
+    assert raw["order_number"] == "SH-2000"
+
+    # Same layout but the anchored value is gone: fall back and count the miss
+    broken = _email("SH-2001", "42,00")
+    broken["body"] = broken["body"].replace("Bestellnummer: SH-2001", "Bestellnummer: folgt")
+    broken["subject"] = "Deine Bestellung"
+    with pytest.raises(AnalyserSkipped):
+        await service.analyze(broken, db_session)
+
+    template = (await db_session.execute(select(VendorTemplate))).scalar_one()
+    assert (template.hits, template.misses) == (1, 1)
+    assert await service.get_status(db_session) == {"active": 1, "learning": 0, "hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_hits_are_not_lost(db_session):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    for number, text, total in [("SH-1001", "19,99", 19.99), ("SH-1002", "5,00", 5.0), ("SH-1003", "1.234,50", 1234.5)]:
+        await service.learn(_email(number, text), _analysis(number, total), db_session)
+    await db_session.commit()
+
+    # Both workers loaded the template before either counted its hit (held so it stays in their sessions)
+    sessions = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    async with sessions() as first, sessions() as second:
+        loaded = [(await worker.execute(select(VendorTemplate))).scalar_one() for worker in (first, second)]
+        for worker, number in ((first, "SH-4001"), (second, "SH-4002")):
+            await service.analyze(_email(number, "9,99"), worker)
+            await worker.commit()
+        assert len(loaded) == 2
+
+    template = (await db_session.execute(select(VendorTemplate).execution_options(populate_existing=True))).scalar_one()
+    assert template.hits == 2
+
+
+@pytest.mark.asyncio
+async def test_queue_worker_teaches_templates_from_llm_results(db_session):
+    user = User(username="tpluser", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    numbers = [f"SH-{3000 + i}" for i in range(extraction.MIN_SAMPLES + 1)]
+    for number in numbers:
+        db_session.add(QueueItem(
+            user_id=user.id, status="queued", source_type="email", source_info="INBOX",
+            raw_data=_email(number, "19,99"),
+        ))
+    await db_session.commit()
+
+    @asynccontextmanager
+    async def mock_async_session():
+        yield db_session
+
+    async def llm_analyze(raw_data, db):
+        number = raw_data["subject"].rsplit(" ", 1)[1]
+        analysis = _analysis(number, 19.99)
+        return analysis, analysis.model_dump()
+
+    llm = AsyncMock(side_effect=llm_analyze)
+
+    with (
+        patch("app.services.queue.queue_worker.async_session", mock_async_session),
+        patch(
+            "app.services.queue.queue_worker.get_active_analysers", new_callable=AsyncMock,
+            return_value=[("templates", service.analyze), ("llm", llm)],
+        ),
+    ):
+        from app.services.queue.queue_worker import process_next_item
+        for _ in numbers:
+            await process_next_item()
+
+    # The LLM taught the template; the last email no longer needed it
+    assert llm.await_count == extraction.MIN_SAMPLES
+    items = (await db_session.execute(select(QueueItem).order_by(QueueItem.id))).scalars().all()
+    assert all(item.status == "completed" and item.order_id for item in items)
+    assert items[-1].extracted_data["order_number"] == numbers[-1]
@@ -50,3 +50,26 @@ async def test_watched_folder_response_includes_overrides(client, admin_token):
     data = resp.json()
     assert len(data) == 1
     assert data[0]["max_email_age_days"] is None
+
+
+@pytest.mark.asyncio
+async def test_patch_watched_folder_filter_rules(client, admin_token):
+    account_id, folder_id = await create_account_and_folder(client, admin_token)
+    url = f"/api/v1/providers/email-user/accounts/{account_id}/folders/watched/{folder_id}"
+    resp = await client.patch(url, json={"filter_rules": {
+        "sender_allow": [" amazon.de ", "dhl.de", "amazon.de"],
+        "subject_keywords": ["Bestellung"],
+    }}, headers=auth(admin_token))
+    assert resp.status_code == 200
+    rules = resp.json()["filter_rules"]
+    assert rules["sender_allow"] == ["amazon.de", "dhl.de"]
+    assert rules["subject_keywords"] == ["Bestellung"]
+    assert rules["sender_deny"] == []
+
+    resp = await client.patch(url, json={"filter_rules": {"sender_deny": ["evil\r\nA1 LOGOUT"]}},
+        headers=auth(admin_token))
+    assert resp.status_code == 422
+
+    resp = await client.patch(url, json={"filter_rules": None}, headers=auth(admin_token))
+    assert resp.status_code == 200
+    assert resp.json()["filter_rules"] is None
@@ -0,0 +1,193 @@
+"""Tests for distributing IMAP watchers across nodes (app.modules._shared.email.cluster)."""
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import select
+
+from app.modules._shared.email import cluster
+from app.modules._shared.email.imap_watcher import WorkerMode, WorkerState
+from app.modules._shared.email.models import WatcherLease, WatcherStatus, WorkerNode
+from app.modules.providers.email_user import service as email_user_service
+
+
+def _as_node(node_id: str):
+    return patch.object(cluster, "NODE_ID", node_id)
+
+
+def test_owner_of_is_deterministic_and_balanced():
+    nodes = ["node-a", "node-b", "node-c"]
+    owners = {f"folder:{i}": cluster.owner_of(f"folder:{i}", nodes) for i in range(3000)}
+    assert owners == {key: cluster.owner_of(key, list(reversed(nodes))) for key in owners}
+    counts = Counter(owners.values())
+    assert all(800 < count < 1200 for count in counts.values())
+
+
+def test_owner_of_only_moves_keys_of_departed_node():
+    keys = [f"folder:{i}" for i in range(1000)]
+    before = {key: cluster.owner_of(key, ["node-a", "node-b", "node-c"]) for key in keys}
+    after = {key: cluster.owner_of(key, ["node-a", "node-b"]) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == "node-c" for key in moved)
+
+
+@pytest.mark.asyncio
+async def test_live_nodes_tracks_heartbeats_per_pool(db_session):
+    with _as_node("node-a"):
+        await cluster.heartbeat(db_session, ["email-user"])
+    with _as_node("node-b"):
+        await cluster.heartbeat(db_session, ["email-user", "email-global"])
+    db_session.add(WorkerNode(
+        node_id="node-dead", pool="email-user", hostname="gone",
+        started_at=datetime.now(timezone.utc) - timedelta(hours=1),
+        last_heartbeat_at=datetime.now(timezone.utc) - timedelta(seconds=cluster.NODE_TTL_SEC + 5),
+    ))
+    await db_session.commit()
+
+    with _as_node("node-a"):
+        assert await cluster.live_nodes(db_session, "email-user") == ["node-a", "node-b"]
+        assert await cluster.live_nodes(db_session, "email-global") == ["node-a", "node-b"]
+    with _as_node("node-c"):
+        assert await cluster.live_nodes(db_session, "email-global") == ["node-b", "node-c"]
+
+
+@pytest.mark.asyncio
+async def test_sync_leases_grants_each_key_to_one_node(db_session):
+    with _as_node("node-a"):
+        held_a = await cluster.sync_leases(db_session, "folder:", {"folder:1", "folder:2"})
+    with _as_node("node-b"):
+        held_b = await cluster.sync_leases(db_session, "folder:", {"folder:2", "folder:3"})
+    assert held_a == {"folder:1", "folder:2"}
+    assert held_b == {"folder:3"}
+
+    # Releasing hands the key over on the other node's next sync
+    with _as_node("node-a"):
+        assert await cluster.sync_leases(db_session, "folder:", {"folder:1"}) == {"folder:1"}
+    with _as_node("node-b"):
+        held_b = await cluster.sync_leases(db_session, "folder:", {"folder:2", "folder:3"})
+    assert held_b == {"folder:2", "folder:3"}
+
+
+@pytest.mark.asyncio
+async def test_expired_leases_of_dead_node_are_taken_over(db_session):
+    db_session.add(WatcherLease(
+        key="folder:7", node_id="node-dead",
+        expires_at=datetime.now(timezone.utc) - timedelta(seconds=1),
+    ))
+    db_session.add(WatcherLease(
+        key="folder:8", node_id="node-alive",
+        expires_at=datetime.now(timezone.utc) + timedelta(seconds=30),
+    ))
+    await db_session.commit()
+
+    with _as_node("node-a"):
+        held = await cluster.sync_leases(db_session, "folder:", {"folder:7", "folder:8"})
+    assert held == {"folder:7"}
+    owners = dict((await db_session.execute(select(WatcherLease.key, WatcherLease.node_id))).all())
+    assert owners == {"folder:7": "node-a", "folder:8": "node-alive"}
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_renews_own_leases(db_session):
+    soon = datetime.now(timezone.utc) + timedelta(seconds=1)
+    db_session.add(WatcherLease(key="folder:1", node_id="node-a", expires_at=soon))
+    db_session.add(WatcherLease(key="folder:2", node_id="node-b", expires_at=soon))
+    await db_session.commit()
+
+    with _as_node("node-a"):
+        await cluster.heartbeat(db_session, ["email-user"])
+        await db_session.commit()
+
+    leases = {
+        lease.key: lease.expires_at.replace(tzinfo=timezone.utc)
+        for lease in (await db_session.execute(select(WatcherLease))).scalars()
+    }
+    assert leases["folder:1"] > soon + timedelta(seconds=cluster.LEASE_TTL_SEC - 5)
+    assert leases["folder:2"] <= soon
+
+
+@pytest.mark.asyncio
+async def test_published_states_form_a_cluster_wide_snapshot(db_session):
+    def member(states):
+        return cluster._PoolMember(AsyncMock(), AsyncMock(), lambda: states)
+
+    with patch.dict(cluster._pools, {"email-user": member({
+        "folder:1": WorkerState(folder_id=1, account_id=1, mode=WorkerMode.PROCESSING),
+        "folder:2": WorkerState(folder_id=2, account_id=1, mode=WorkerMode.IDLE),
+    })}), _as_node("node-a"):
+        await cluster.publish_states(db_session)
+    with patch.dict(cluster._pools, {"email-user": member({
+        "folder:3": WorkerState(folder_id=3, account_id=2, mode=WorkerMode.POLLING, error="boom"),
+    })}), _as_node("node-b"):
+        await cluster.publish_states(db_session)
+    db_session.add(WatcherStatus(
+        node_id="node-dead", key="folder:4", pool="email-user", mode=WorkerMode.IDLE,
+        updated_at=datetime.now(timezone.utc) - timedelta(seconds=cluster.NODE_TTL_SEC + 1),
+    ))
+    await db_session.commit()
+
+    states = await cluster.read_states(db_session, "folder:")
+    assert {key: (row.node_id, row.mode) for key, row in states.items()} == {
+        "folder:1": ("node-a", "processing"),
+        "folder:2": ("node-a", "idle"),
+        "folder:3": ("node-b", "polling"),
+    }
+    assert states["folder:3"].error == "boom"
+    assert await email_user_service.is_folder_scanning(db_session, 1)
+    assert not await email_user_service.is_folder_scanning(db_session, 2)
+
+    # A node's next publish replaces its whole snapshot
+    with patch.dict(cluster._pools, {"email-user": member({})}), _as_node("node-a"):
+        await cluster.publish_states(db_session)
+    await db_session.commit()
+    assert set(await cluster.read_states(db_session, "folder:")) == {"folder:3"}
+    assert not await email_user_service.is_folder_scanning(db_session, 1)
+
+
+@pytest.mark.asyncio
+async def test_hanging_heartbeat_stops_local_watchers_before_leases_expire():
+    import asyncio
+    import time
+
+    stopped_at = []
+
+    async def stop_local():
+        stopped_at.append(time.monotonic())
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    member = cluster._PoolMember(AsyncMock(), stop_local, lambda: {})
+    with (
+        patch.dict(cluster._pools, {"email-user": member}),
+        patch.object(cluster, "HEARTBEAT_SEC", 0.05),
+        patch.object(cluster, "LEASE_TTL_SEC", 0.3),
+        patch.object(cluster, "STOP_MARGIN_SEC", 0.1),
+        patch.object(cluster, "_renew", hang),
+    ):
+        started = time.monotonic()
+        task = asyncio.create_task(cluster._heartbeat_loop())
+        await asyncio.sleep(0.35)
+        task.cancel()
+
+    assert len(stopped_at) == 1
+    # Stopped ahead of the lease expiry, not after it
+    assert stopped_at[0] - started < 0.3
+    member.rebalance.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_restart_single_watcher_returns_false_once_reconcile_removed_it():
+    import asyncio
+
+    task = asyncio.create_task(asyncio.sleep(60))
+    # Still listed as running, but a reconcile already dropped its state
+    with (
+        patch.dict(email_user_service._running_tasks, {7: task}),
+        patch.object(email_user_service, "_start_watcher") as start,
+    ):
+        assert await email_user_service.restart_single_watcher(7) is False
+    start.assert_not_called()
+    task.cancel()
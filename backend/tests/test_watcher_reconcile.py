@@ -0,0 +1,138 @@
+"""Tests for incremental watcher reconciliation in the email_user provider."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.auth import hash_password
+from app.core.encryption import encrypt_value
+from app.models.user import User
+from app.modules._shared.email import cluster
+from app.modules._shared.email.models import WatcherLease, WorkerNode
+from app.modules.providers.email_user import service
+from app.modules.providers.email_user.models import EmailAccount, WatchedFolder
+
+
+async def _idle_watch_loop(callbacks, state):
+    await asyncio.Event().wait()
+
+
+@pytest.fixture
+async def watchers(db_session):
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    with (
+        patch.object(service, "async_session", factory),
+        patch.object(service, "watch_loop", _idle_watch_loop),
+    ):
+        yield
+        await service.stop_all_watchers()
+
+
+async def _add_account(db_session, user, name, folders):
+    account = EmailAccount(
+        user_id=user.id,
+        name=name,
+        imap_host="imap.example.com",
+        imap_port=993,
+        imap_user=f"{name}@example.com",
+        imap_password_encrypted=encrypt_value("password"),
+        use_ssl=True,
+    )
+    db_session.add(account)
+    await db_session.flush()
+    created = [WatchedFolder(account_id=account.id, folder_path=path) for path in folders]
+    db_session.add_all(created)
+    await db_session.commit()
+    return account, created
+
+
+@pytest.mark.asyncio
+async def test_reconcile_only_touches_changed_watchers(db_session, watchers):
+    user = User(username="reconcile", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    account_a, (inbox_a, orders_a) = await _add_account(db_session, user, "a", ["INBOX", "Orders"])
+    account_b, (inbox_b,) = await _add_account(db_session, user, "b", ["INBOX"])
+
+    await service.reconcile_watchers()
+    assert set(service._running_tasks) == {inbox_a.id, orders_a.id, inbox_b.id}
+    before = dict(service._running_tasks)
+
+    # No configuration change: nothing is restarted
+    await service.reconcile_watchers()
+    assert service._running_tasks == before
+
+    # Editing one account restarts only that account's watchers
+    account_a.polling_interval_sec = 600
+    await db_session.commit()
+    await service.reconcile_watchers()
+    assert service._running_tasks[inbox_b.id] is before[inbox_b.id]
+    assert service._running_tasks[inbox_a.id] is not before[inbox_a.id]
+    assert service._running_tasks[orders_a.id] is not before[orders_a.id]
+    assert before[inbox_a.id].cancelled()
+
+    # Removing a folder and deactivating an account stops just those watchers
+    after_edit = dict(service._running_tasks)
+    await db_session.delete(orders_a)
+    account_b.is_active = False
+    await db_session.commit()
+    await service.reconcile_watchers()
+    assert set(service._running_tasks) == {inbox_a.id}
+    assert service._running_tasks[inbox_a.id] is after_edit[inbox_a.id]
+    assert set(service._worker_state) == {inbox_a.id}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_restarts_finished_watchers(db_session, watchers):
+    user = User(username="reconcile2", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    _, (inbox,) = await _add_account(db_session, user, "c", ["INBOX"])
+
+    await service.reconcile_watchers()
+    task = service._running_tasks[inbox.id]
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    await service.reconcile_watchers()
+    assert service._running_tasks[inbox.id] is not task
+    assert not service._running_tasks[inbox.id].done()
+
+
+@pytest.mark.asyncio
+async def test_reconcile_only_runs_folders_assigned_to_this_node(db_session, watchers):
+    user = User(username="reconcile3", password_hash=hash_password("pass"), is_admin=False)
+    db_session.add(user)
+    await db_session.flush()
+    _, folders = await _add_account(db_session, user, "d", [f"Folder{i}" for i in range(20)])
+    now = datetime.now(timezone.utc)
+    db_session.add(WorkerNode(
+        node_id="other-node", pool=service.POOL, hostname="other",
+        started_at=now, last_heartbeat_at=now,
+    ))
+    await db_session.commit()
+
+    with patch.object(cluster, "NODE_ID", "this-node"):
+        await service.reconcile_watchers()
+
+    nodes = ["other-node", "this-node"]
+    mine = {f.id for f in folders if cluster.owner_of(service._lease_key(f.id), nodes) == "this-node"}
+    assert 0 < len(mine) < len(folders)
+    assert set(service._running_tasks) == mine
+    leases = dict((await db_session.execute(select(WatcherLease.key, WatcherLease.node_id))).all())
+    assert leases == {service._lease_key(fid): "this-node" for fid in mine}
+
+    # The other node dies: once its heartbeat is stale, its folders move here
+    await db_session.execute(
+        update(WorkerNode)
+        .where(WorkerNode.node_id == "other-node")
+        .values(last_heartbeat_at=now - timedelta(seconds=cluster.NODE_TTL_SEC + 1))
+    )
+    await db_session.commit()
+    with patch.object(cluster, "NODE_ID", "this-node"):
+        await service.reconcile_watchers()
+    assert set(service._running_tasks) == {f.id for f in folders}
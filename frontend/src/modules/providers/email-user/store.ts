@@ -44,11 +44,19 @@ export interface IMAPFolder {
   name: string
 }
 
+export interface SearchFilterRules {
+  sender_allow: string[]
+  sender_deny: string[]
+  subject_keywords: string[]
+  gmail_raw: string | null
+}
+
 export interface WatchedFolder {
   id: number
   folder_path: string
   last_seen_uid: number
   max_email_age_days: number | null
+  filter_rules: SearchFilterRules | null
 }
 
 export const useAccountsStore = defineStore('accounts', () => {
@@ -116,7 +124,7 @@ export const useAccountsStore = defineStore('accounts', () => {
   async function updateWatchedFolder(
     accountId: number,
     folderId: number,
-    data: { max_email_age_days?: number | null },
+    data: { max_email_age_days?: number | null; filter_rules?: Partial<SearchFilterRules> | null },
   ): Promise<WatchedFolder> {
     const res = await api.patch(
       `/providers/email-user/accounts/${accountId}/folders/watched/${folderId}`,
@@ -9,6 +9,8 @@ export interface QueueItemSummary {
   source_type: string
   source_info: string
   error_message: string | null
+  prefilter_score: number | null
+  prefilter_decision: string | null
   order_id: number | null
   cloned_from_id: number | null
   created_at: string